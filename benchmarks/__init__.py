@@ -0,0 +1,3 @@
+"""
+Performance benchmarks for Lintly. Run them with ``python -m benchmarks.run --help``.
+"""
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+Generates synthetic linter output and unified diffs for benchmarking.
+
+Every generator is deterministic for a given seed, so the same scale always produces the
+same input and results can be compared across commits.
+"""
+import json
+import random
+from xml.sax.saxutils import quoteattr
+
+
+CODES = [
+    ('E501', 'line too long (132 > 120 characters)'),
+    ('E303', 'too many blank lines (3)'),
+    ('F401', "'os' imported but unused"),
+    ('W291', 'trailing whitespace'),
+    ('C901', "'Build.execute' is too complex (11)"),
+]
+
+ESLINT_RULES = [
+    ('no-undef', "'$' is not defined"),
+    ('semi', 'Extra semicolon'),
+    ('indent', 'Expected indentation of 2 spaces but found 4'),
+    ('no-unused-vars', "'x' is assigned a value but never used"),
+]
+
+STYLELINT_RULES = [
+    ('max-empty-lines', 'Expected no more than 1 empty line'),
+    ('number-leading-zero', 'Expected a leading zero'),
+    ('color-hex-case', 'Expected "#FFF" to be "#fff"'),
+]
+
+PYLINT_MESSAGES = [
+    ('convention', 'C0111', 'missing-docstring', 'Missing method docstring'),
+    ('warning', 'W0511', 'fixme', 'TODO: Cache this'),
+    ('error', 'E1101', 'no-member', "Instance of 'Build' has no 'run' member"),
+    ('refactor', 'R0913', 'too-many-arguments', 'Too many arguments (7/5)'),
+]
+
+CFN_LINT_MESSAGES = [
+    ('W2001', 'Parameter UnusedParameter not used.'),
+    ('E1012', 'Ref PrincipalOrgID not found as a resource or parameter'),
+    ('E3012', 'Property Resources/Bucket/Properties/Tags should be of type List'),
+]
+
+SARIF_RULES = [
+    ('py/unused-import', 'note', "Import of 'os' is not used."),
+    ('py/sql-injection', 'error', 'This SQL query depends on a user-provided value.'),
+    ('py/clear-text-logging', 'warning', 'This expression logs sensitive data as clear text.'),
+]
+
+CHECKSTYLE_MESSAGES = [
+    ('warning', 'MissingJavadocMethodCheck', 'Missing a Javadoc comment.'),
+    ('error', 'WhitespaceAroundCheck', "'if' is not followed by whitespace."),
+    ('info', 'AvoidStarImportCheck', "Using the '.*' form of import should be avoided."),
+]
+
+CFN_NAG_MESSAGES = [
+    ('F3', 'FAIL', 'IAM role should not allow * action on its permissions policy'),
+    ('W35', 'WARN', 'S3 Bucket should have access logging configured'),
+]
+
+
+def file_names(files, extension):
+    return ['src/package_{}/module_{}.{}'.format(i % 10, i, extension) for i in range(files)]
+
+
+def violation_locations(lines, files, lines_per_file, extension, seed):
+    """
+    Yields ``lines`` (path, line, column) tuples spread across ``files`` files, sorted by path and line.
+    """
+    rng = random.Random(seed)
+    paths = file_names(files, extension)
+    per_file = [lines // files + (1 if i < lines % files else 0) for i in range(files)]
+    for path, count in zip(paths, per_file):
+        for line in sorted(rng.randint(1, lines_per_file) for _ in range(count)):
+            yield path, line, rng.randint(1, 80)
+
+
+def generate_flake8(lines, files, lines_per_file, seed=0):
+    rng = random.Random(seed)
+    return '\n'.join(
+        '{}:{}:{}: {} {}'.format(path, line, column, *rng.choice(CODES))
+        for path, line, column in violation_locations(lines, files, lines_per_file, 'py', seed)
+    ) + '\n'
+
+
+def generate_eslint_unix(lines, files, lines_per_file, seed=0):
+    rng = random.Random(seed)
+    output = []
+    for path, line, column in violation_locations(lines, files, lines_per_file, 'js', seed):
+        code, message = rng.choice(ESLINT_RULES)
+        output.append('{}:{}:{}: {} [{}/{}]'.format(
+            path, line, column, message, rng.choice(['Error', 'Warning']), code))
+    return '\n'.join(output) + '\n'
+
+
+def _generate_grouped(lines, files, lines_per_file, extension, seed, format_line, footer=''):
+    output = []
+    current_path = None
+    for path, line, column in violation_locations(lines, files, lines_per_file, extension, seed):
+        if path != current_path:
+            if current_path is not None:
+                output.append('')
+            output.append(path)
+            current_path = path
+        output.append(format_line(line, column))
+    return '\n'.join(output) + '\n' + footer
+
+
+def generate_eslint(lines, files, lines_per_file, seed=0):
+    rng = random.Random(seed)
+
+    def format_line(line, column):
+        code, message = rng.choice(ESLINT_RULES)
+        return '  {}:{}  {}  {}  {}'.format(line, column, rng.choice(['error', 'warning']), message, code)
+
+    footer = u'\n✖ {0} problems ({0} errors, 0 warnings)\n'.format(lines)
+    return _generate_grouped(lines, files, lines_per_file, 'js', seed, format_line, footer)
+
+
+def generate_stylelint(lines, files, lines_per_file, seed=0):
+    rng = random.Random(seed)
+
+    def format_line(line, column):
+        code, message = rng.choice(STYLELINT_RULES)
+        return u' {}:{}  ✖  {}   {}'.format(line, column, message, code)
+
+    return _generate_grouped(lines, files, lines_per_file, 'scss', seed, format_line)
+
+
+def generate_pylint_json(lines, files, lines_per_file, seed=0):
+    rng = random.Random(seed)
+    output = []
+    for path, line, column in violation_locations(lines, files, lines_per_file, 'py', seed):
+        message_type, message_id, symbol, message = rng.choice(PYLINT_MESSAGES)
+        output.append({
+            'type': message_type,
+            'module': path[:-3].replace('/', '.'),
+            'obj': '',
+            'line': line,
+            'column': column,
+            'path': path,
+            'symbol': symbol,
+            'message': message,
+            'message-id': message_id,
+        })
+    return json.dumps(output, indent=4)
+
+
+def generate_cfn_lint(lines, files, lines_per_file, seed=0):
+    rng = random.Random(seed)
+    output = []
+    for path, line, column in violation_locations(lines, files, lines_per_file, 'yaml', seed):
+        code, message = rng.choice(CFN_LINT_MESSAGES)
+        output.append('{} {}\n{}:{}:{}\n'.format(code, message, path, line, column))
+    return '\n'.join(output)
+
+
+def generate_cfn_nag(lines, files, lines_per_file, seed=0):
+    rng = random.Random(seed)
+    results = {}
+    for path, line, _ in violation_locations(lines, files, lines_per_file, 'yaml', seed):
+        code, violation_type, message = rng.choice(CFN_NAG_MESSAGES)
+        results.setdefault(path, []).append({
+            'id': code,
+            'type': violation_type,
+            'message': message,
+            'logical_resource_ids': ['Resource{}'.format(line)],
+            'line_numbers': [line],
+        })
+    return json.dumps([
+        {'filename': path, 'file_results': {'failure_count': 0, 'violations': violations}}
+        for path, violations in results.items()
+    ])
+
+
+def generate_black(lines, files, lines_per_file, seed=0):
+    paths = file_names(max(lines, 1), 'py')
+    output = ['would reformat {}'.format(path) for path in paths[:lines]]
+    output.append('Oh no! \U0001F4A5 \U0001F494 \U0001F4A5')
+    output.append('{} files would be reformatted.'.format(lines))
+    return '\n'.join(output) + '\n'
+
+
+def generate_sarif(lines, files, lines_per_file, seed=0):
+    rng = random.Random(seed)
+    rules = [{'id': rule_id, 'defaultConfiguration': {'level': level}} for rule_id, level, _ in SARIF_RULES]
+    results = []
+    for path, line, column in violation_locations(lines, files, lines_per_file, 'py', seed):
+        index = rng.randrange(len(SARIF_RULES))
+        rule_id, _, message = SARIF_RULES[index]
+        results.append({
+            'ruleId': rule_id,
+            'ruleIndex': index,
+            'message': {'text': message},
+            'locations': [{
+                'physicalLocation': {
+                    'artifactLocation': {'uri': path},
+                    'region': {'startLine': line, 'startColumn': column},
+                },
+            }],
+        })
+    return json.dumps({
+        'version': '2.1.0',
+        'runs': [{'tool': {'driver': {'name': 'CodeQL', 'rules': rules}}, 'results': results}],
+    }, indent=2)
+
+
+def generate_checkstyle(lines, files, lines_per_file, seed=0):
+    rng = random.Random(seed)
+    output = ['<?xml version="1.0" encoding="UTF-8"?>', '<checkstyle version="8.36">']
+    current_path = None
+    for path, line, column in violation_locations(lines, files, lines_per_file, 'java', seed):
+        if path != current_path:
+            if current_path is not None:
+                output.append('  </file>')
+            output.append('  <file name={}>'.format(quoteattr(path)))
+            current_path = path
+        severity, check, message = rng.choice(CHECKSTYLE_MESSAGES)
+        output.append('    <error line="{}" column="{}" severity="{}" message={} source={}/>'.format(
+            line, column, severity, quoteattr(message),
+            quoteattr('com.puppycrawl.tools.checkstyle.checks.{}'.format(check))))
+    if current_path is not None:
+        output.append('  </file>')
+    output.append('</checkstyle>')
+    return '\n'.join(output) + '\n'
+
+
+GENERATORS = {
+    'unix': generate_flake8,
+    'flake8': generate_flake8,
+    'pylint-json': generate_pylint_json,
+    'eslint': generate_eslint,
+    'eslint-unix': generate_eslint_unix,
+    'stylelint': generate_stylelint,
+    'black': generate_black,
+    'cfn-lint': generate_cfn_lint,
+    'cfn-nag': generate_cfn_nag,
+    'sarif': generate_sarif,
+    'checkstyle': generate_checkstyle,
+}
+
+
+def generate_diff(files, lines_per_file, hunks_per_file=10, added_per_hunk=5, extension='py', seed=0):
+    """
+    Returns a unified diff that modifies ``files`` files. Each file gets ``hunks_per_file``
+    evenly spaced hunks with three lines of context, one removed line and ``added_per_hunk``
+    added lines.
+    """
+    rng = random.Random(seed)
+    output = []
+    spacing = max(lines_per_file // max(hunks_per_file, 1), added_per_hunk + 8)
+    for path in file_names(files, extension):
+        output.append('diff --git a/{0} b/{0}'.format(path))
+        output.append('index {:07x}..{:07x} 100644'.format(rng.getrandbits(28), rng.getrandbits(28)))
+        output.append('--- a/{}'.format(path))
+        output.append('+++ b/{}'.format(path))
+
+        offset = 0
+        for hunk in range(hunks_per_file):
+            old_start = hunk * spacing + 1
+            new_start = old_start + offset
+            output.append('@@ -{},{} +{},{} @@ def function_{}(self):'.format(
+                old_start, 7, new_start, 6 + added_per_hunk, hunk))
+            output.extend(' context line {}'.format(i) for i in range(3))
+            output.append('-    removed = {}'.format(hunk))
+            output.extend('+    added_{} = {}'.format(i, rng.randint(0, 1000)) for i in range(added_per_hunk))
+            output.extend(' context line {}'.format(i) for i in range(3, 6))
+            offset += added_per_hunk - 1
+    return '\n'.join(output) + '\n'
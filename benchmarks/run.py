@@ -0,0 +1,197 @@
+"""
+Times Lintly's parsers, diff parsing, diff matching and review assembly against synthetic
+input and writes the results as JSON.
+
+    $ python -m benchmarks.run --lines 100000 --output results.json
+    $ python -m benchmarks.run --lines 100000 --compare results.json
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import click
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from lintly import matching
+from lintly.backends.github import GitHubAPIClient, GitHubBackend
+from lintly.builds import LintlyBuild
+from lintly.config import Config
+from lintly.constants import ACTION_REVIEW_COMMENT
+from lintly.parsers import FLAKE8_REGEX, PARSERS, LineRegexParser
+from lintly.patch import Patch
+from lintly.projects import Project
+
+from .generators import GENERATORS, generate_diff
+
+
+# time.perf_counter is Python 3 only
+clock = getattr(time, 'perf_counter', time.time)
+
+
+def time_call(func, repeat):
+    """
+    Calls ``func`` ``repeat`` times and returns the fastest time in seconds along with the
+    result of the last call.
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = clock()
+        result = func()
+        elapsed = clock() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def get_commit():
+    try:
+        with open(os.devnull, 'wb') as devnull:
+            return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=devnull).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def find_diff_violations_per_line(violations, patch):
+    """
+    Matches each violation against the diff on its own, the way ``find_diff_violations`` did
+    before it matched whole files at once. Kept as a baseline for the bulk matching.
+    """
+    diff_violations = {}
+    for file_name, file_violations in violations.items():
+        matched = [v for v in file_violations if patch.is_changed(file_name, v.line, v.end_line)]
+        if matched:
+            diff_violations[file_name] = matched
+    return diff_violations
+
+
+def make_build(fmt):
+    config = Config({
+        'api_key': 'benchmark',
+        'repo': 'owner/repo',
+        'pr': 1,
+        'format': fmt,
+        'commit_sha': None,
+        'context': None,
+        'fail_on': 'new',
+        'post_status': False,
+        'request_changes': False,
+        'use_checks': False,
+    })
+    return LintlyBuild(config, '')
+
+
+def run_benchmarks(lines, files, lines_per_file, hunks_per_file, repeat, formats, echo):
+    results = []
+
+    def record(name, seconds, **extra):
+        results.append(dict(name=name, seconds=seconds, **extra))
+        echo('{:<40} {:>10.4f}s'.format(name, seconds))
+
+    violations = None
+    for fmt in formats:
+        output = GENERATORS[fmt](lines, files, lines_per_file)
+        seconds, parsed = time_call(lambda: PARSERS[fmt].parse_violations(output), repeat)
+        count = sum(len(v) for v in parsed.values())
+        record('parse.{}'.format(fmt), seconds, input_bytes=len(output.encode('utf-8')), violations=count)
+        # The bytes of a file read with --input
+        buffer = output.encode('utf-8')
+        seconds, _ = time_call(lambda: PARSERS[fmt].parse_buffer(buffer), repeat)
+        record('parse_buffer.{}'.format(fmt), seconds)
+        if fmt == 'flake8':
+            violations = parsed
+            # The generic regex parser that flake8 output used before Flake8Parser
+            seconds, _ = time_call(lambda: LineRegexParser(FLAKE8_REGEX).parse_violations(output), repeat)
+            record('parse.flake8.regex', seconds)
+
+    if violations is None:
+        violations = PARSERS['flake8'].parse_violations(GENERATORS['flake8'](lines, files, lines_per_file))
+
+    diff = generate_diff(files, lines_per_file, hunks_per_file)
+    seconds, changed_lines = time_call(lambda: Patch(diff).changed_lines, repeat)
+    record('patch.changed_lines', seconds, input_bytes=len(diff.encode('utf-8')), changed_lines=len(changed_lines))
+
+    patch = Patch(diff)
+    # Parse the diff up front, so that only the first of the timed runs below doesn't pay for it
+    patch.hunks
+    build = make_build('flake8')
+    build._all_violations = violations
+    seconds, diff_violations = time_call(lambda: build.find_diff_violations(patch), repeat)
+    record('build.find_diff_violations', seconds,
+           diff_violations=sum(len(v) for v in diff_violations.values()), numpy=matching.numpy is not None)
+    if matching.numpy is not None:
+        with mock.patch.object(matching, 'numpy', None):
+            seconds, _ = time_call(lambda: build.find_diff_violations(patch), repeat)
+        record('build.find_diff_violations.pure_python', seconds)
+    seconds, _ = time_call(lambda: find_diff_violations_per_line(violations, patch), repeat)
+    record('build.find_diff_violations.per_line', seconds)
+
+    backend = GitHubBackend(token='benchmark', project=Project('owner/repo'), context='Lintly/flake8')
+    with mock.patch.object(GitHubAPIClient, '_do_request', return_value={}) as do_request:
+        seconds, _ = time_call(
+            lambda: backend.create_pull_request_review(1, patch, diff_violations, ACTION_REVIEW_COMMENT),
+            repeat)
+        record('github.create_pull_request_review', seconds, requests=do_request.call_count // repeat)
+
+    return results
+
+
+def compare(results, previous, echo):
+    previous_seconds = {result['name']: result['seconds'] for result in previous['results']}
+    echo('')
+    echo('Compared to {}:'.format(previous.get('commit') or 'previous run'))
+    for result in results:
+        before = previous_seconds.get(result['name'])
+        if before:
+            echo('{:<40} {:>7.2f}x'.format(result['name'], before / result['seconds'] if result['seconds'] else 0))
+
+
+@click.command()
+@click.option('--lines', default=10000, help='Number of violations in each generated linter output. Default 10000')
+@click.option('--files', default=100, help='Number of files the violations are spread across. Default 100')
+@click.option('--lines-per-file', default=2000, help='Length of each generated file. Default 2000')
+@click.option('--hunks-per-file', default=20, help='Number of diff hunks per file. Default 20')
+@click.option('--repeat', default=3, help='Number of times to run each benchmark; the fastest is kept. Default 3')
+@click.option('--format', 'formats', multiple=True, type=click.Choice(sorted(GENERATORS)),
+              help='Only benchmark these parsers. Default all')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), help='Write the results as JSON')
+@click.option('--compare', 'compare_to', type=click.File('r'), help='Compare against a previous results file')
+def main(lines, files, lines_per_file, hunks_per_file, repeat, formats, output, compare_to):
+    """Benchmark Lintly against synthetic linter output and diffs."""
+    if not formats:
+        for fmt in PARSERS:
+            if fmt not in GENERATORS:
+                click.echo('Warning: there is no generator for the "{}" parser, so it is not benchmarked'.format(fmt),
+                           err=True)
+        formats = [fmt for fmt in PARSERS if fmt in GENERATORS]
+    results = run_benchmarks(lines, files, lines_per_file, hunks_per_file, repeat, formats, click.echo)
+
+    report = {
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'parameters': {
+            'lines': lines,
+            'files': files,
+            'lines_per_file': lines_per_file,
+            'hunks_per_file': hunks_per_file,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if compare_to:
+        compare(results, json.load(compare_to), click.echo)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,11 @@
 
+from lintly.constants import CLEANUP_DELETE
+from lintly.metrics import Metrics
+
+from .errors import NotSupportedError
+from .scheduler import RequestScheduler
+
+
 class BaseGitBackend(object):
     """
     A base class for making calls to external Git APIs.
@@ -6,9 +13,11 @@ class BaseGitBackend(object):
 
     supports_pr_reviews = False
 
-    def __init__(self, token, project):
+    def __init__(self, token, project, metrics=None, scheduler=None):
         self.token = token
         self.project = project
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler(metrics=self.metrics)
 
     def __repr__(self):
         token = '********' if self.token else 'None'
@@ -39,17 +48,35 @@ class BaseGitBackend(object):
         """
         raise NotImplementedError
 
-    def create_pull_request_review(self, pr, patch, all_violations, pr_review_action):
+    def create_pull_request_review(self, pr, patch, all_violations, pr_review_action, journal=None):
         """
-        Creates a pull request review for the given build.
+        Creates a pull request review for the given build. Parts of the review that are marked
+        as done in ``journal`` (a ``lintly.journal.ReviewJournal``) are skipped, and each part
+        is marked as done once it has been posted.
         """
         raise NotImplementedError
 
+    def estimate_pr_review_calls(self, violations):
+        """
+        Returns the number of API requests needed to post a pull request review for the given violations.
+        """
+        return 1
+
     def delete_pull_request_review_comments(self, pr):
         """
         Deletes all pull request review comments for the bot account.
         """
         raise NotImplementedError
 
+    def cleanup_pull_request_comments(self, pr, mode=CLEANUP_DELETE):
+        """
+        Removes all pull request comments and review comments left by previous builds.
+        """
+        if mode != CLEANUP_DELETE:
+            raise NotSupportedError('Cleanup mode "{}" is not supported by {}'.format(
+                mode, self.__class__.__name__))
+        self.delete_pull_request_review_comments(pr)
+        self.delete_pull_request_comments(pr)
+
     def post_status(self, state, description, sha, target_url):
         raise NotImplementedError
@@ -0,0 +1,128 @@
+"""
+Records the API requests of a build to a cassette, a JSON Lines file with one request and its
+response per line, and replays them later without a network connection. Response bodies are
+stored as base64, so that any bytes survive the round trip. A replayed build makes
+the same requests as the recorded one, so its ``execute()`` can be profiled and compared between
+versions of Lintly offline.
+"""
+import base64
+import collections
+import json
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .errors import GitClientError
+
+
+CASSETTE_VERSION = 1
+
+# Response headers that are not recorded
+UNRECORDED_HEADERS = frozenset(['set-cookie'])
+
+
+class CassetteError(GitClientError):
+    """Raised when a replayed build makes a request that the cassette has no response for."""
+    pass
+
+
+def get_request_body(data):
+    """Returns the body of a request as text, so that it can be recorded and matched."""
+    if not data:
+        return None
+    if isinstance(data, bytes):
+        return base64.b64encode(data).decode('ascii')
+    if isinstance(data, dict):
+        return json.dumps(data, sort_keys=True)
+    return data
+
+
+def get_interaction_key(method, url, body):
+    return method.upper(), url, body
+
+
+class RecordingSession(object):
+    """
+    Wraps a ``requests.Session`` and appends each request and its response (but never the
+    request headers, which hold the API token) to the cassette at ``path``. Safe to share
+    between threads.
+    """
+
+    def __init__(self, path, session=None):
+        self.path = path
+        self.session = session if session is not None else requests.Session()
+        self._lock = threading.Lock()
+        # Each build starts a new cassette
+        open(path, 'w').close()
+
+    def request(self, method, url, data=None, headers=None, **kwargs):
+        start = time.time()
+        response = self.session.request(method, url, data=data, headers=headers, **kwargs)
+        elapsed = time.time() - start
+
+        interaction = {
+            'version': CASSETTE_VERSION,
+            'method': method.upper(),
+            'url': url,
+            'body': get_request_body(data),
+            'elapsed': elapsed,
+            'response': {
+                'status': response.status_code,
+                'headers': dict((name, value) for name, value in response.headers.items()
+                                if name.lower() not in UNRECORDED_HEADERS),
+                'body': base64.b64encode(response.content).decode('ascii'),
+            },
+        }
+        line = json.dumps(interaction, sort_keys=True) + '\n'
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line)
+        return response
+
+
+class ReplaySession(object):
+    """
+    Serves the responses recorded in the cassette at ``path`` instead of sending requests.
+    Requests are matched by their method, URL and body, and requests that match several
+    recorded ones get their responses in the order they were recorded. Safe to share between
+    threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._interactions = collections.defaultdict(collections.deque)
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                interaction = json.loads(line)
+                if interaction.get('version') != CASSETTE_VERSION:
+                    raise ValueError('Unsupported cassette version {} in {}'.format(interaction.get('version'), path))
+                key = get_interaction_key(interaction['method'], interaction['url'], interaction['body'])
+                self._interactions[key].append(interaction)
+
+    @property
+    def remaining(self):
+        """The number of recorded responses that have not been served."""
+        with self._lock:
+            return sum(len(interactions) for interactions in self._interactions.values())
+
+    def request(self, method, url, data=None, headers=None, **kwargs):
+        key = get_interaction_key(method, url, get_request_body(data))
+        with self._lock:
+            interactions = self._interactions.get(key)
+            if not interactions:
+                raise CassetteError('{} has no recorded response for {} {}'.format(self.path, key[0], url))
+            interaction = interactions.popleft()
+
+        recorded = interaction['response']
+        response = requests.Response()
+        response.status_code = recorded['status']
+        response._content = base64.b64decode(recorded['body'])
+        response.headers = CaseInsensitiveDict(recorded['headers'])
+        response.url = url
+        response.encoding = 'utf-8'
+        return response
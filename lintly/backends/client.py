@@ -0,0 +1,147 @@
+from __future__ import absolute_import
+
+import json
+import logging
+import time
+
+import requests
+from six.moves.urllib.parse import urlparse
+
+from lintly.metrics import Metrics, normalize_endpoint
+
+from .errors import NotFoundError, GitClientError, RateLimitError, UnauthorizedError
+from .scheduler import RequestScheduler, is_rate_limited
+
+
+logger = logging.getLogger(__name__)
+
+# Get 100 items at a time so that we can make fewer API requests
+DEFAULT_PER_PAGE = 100
+
+
+class BaseAPIClient(object):
+    """
+    A base class for making calls directly to a Git API and returning the results as JSON or
+    a string (depending on the Content-Type header).
+
+    Requests are sent over a single pooled session and paced by a ``RequestScheduler``, so one
+    client should be reused for every request in a build. GET responses are revalidated with
+    conditional requests when an ``http_cache`` is given. A ``session`` can be passed in to
+    keep its connections open across builds.
+    """
+
+    base_url = None
+
+    def __init__(self, token=None, metrics=None, scheduler=None, base_url=None, http_cache=None, session=None):
+        self.token = token
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler(metrics=self.metrics)
+        if base_url is not None:
+            self.base_url = base_url
+        self.http_cache = http_cache
+        self.session = session if session is not None else requests.Session()
+
+    def __repr__(self):
+        token = '********' if self.token else 'None'
+        return '{}(token={}, base_url={})'.format(self.__class__.__name__, token, self.base_url)
+
+    def get_headers(self):
+        raise NotImplementedError
+
+    def post(self, url, data=None, headers=None):
+        return self._do_request('post', url, json.dumps(data), headers)
+
+    def get(self, url, data=None, headers=None):
+        return self._do_request('get', url, data, headers)
+
+    def get_all(self, url, headers=None):
+        """
+        Returns the combined results of every page of a paginated list endpoint.
+        """
+        results = []
+        separator = '&' if '?' in url else '?'
+        next_url = '{}{}per_page={}'.format(url, separator, DEFAULT_PER_PAGE)
+        while next_url:
+            response = self._send('get', next_url, None, headers)
+            results.extend(self._handle_response(response))
+            next_url = response.links.get('next', {}).get('url')
+        return results
+
+    def put(self, url, data=None, headers=None):
+        return self._do_request('put', url, json.dumps(data), headers)
+
+    def patch(self, url, data=None, headers=None):
+        return self._do_request('patch', url, json.dumps(data), headers)
+
+    def delete(self, url, headers=None):
+        return self._do_request('delete', url, None, headers)
+
+    def _do_request(self, method, url, data=None, extra_headers=None):
+        response = self._send(method, url, data, extra_headers)
+        return self._handle_response(response)
+
+    def _send(self, method, url, data=None, extra_headers=None):
+        if data is None:
+            data = dict()
+        if extra_headers is None:
+            extra_headers = dict()
+
+        # Pagination links are absolute URLs
+        if url.startswith(self.base_url):
+            url = url[len(self.base_url):]
+            full_url = self.base_url + url
+        elif '://' in url:
+            # An endpoint outside the base URL, e.g. GitHub Enterprise's GraphQL API
+            full_url = url
+            url = urlparse(url).path
+        else:
+            full_url = self.base_url + url
+        headers = self.get_headers()
+        headers.update(extra_headers)
+
+        cache_key = cache_entry = None
+        if self.http_cache is not None and method.lower() == 'get':
+            cache_key = self.http_cache.get_key(full_url, headers)
+            cache_entry = self.http_cache.get(cache_key)
+            headers.update(self.http_cache.get_conditional_headers(cache_entry))
+
+        logger.debug('Sending a {} request to {}'.format(method, url))
+
+        def send():
+            start = time.time()
+            response = self.session.request(method.upper(), full_url, data=data, headers=headers)
+            self._record_request(method, url, response, time.time() - start)
+            return response
+
+        response = self.scheduler.request(method, send)
+
+        if cache_key is not None:
+            if response.status_code == 304 and cache_entry is not None:
+                self.http_cache.record(hit=True)
+                response = self.http_cache.build_response(cache_entry, response)
+            elif response.status_code == 200:
+                self.http_cache.record(hit=False)
+                self.http_cache.store(cache_key, response)
+
+        return response
+
+    def _handle_response(self, response):
+        if 200 <= response.status_code < 300:
+            if 'application/json' in response.headers.get('Content-Type', ''):
+                return response.json()
+            else:
+                return response.content
+        elif response.status_code == 401:
+            raise UnauthorizedError(response.content, status_code=response.status_code)
+        elif response.status_code == 404:
+            raise NotFoundError(response.content, status_code=response.status_code)
+        elif is_rate_limited(response):
+            raise RateLimitError(response.content, status_code=response.status_code)
+        else:
+            raise GitClientError(response.content, status_code=response.status_code)
+
+    def _record_request(self, method, url, response, elapsed):
+        tags = {'method': method.upper(), 'endpoint': normalize_endpoint(url)}
+        self.metrics.incr('api.requests', **tags)
+        self.metrics.incr('api.responses', status=response.status_code, **tags)
+        self.metrics.observe('api.latency', elapsed, **tags)
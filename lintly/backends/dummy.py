@@ -1,27 +1,43 @@
+import logging
+
 from .base import BaseGitBackend
 
 
+logger = logging.getLogger(__name__)
+
+
 class DummyGitBackend(BaseGitBackend):
     """
-    A Git backend class that returns dummy data for all of the abstract methods.
+    A Git backend class that returns dummy data for all of the abstract methods. It never makes
+    a request, so a build run with ``--backend=dummy`` only logs what it would have posted.
     """
 
     supports_pr_reviews = False
 
+    def __init__(self, token, project, context=None, metrics=None, scheduler=None, **kwargs):
+        super(DummyGitBackend, self).__init__(token, project, metrics=metrics, scheduler=scheduler)
+        self.context = context
+
     def get_pull_request(self, pr):
         pass
 
+    def get_pr_diff(self, pr):
+        return ''
+
     def create_pull_request_comment(self, pr, comment):
-        pass
+        logger.info('Dry run: not posting a PR comment on PR #{}'.format(pr))
 
     def delete_pull_request_comments(self, pr):
         pass
 
-    def create_pull_request_review(self, pr, patch, all_violations, pr_review_action):
-        pass
+    def create_pull_request_review(self, pr, patch, all_violations, pr_review_action, journal=None):
+        logger.info('Dry run: not posting a PR review ({}) on PR #{}'.format(pr_review_action, pr))
 
     def delete_pull_request_review_comments(self, pr):
         pass
 
-    def post_status(self, state, description, sha, target_url):
-        pass
+    def create_check_run(self, commit_sha, description, violations, conclusion=None):
+        logger.info('Dry run: not updating the check run for commit {}'.format(commit_sha))
+
+    def post_status(self, state, description, sha=None, target_url=None):
+        logger.info('Dry run: not posting a {} status ({}) to commit {}'.format(state, description, sha))
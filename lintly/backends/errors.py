@@ -17,3 +17,12 @@ class NotFoundError(GitClientError):
 
 class NotSupportedError(GitClientError):
     pass
+
+
+class RateLimitError(GitClientError):
+    pass
+
+
+class BudgetExceededError(GitClientError):
+    """Raised when a build has used up its budget of API requests."""
+    pass
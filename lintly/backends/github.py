@@ -1,11 +1,6 @@
 from __future__ import absolute_import
 
-import functools
-import json
 import logging
-import requests
-
-from github import GithubException, UnknownObjectException, Github
 
 from lintly.constants import LINTLY_IDENTIFIER
 from lintly.formatters import (
@@ -16,19 +11,22 @@ from lintly.formatters import (
 from lintly.constants import (
     ACTION_REVIEW_REQUEST_CHANGES,
     ACTION_REVIEW_COMMENT,
-    ACTION_REVIEW_APPROVE
+    ACTION_REVIEW_APPROVE,
+    CLEANUP_DELETE,
+    CLEANUP_MINIMIZE
 )
 
+from lintly.journal import get_step_name
+from lintly.violations import Severity, collapse_violation_ranges, count_violation_lines, group_violations_by_line
+
 from .base import BaseGitBackend
-from .errors import NotFoundError, GitClientError
+from .client import BaseAPIClient
+from .errors import GitClientError
 from .objects import PullRequest
 
 
 logger = logging.getLogger(__name__)
 
-# Get 100 items at a time so that we can make fewer API requests
-DEFAULT_PER_PAGE = 100
-
 GITHUB_API_HEADER = 'application/vnd.github.v3+json'
 GITHUB_API_PR_REVIEW_HEADER = 'application/vnd.github.black-cat-preview+json'
 GITHUB_DIFF_HEADER = 'application/vnd.github.3.diff'
@@ -36,30 +34,60 @@ GITHUB_CHECKS_HEADER = 'application/vnd.github.antiope-preview+json'
 GITHUB_USER_AGENT = 'Lintly'
 GITHUB_PULL_REQUEST_COMMENT_LIMIT = 50
 
+# The number of comments deleted or minimized by a single GraphQL mutation request
+GITHUB_GRAPHQL_MUTATION_BATCH_SIZE = 50
+
+LINTLY_COMMENTS_QUERY = """
+query($owner: String!, $name: String!, $number: Int!,
+      $commentsCursor: String, $threadsCursor: String,
+      $withComments: Boolean!, $withThreads: Boolean!) {
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $number) {
+      comments(first: 100, after: $commentsCursor) @include(if: $withComments) {
+        pageInfo { hasNextPage endCursor }
+        nodes { id body isMinimized }
+      }
+      reviewThreads(first: 100, after: $threadsCursor) @include(if: $withThreads) {
+        pageInfo { hasNextPage endCursor }
+        nodes {
+          id
+          comments(first: 100) {
+            pageInfo { hasNextPage endCursor }
+            nodes { id body isMinimized }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+# Fetches the rest of the comments of a review thread with more than 100
+THREAD_COMMENTS_QUERY = """
+query($id: ID!, $cursor: String) {
+  node(id: $id) {
+    ... on PullRequestReviewThread {
+      comments(first: 100, after: $cursor) {
+        pageInfo { hasNextPage endCursor }
+        nodes { id body isMinimized }
+      }
+    }
+  }
+}
+"""
+
+ANNOTATION_LEVEL_NOTICE = 'notice'
 ANNOTATION_LEVEL_WARNING = 'warning'
 ANNOTATION_LEVEL_FAILURE = 'failure'
 
+ANNOTATION_LEVELS = {
+    Severity.INFO: ANNOTATION_LEVEL_NOTICE,
+    Severity.WARNING: ANNOTATION_LEVEL_WARNING,
+    Severity.ERROR: ANNOTATION_LEVEL_FAILURE,
+}
 
-def translate_github_exception(func):
-    """
-    Decorator to catch GitHub-specific exceptions and raise them as GitClientError exceptions.
-    """
 
-    @functools.wraps(func)
-    def _wrapper(*args, **kwargs):
-        try:
-            return func(*args, **kwargs)
-        except UnknownObjectException as e:
-            logger.exception('GitHub API 404 Exception')
-            raise NotFoundError(str(e))
-        except GithubException as e:
-            logger.exception('GitHub API Exception')
-            raise GitClientError(str(e))
-
-    return _wrapper
-
-
-class GitHubAPIClient:
+class GitHubAPIClient(BaseAPIClient):
     """
     A wrapper class for making calls directly to the GitHub API and returning the results
     as JSON or a string (depending on the Content-Type header).
@@ -67,9 +95,6 @@ class GitHubAPIClient:
 
     base_url = 'https://api.github.com'
 
-    def __init__(self, token=None):
-        self.token = token
-
     def get_headers(self):
         headers = {
             'Accept': GITHUB_API_HEADER,
@@ -78,97 +103,74 @@ class GitHubAPIClient:
         }
         return headers
 
-    def post(self, url, data=None, headers=None):
-        return self._do_request('post', url, json.dumps(data), headers)
-
-    def get(self, url, data=None, headers=None):
-        return self._do_request('get', url, data, headers)
-
-    def put(self, url, data=None, headers=None):
-        return self._do_request('put', url, json.dumps(data), headers)
-
-    def patch(self, url, data=None, headers=None):
-        return self._do_request('patch', url, json.dumps(data), headers)
-
-    def _do_request(self, method, url, data=None, extra_headers=None):
-        if data is None:
-            data = dict()
-        if extra_headers is None:
-            extra_headers = dict()
-
-        full_url = self.base_url + url
-        headers = self.get_headers()
-        headers.update(extra_headers)
-
-        logger.debug('Sending a {} request to {}'.format(method, url))
-
-        response = getattr(requests, method.lower())(full_url, data=data, headers=headers)
-        if 200 <= response.status_code < 300:
-            if 'application/json' in response.headers['Content-Type']:
-                return response.json()
-            else:
-                return response.content
-        elif response.status_code == 404:
-            raise NotFoundError(response.content, status_code=response.status_code)
-        else:
-            raise GitClientError(response.content, status_code=response.status_code)
+    @property
+    def graphql_url(self):
+        """
+        The URL of the GraphQL API. GitHub Enterprise serves the REST API at
+        https://host/api/v3 but GraphQL at https://host/api/graphql.
+        """
+        base_url = self.base_url.rstrip('/')
+        if base_url.endswith('/v3'):
+            base_url = base_url[:-len('/v3')]
+        return base_url + '/graphql'
+
+    def graphql(self, query, variables=None):
+        """
+        Runs a GraphQL query or mutation and returns its data.
+        """
+        response = self.post(self.graphql_url, {'query': query, 'variables': variables or {}})
+        if response.get('errors'):
+            raise GitClientError('; '.join(error.get('message', '') for error in response['errors']))
+        return response['data']
 
 
 class GitHubBackend(BaseGitBackend):
 
     supports_pr_reviews = True
 
-    def __init__(self, token, project, context):
-        super(GitHubBackend, self).__init__(token, project)
-        self.client = Github(token, user_agent=GITHUB_USER_AGENT, per_page=DEFAULT_PER_PAGE)
+    def __init__(self, token, project, context, metrics=None, scheduler=None, base_url=None, http_cache=None,
+                 session=None):
+        super(GitHubBackend, self).__init__(token, project, metrics=metrics, scheduler=scheduler)
+        self.client = GitHubAPIClient(token=token, metrics=self.metrics, scheduler=self.scheduler,
+                                      base_url=base_url, http_cache=http_cache, session=session)
         self.context = context
 
     def _should_delete_comment(self, comment):
-        return LINTLY_IDENTIFIER in comment.body
+        return LINTLY_IDENTIFIER in comment['body']
+
+    def _get_repo_url(self, path=''):
+        return '/repos/{owner}/{repo_name}{path}'.format(
+            owner=self.project.owner_login,
+            repo_name=self.project.name,
+            path=path
+        )
 
-    @translate_github_exception
     def get_pull_request(self, pr):
-        repo = self.client.get_repo(self.project.full_name)
-        gh_pull = repo.get_pull(int(pr))
+        gh_pull = self.client.get(self._get_repo_url('/pulls/{}'.format(pr)))
 
         pull_request = PullRequest(
-            number=gh_pull.number,
-            url=gh_pull.url,
-            head_ref=gh_pull.head.ref,
-            head_sha=gh_pull.head.sha,
-            base_ref=gh_pull.base.ref,
-            base_sha=gh_pull.base.sha
+            number=gh_pull['number'],
+            url=gh_pull['url'],
+            head_ref=gh_pull['head']['ref'],
+            head_sha=gh_pull['head']['sha'],
+            base_ref=gh_pull['base']['ref'],
+            base_sha=gh_pull['base']['sha']
         )
 
         return pull_request
 
-    @translate_github_exception
     def create_pull_request_comment(self, pr, comment):
-        repo = self.client.get_repo(self.project.full_name)
-        pull_request = repo.get_pull(int(pr))
+        self.client.post(self._get_repo_url('/issues/{}/comments'.format(pr)), {'body': comment})
+        self.metrics.incr('comments.created', kind='issue')
 
-        pull_request.create_issue_comment(
-            body=comment
-        )
-
-    @translate_github_exception
     def delete_pull_request_comments(self, pr):
-        repo = self.client.get_repo(self.project.full_name)
-        pull_request = repo.get_issue(int(pr))
-        for comment in pull_request.get_comments():
+        for comment in self.client.get_all(self._get_repo_url('/issues/{}/comments'.format(pr))):
             if self._should_delete_comment(comment):
-                comment.delete()
+                self.client.delete(self._get_repo_url('/issues/comments/{}'.format(comment['id'])))
+                self.metrics.incr('comments.deleted', kind='issue')
 
     def get_pr_diff(self, pr):
-        client = GitHubAPIClient(token=self.token)
-        client.base_url = 'https://api.github.com'
-        diff_url = '/repos/{owner}/{repo_name}/pulls/{pr_number}'.format(
-            owner=self.project.owner_login,
-            repo_name=self.project.name,
-            pr_number=pr
-        )
-
-        diff = client.get(diff_url, headers={'Accept': GITHUB_DIFF_HEADER})
+        diff = self.client.get(self._get_repo_url('/pulls/{}'.format(pr)), headers={'Accept': GITHUB_DIFF_HEADER})
 
         return diff.decode('utf-8')
 
@@ -180,22 +182,39 @@ class GitHubBackend(BaseGitBackend):
         elif review_action == ACTION_REVIEW_APPROVE:
             return 'APPROVE'
 
-    def create_pull_request_review(self, pr, patch, all_violations, pr_review_action):
+    def estimate_pr_review_calls(self, violations):
+        comments_count = count_violation_lines(violations)
+        return max(1, -(-comments_count // GITHUB_PULL_REQUEST_COMMENT_LIMIT))
+
+    def create_pull_request_review(self, pr, patch, all_violations, pr_review_action, journal=None):
         comments = []
         for file_path in all_violations:
-            violations = all_violations[file_path]
+            lines = group_violations_by_line(all_violations[file_path])
 
             # https://developer.github.com/v3/pulls/comments/#input
-            for violation in violations:
-                patch_position = patch.get_patch_position(file_path, violation.line)
-                if patch_position is not None:
-                    comments.append({
-                        'path': file_path,
-                        'position': patch_position,
-                        'body': build_pr_review_line_comment(violation)
+            # Violations on the same line are posted as a single comment
+            for line, line_violations in lines.items():
+                end_line = max(v.end_line or line for v in line_violations)
+                comment_range = patch.get_comment_range(file_path, line, end_line)
+                if comment_range is None:
+                    continue
+
+                start, end = comment_range
+                comment = {
+                    'path': file_path,
+                    'body': build_pr_review_line_comment(line_violations)
+                }
+                if start.line_number == end.line_number:
+                    comment['position'] = end.position
+                else:
+                    # Violations that span several lines are posted as a multi-line comment
+                    comment.update({
+                        'start_line': start.line_number,
+                        'start_side': start.side,
+                        'line': end.line_number,
+                        'side': end.side,
                     })
-
-        client = GitHubAPIClient(token=self.token)
+                comments.append(comment)
 
         # Pull requests API has a limit of 50 comments per request,
         # if we have more comments than this we will need to split
@@ -208,52 +227,136 @@ class GitHubBackend(BaseGitBackend):
             # If we reached the amount of comments allowed per request or
             # there are no pending comments to add then we send the request
             if len(comments_batch) == GITHUB_PULL_REQUEST_COMMENT_LIMIT or not comments:
-                data = {
-                    'body': build_pr_review_body(all_violations),
-                    'event': self._get_event(pr_review_action),
-                    'comments': comments_batch,
-                }
+                # Batches that an earlier attempt of this build already posted are skipped
+                step = get_step_name('review', comments_batch)
+                if journal is None or not journal.is_done(step):
+                    data = {
+                        'body': build_pr_review_body(all_violations),
+                        'event': self._get_event(pr_review_action),
+                        'comments': comments_batch,
+                    }
+
+                    url = self._get_repo_url('/pulls/{}/reviews'.format(pr))
+                    self.client.post(url, data, headers={'Accept': GITHUB_API_PR_REVIEW_HEADER})
+                    self.metrics.incr('comments.created', len(comments_batch), kind='review')
+                    if journal is not None:
+                        journal.mark_done(step)
+
+                comments_batch = []
 
-                url = '/repos/{owner}/{repo_name}/pulls/{pr_number}/reviews'.format(
-                    owner=self.project.owner_login,
-                    repo_name=self.project.name,
-                    pr_number=pr
-                )
-                client.post(url, data, headers={'Accept': GITHUB_API_PR_REVIEW_HEADER})
-
-                comments_batch.clear()
-
-    @translate_github_exception
     def delete_pull_request_review_comments(self, pr):
-        repo = self.client.get_repo(self.project.full_name)
-        pull_request = repo.get_pull(int(pr))
-        for comment in pull_request.get_review_comments():
+        for comment in self.client.get_all(self._get_repo_url('/pulls/{}/comments'.format(pr))):
             if self._should_delete_comment(comment):
-                comment.delete()
+                self.client.delete(self._get_repo_url('/pulls/comments/{}'.format(comment['id'])))
+                self.metrics.incr('comments.deleted', kind='review')
+
+    def cleanup_pull_request_comments(self, pr, mode=CLEANUP_DELETE):
+        """
+        Deletes or minimizes every Lintly PR comment and review comment using the GraphQL API.
+        All comments are fetched with one paginated query and then changed in batched
+        mutations, instead of one REST request per page and per comment.
+        """
+        comments, review_comments = self._get_lintly_comments(pr)
+
+        if mode == CLEANUP_MINIMIZE:
+            mutations = [('minimizeComment', {'subjectId': c['id'], 'classifier': 'OUTDATED'}, kind)
+                         for kind, kind_comments in (('issue', comments), ('review', review_comments))
+                         for c in kind_comments if not c['isMinimized']]
+        else:
+            mutations = [('deleteIssueComment', {'id': c['id']}, 'issue') for c in comments]
+            mutations += [('deletePullRequestReviewComment', {'id': c['id']}, 'review') for c in review_comments]
+
+        for i in range(0, len(mutations), GITHUB_GRAPHQL_MUTATION_BATCH_SIZE):
+            batch = mutations[i:i + GITHUB_GRAPHQL_MUTATION_BATCH_SIZE]
+            self._run_mutation_batch(batch)
+            for _, _, kind in batch:
+                self.metrics.incr('comments.minimized' if mode == CLEANUP_MINIMIZE else 'comments.deleted',
+                                  kind=kind)
+
+    def _get_lintly_comments(self, pr):
+        """
+        Returns the Lintly PR comments and review comments on a pull request.
+        """
+        comments = []
+        review_comments = []
+        variables = {
+            'owner': self.project.owner_login,
+            'name': self.project.name,
+            'number': int(pr),
+            'commentsCursor': None,
+            'threadsCursor': None,
+            'withComments': True,
+            'withThreads': True,
+        }
 
-    def post_status(self, state, description, sha, target_url=''):
-        url = '/repos/{owner}/{repo_name}/statuses/{sha}'.format(
-            owner=self.project.owner_login, repo_name=self.project.name, sha=sha)
+        while variables['withComments'] or variables['withThreads']:
+            pull_request = self.client.graphql(LINTLY_COMMENTS_QUERY, variables)['repository']['pullRequest']
+
+            if variables['withComments']:
+                connection = pull_request['comments']
+                comments.extend(c for c in connection['nodes'] if self._should_delete_comment(c))
+                variables['withComments'] = connection['pageInfo']['hasNextPage']
+                variables['commentsCursor'] = connection['pageInfo']['endCursor']
+
+            if variables['withThreads']:
+                connection = pull_request['reviewThreads']
+                for thread in connection['nodes']:
+                    review_comments.extend(self._get_thread_comments(thread))
+                variables['withThreads'] = connection['pageInfo']['hasNextPage']
+                variables['threadsCursor'] = connection['pageInfo']['endCursor']
+
+        return comments, review_comments
+
+    def _get_thread_comments(self, thread):
+        """
+        Returns the Lintly comments in a review thread, fetching the pages after the first.
+        """
+        connection = thread['comments']
+        comments = [c for c in connection['nodes'] if self._should_delete_comment(c)]
+        while connection['pageInfo']['hasNextPage']:
+            variables = {'id': thread['id'], 'cursor': connection['pageInfo']['endCursor']}
+            connection = self.client.graphql(THREAD_COMMENTS_QUERY, variables)['node']['comments']
+            comments.extend(c for c in connection['nodes'] if self._should_delete_comment(c))
+        return comments
+
+    def _run_mutation_batch(self, batch):
+        """
+        Runs a list of (mutation name, input, kind) tuples as a single GraphQL request.
+        """
+        definitions = []
+        fields = []
+        variables = {}
+        for i, (name, mutation_input, _) in enumerate(batch):
+            definitions.append('$input{}: {}Input!'.format(i, name[0].upper() + name[1:]))
+            fields.append('m{0}: {1}(input: $input{0}) {{ clientMutationId }}'.format(i, name))
+            variables['input{}'.format(i)] = mutation_input
+
+        mutation = 'mutation({}) {{\n  {}\n}}'.format(', '.join(definitions), '\n  '.join(fields))
+        self.client.graphql(mutation, variables)
 
-        # Using wrapper client since PyGitHub makes unnecessary API calls
-        client = GitHubAPIClient(token=self.token)
+    def post_status(self, state, description, sha, target_url=''):
+        url = self._get_repo_url('/statuses/{}'.format(sha))
         data = {
             'state': state,
             'description': description,
             'target_url': target_url,
             'context': self.context
         }
-        client.post(url, data)
-
-    def create_check_run(self, commit_sha, description, violations):
-        url = '/repos/{owner}/{repo_name}/check-runs'.format(
-            owner=self.project.owner_login, repo_name=self.project.name)
+        self.client.post(url, data)
+
+    def create_check_run(self, commit_sha, description, violations, conclusion=None):
+        """
+        Creates a completed check run with an annotation for each violation. Its conclusion is
+        "failure" if there are any annotations, unless ``conclusion`` is given.
+        """
+        url = self._get_repo_url('/check-runs')
         annotations = self._get_check_annotations(violations)
+        if conclusion is None:
+            conclusion = 'success' if len(annotations) == 0 else 'failure'
 
-        client = GitHubAPIClient(token=self.token)
         data = {
             'name': self.context,
-            'conclusion': 'success' if len(annotations) == 0 else 'failure',
+            'conclusion': conclusion,
             'head_sha': commit_sha,
             'output': {
                 'title': description,
@@ -261,16 +364,12 @@ class GitHubBackend(BaseGitBackend):
                 'annotations': annotations
             }
         }
-        response = client.post(url, data, headers={'Accept': GITHUB_CHECKS_HEADER})
+        response = self.client.post(url, data, headers={'Accept': GITHUB_CHECKS_HEADER})
         return response.get('id')
 
     # https://developer.github.com/v3/checks/runs/#update-a-check-run
     def update_check_run(self, check_run_id, description, violations):
-        url = '/repos/{owner}/{repo_name}/check-runs/{check_run_id}'.format(
-            owner=self.project.owner_login, repo_name=self.project.name, check_run_id=check_run_id)
-
-        # PyGitHub does not support the Checks API
-        client = GitHubAPIClient(token=self.token)
+        url = self._get_repo_url('/check-runs/{}'.format(check_run_id))
         data = {
             'output': {
                 'title': description,
@@ -278,20 +377,19 @@ class GitHubBackend(BaseGitBackend):
                 'annotations': self._get_check_annotations(violations)
             }
         }
-        client.patch(url, data, headers={'Accept': GITHUB_CHECKS_HEADER})
+        self.client.patch(url, data, headers={'Accept': GITHUB_CHECKS_HEADER})
 
     def _get_check_annotations(self, violations):
         annotations = []
         for file_path in violations:
-            file_violations = violations[file_path]
-
-            # https://developer.github.com/v3/pulls/comments/#input
-            for violation in file_violations:
+            # https://developer.github.com/v3/checks/runs/#annotations-object
+            # Violations of the same code on consecutive lines are posted as one annotation
+            for violation_range in collapse_violation_ranges(violations[file_path]):
                 annotations.append({
-                    'annotation_level': 'warning',
+                    'annotation_level': ANNOTATION_LEVELS[violation_range.severity],
                     'path': file_path,
-                    'start_line': violation.line,
-                    'end_line': violation.line,
-                    'message': build_check_line_comment(violation)
+                    'start_line': violation_range.start_line,
+                    'end_line': violation_range.end_line,
+                    'message': build_check_line_comment(violation_range)
                 })
         return annotations
@@ -1,163 +1,270 @@
 from __future__ import absolute_import
 
-import functools
-import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
-import gitlab
-import requests
+from six.moves.urllib.parse import quote
 
-from lintly.constants import LINTLY_IDENTIFIER
+from lintly.constants import (
+    ACTION_REVIEW_APPROVE,
+    CLEANUP_DELETE,
+    LINTLY_IDENTIFIER
+)
+from lintly.formatters import build_pr_review_line_comment, build_pr_review_body
+from lintly.journal import get_step_name
+from lintly.violations import count_violation_lines, group_violations_by_line
 
 from .base import BaseGitBackend
-from .errors import (
-    NotSupportedError, NotFoundError, GitClientError, UnauthorizedError
-)
+from .client import BaseAPIClient
+from .errors import NotSupportedError
 from .objects import PullRequest
 
 
 logger = logging.getLogger(__name__)
 
-# Get 100 items at a time so that we can make fewer API requests
-DEFAULT_PER_PAGE = 100
-
 GITLAB_URL = 'https://gitlab.com'
 
 GITLAB_API_VERSION = 4
 
+# The number of notes created or deleted at the same time. Requests still go through the
+# build's RequestScheduler, so this does not raise the request rate.
+GITLAB_MAX_WORKERS = 4
 
-def translate_gitlab_exception(func):
-    """
-    Decorator to catch GitLab-specific exceptions and raise them as GitClientError exceptions.
-    """
-
-    @functools.wraps(func)
-    def _wrapper(*args, **kwargs):
-        try:
-            return func(*args, **kwargs)
-        except gitlab.GitlabError as e:
-            status_to_exception = {
-                401: UnauthorizedError,
-                404: NotFoundError,
-            }
-
-            exc_class = status_to_exception.get(e.response_code, GitClientError)
-            raise exc_class(str(e), status_code=e.response_code)
-
-    return _wrapper
+# GitLab calls a failed commit status "failed" rather than "failure"
+GITLAB_STATUS_STATES = {
+    'failure': 'failed',
+}
 
 
-class GitLabAPIClient:
+class GitLabAPIClient(BaseAPIClient):
     """
-    A wrapper class for making calls directly to the GitHub API and returning the results
+    A wrapper class for making calls directly to the GitLab API and returning the results
     as JSON or a string (depending on the Content-Type header).
     """
 
     base_url = '{url}/api/v{version}'.format(url=GITLAB_URL, version=GITLAB_API_VERSION)
 
-    def __init__(self, token=None, project=None):
-        self.project = project
-        self.token = token
-
-    def __repr__(self):
-        token = 'REDACTED' if self.token else 'None'
-        return 'GitLabAPIClient(token={}, user={}, project={})'.format(
-            token, self.user, self.project)
-
     def get_headers(self):
         headers = {
             'Authorization': 'Bearer {}'.format(self.token),
+            'Content-Type': 'application/json',
         }
         return headers
 
-    def post(self, url, data=None, headers=None):
-        return self._do_request('post', url, json.dumps(data), headers)
-
-    def get(self, url, data=None, headers=None):
-        return self._do_request('get', url, data, headers)
-
-    def delete(self, url, data=None, headers=None):
-        return self._do_request('delete', url, json.dumps(data), headers)
-
-    def _do_request(self, method, url, data=None, extra_headers=None):
-        if data is None:
-            data = dict()
-        if extra_headers is None:
-            extra_headers = dict()
-
-        full_url = self.base_url + url
-        headers = self.get_headers()
-        headers.update(extra_headers)
-
-        response = getattr(requests, method.lower())(full_url, data=data, headers=headers)
-        if 200 <= response.status_code < 300:
-            if 'application/json' in response.headers['Content-Type']:
-                return response.json()
-            else:
-                return response.content
-        elif response.status_code == 404:
-            raise NotFoundError(response.content, status_code=response.status_code)
-        else:
-            raise GitClientError(response.content, status_code=response.status_code)
-
 
 class GitLabBackend(BaseGitBackend):
+    """
+    Posts Lintly results to GitLab merge requests. The PR number is the merge request IID.
+
+    Merge requests are fetched at most once per backend, and notes are created and deleted
+    concurrently over the client's pooled session.
+    """
 
-    supports_pr_reviews = False
+    supports_pr_reviews = True
+
+    def __init__(self, token, project, context, metrics=None, scheduler=None, base_url=None, http_cache=None,
+                 session=None, max_workers=GITLAB_MAX_WORKERS):
+        super(GitLabBackend, self).__init__(token, project, metrics=metrics, scheduler=scheduler)
+        self.client = GitLabAPIClient(token=token, metrics=self.metrics, scheduler=self.scheduler,
+                                      base_url=base_url, http_cache=http_cache, session=session)
+        self.context = context
+        self.max_workers = max_workers
+        self._merge_requests = {}
+        self._merge_request_changes = {}
+
+    def _should_delete_comment(self, note):
+        return LINTLY_IDENTIFIER in note['body']
+
+    def _get_project_url(self, path=''):
+        return '/projects/{project_id}{path}'.format(
+            project_id=quote(self.project.full_name, safe=''),
+            path=path
+        )
 
-    def __init__(self, token, project):
-        super(GitLabBackend, self).__init__(token, project)
-        self.client = gitlab.Gitlab(GITLAB_URL, token, api_version=str(GITLAB_API_VERSION))
+    def _get_merge_request_url(self, pr, path=''):
+        return self._get_project_url('/merge_requests/{}{}'.format(pr, path))
+
+    def _get_merge_request(self, pr):
+        """
+        Returns the merge request with the given IID, fetching it only the first time.
+        """
+        if pr not in self._merge_requests:
+            self._merge_requests[pr] = self.client.get(self._get_merge_request_url(pr))
+        return self._merge_requests[pr]
+
+    def _get_merge_request_changes(self, pr):
+        """
+        Returns the merge request with the given IID along with its changed files. The response
+        includes every merge request attribute, so it also fills the merge request cache.
+        """
+        if pr not in self._merge_request_changes:
+            merge_request = self.client.get(self._get_merge_request_url(pr, '/changes'))
+            self._merge_request_changes[pr] = merge_request
+            self._merge_requests.setdefault(pr, merge_request)
+        return self._merge_request_changes[pr]
+
+    def _run_concurrently(self, func, items):
+        """
+        Calls ``func`` for every item using a pool of threads and re-raises the first error.
+        """
+        items = list(items)
+        if not items:
+            return
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for _ in executor.map(func, items):
+                pass
 
-    @translate_gitlab_exception
     def get_pull_request(self, pr):
-        project = self.client.projects.get(self.project.full_name)
-        mr = project.mergerequests.list(iid=pr)[0]
-        target_sha = self.get_latest_branch_commit_sha(mr.target_branch)
+        mr = self._get_merge_request(pr)
         pull_request = PullRequest(
             number=pr,
-            url=mr.web_url,
-            head_ref=mr.source_branch,
-            head_sha=mr.sha,
-            base_ref=mr.target_branch,
-            base_sha=target_sha
+            url=mr['web_url'],
+            head_ref=mr['source_branch'],
+            head_sha=mr['sha'],
+            base_ref=mr['target_branch'],
+            base_sha=mr['diff_refs']['base_sha']
         )
         return pull_request
 
-    @translate_gitlab_exception
     def create_pull_request_comment(self, pr, comment):
-        project = self.client.projects.get(self.project.full_name)
-        mr = project.mergerequests.list(iid=pr)[0]
-        mr.notes.create({'body': comment})
+        self.client.post(self._get_merge_request_url(pr, '/notes'), {'body': comment})
+        self.metrics.incr('comments.created', kind='issue')
+
+    def _get_lintly_notes(self, pr):
+        notes = self.client.get_all(self._get_merge_request_url(pr, '/notes'))
+        return [note for note in notes if self._should_delete_comment(note)]
+
+    def _delete_notes(self, pr, notes):
+        def delete(note):
+            self.client.delete(self._get_merge_request_url(pr, '/notes/{}'.format(note['id'])))
+            self.metrics.incr('comments.deleted', kind='review' if note.get('type') == 'DiffNote' else 'issue')
+
+        self._run_concurrently(delete, notes)
 
-    @translate_gitlab_exception
     def delete_pull_request_comments(self, pr):
-        project = self.client.projects.get(self.project.full_name)
-        mr = project.mergerequests.list(iid=pr)[0]
-        client = GitLabAPIClient(self.token, self.user, self.project)
-        for note in mr.notes.list(all=True, per_page=DEFAULT_PER_PAGE):
-            if LINTLY_IDENTIFIER in note.body:
-                url = '/projects/{project_id}/merge_requests/{mr_id}/notes/{note_id}'.format(
-                    project_id=project.id, mr_id=mr.id, note_id=note.id
-                )
-                client.delete(url)
-
-    @translate_gitlab_exception
-    def create_pull_request_review(self, pr, patch, all_violations, pr_review_action):
-        raise NotSupportedError()
-
-    @translate_gitlab_exception
+        notes = self._get_lintly_notes(pr)
+        self._delete_notes(pr, [note for note in notes if note.get('type') != 'DiffNote'])
+
     def delete_pull_request_review_comments(self, pr):
-        raise NotSupportedError()
-
-    @translate_gitlab_exception
-    def post_status(self, state, description, sha, target_url):
-        # TODO: Fix this ugliness...
-        if state == 'failure':
-            state = 'failed'
-        project = self.client.projects.get(self.project.full_name)
-        gl_commit = project.commits.get(sha)
-        gl_commit.statuses.create({'state': state,
-                                   'description': description,
-                                   'target_url': target_url,
-                                   'name': 'Lintly'})
+        notes = self._get_lintly_notes(pr)
+        self._delete_notes(pr, [note for note in notes if note.get('type') == 'DiffNote'])
+
+    def cleanup_pull_request_comments(self, pr, mode=CLEANUP_DELETE):
+        """
+        Deletes every Lintly note and diff discussion note on a merge request. Both kinds of
+        notes are listed by the same endpoint, so they are fetched once and deleted together.
+        """
+        if mode != CLEANUP_DELETE:
+            raise NotSupportedError('Cleanup mode "{}" is not supported by {}'.format(
+                mode, self.__class__.__name__))
+        self._delete_notes(pr, self._get_lintly_notes(pr))
+
+    def get_pr_diff(self, pr):
+        """
+        Returns a unified diff of the merge request built from its changed files. The diff of
+        each file is returned without its header, so one is added for the file.
+        """
+        parts = []
+        for change in self._get_merge_request_changes(pr)['changes']:
+            old_path = '/dev/null' if change.get('new_file') else 'a/' + change['old_path']
+            new_path = '/dev/null' if change.get('deleted_file') else 'b/' + change['new_path']
+            diff = change['diff']
+            if diff and not diff.endswith('\n'):
+                diff += '\n'
+            parts.append('diff --git a/{} b/{}\n--- {}\n+++ {}\n{}'.format(
+                change['old_path'], change['new_path'], old_path, new_path, diff))
+        return ''.join(parts)
+
+    def _get_old_paths(self, pr):
+        return dict((change['new_path'], change['old_path'])
+                    for change in self._get_merge_request_changes(pr)['changes'])
+
+    def _get_range_line(self, patch, line):
+        range_line = {
+            'line_code': patch.get_line_code(line.file_name, line.line_number),
+            'type': 'new' if line.added else None,
+            'new_line': line.line_number,
+        }
+        if not line.added:
+            range_line['old_line'] = line.old_line_number
+        return range_line
+
+    def estimate_pr_review_calls(self, violations):
+        # One discussion per line with violations plus the approval or the review note
+        return count_violation_lines(violations) + 1
+
+    def create_pull_request_review(self, pr, patch, all_violations, pr_review_action, journal=None):
+        mr = self._get_merge_request_changes(pr)
+        diff_refs = mr['diff_refs']
+        old_paths = self._get_old_paths(pr)
+
+        discussions = []
+        for file_path in all_violations:
+            # Violations on the same line are posted as a single discussion
+            for line_number, line_violations in group_violations_by_line(all_violations[file_path]).items():
+                end_line = max(v.end_line or line_number for v in line_violations)
+                comment_range = patch.get_comment_range(file_path, line_number, end_line)
+                if comment_range is None:
+                    continue
+
+                # https://docs.gitlab.com/ee/api/discussions.html#create-new-merge-request-thread
+                # Violations that span several lines are posted on a range of lines
+                start, end = comment_range
+                position = {
+                    'position_type': 'text',
+                    'base_sha': diff_refs['base_sha'],
+                    'start_sha': diff_refs['start_sha'],
+                    'head_sha': diff_refs['head_sha'],
+                    'old_path': old_paths.get(file_path, file_path),
+                    'new_path': file_path,
+                    'new_line': end.line_number,
+                    'line_range': {
+                        'start': self._get_range_line(patch, start),
+                        'end': self._get_range_line(patch, end),
+                    },
+                }
+                if not end.added:
+                    # Unchanged lines are positioned by their line numbers in both versions of the file
+                    position['old_line'] = end.old_line_number
+                discussions.append({
+                    'body': build_pr_review_line_comment(line_violations),
+                    'position': position,
+                })
+
+        def create(discussion):
+            self._run_step(journal, get_step_name('discussion', discussion), self._create_discussion, pr, discussion)
+
+        self._run_concurrently(create, discussions)
+
+        if pr_review_action == ACTION_REVIEW_APPROVE:
+            approval = {'sha': mr['sha']}
+            self._run_step(journal, get_step_name('approve', approval),
+                           self.client.post, self._get_merge_request_url(pr, '/approve'), approval)
+        else:
+            body = build_pr_review_body(all_violations)
+            self._run_step(journal, get_step_name('summary', body), self.create_pull_request_comment, pr, body)
+
+    def _create_discussion(self, pr, discussion):
+        self.client.post(self._get_merge_request_url(pr, '/discussions'), discussion)
+        self.metrics.incr('comments.created', kind='review')
+
+    def _run_step(self, journal, step, func, *args):
+        """
+        Calls ``func`` with ``args`` and marks ``step`` as done in ``journal``, unless an earlier
+        attempt of this build already did it.
+        """
+        if journal is not None and journal.is_done(step):
+            return
+        func(*args)
+        if journal is not None:
+            journal.mark_done(step)
+
+    def post_status(self, state, description, sha, target_url=''):
+        url = self._get_project_url('/statuses/{}'.format(sha))
+        data = {
+            'state': GITLAB_STATUS_STATES.get(state, state),
+            'description': description,
+            'target_url': target_url,
+            'name': self.context
+        }
+        self.client.post(url, data)
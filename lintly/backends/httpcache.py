@@ -0,0 +1,154 @@
+"""
+On-disk and in-memory caches of GET responses used to make conditional requests to Git APIs.
+
+GitHub does not count "304 Not Modified" responses against the rate limit, so re-reading
+the same diff or PR metadata on every push is much cheaper when the ETag of the previous
+response is sent along with the request.
+"""
+import collections
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from lintly.compat import replace_file
+from lintly.metrics import Metrics
+
+
+logger = logging.getLogger(__name__)
+
+# Response headers that are stored alongside the body
+CACHED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Link')
+
+# The number of responses kept by a MemoryResponseCache
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class ResponseCache(object):
+    """
+    Stores the body and validators (ETag and Last-Modified) of GET responses in a directory.
+    Entries are keyed by URL, Accept header and a hash of the Authorization header, so
+    different tokens never share cached responses.
+    """
+
+    def __init__(self, directory, metrics=None):
+        self.directory = directory
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def get_key(self, url, headers):
+        key = '\n'.join([url, headers.get('Accept', ''), headers.get('Authorization', '')])
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _get_paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + '.json', base + '.body'
+
+    def get(self, key):
+        """
+        Returns the cached (headers, body) for a key, or None if nothing is cached.
+        """
+        meta_path, body_path = self._get_paths(key)
+        try:
+            with open(meta_path) as f:
+                headers = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (IOError, OSError, ValueError):
+            return None
+        return headers, body
+
+    def get_conditional_headers(self, entry):
+        """
+        Returns the If-None-Match / If-Modified-Since headers to send for a cached entry.
+        """
+        if entry is None:
+            return {}
+        headers, _ = entry
+        conditional_headers = {}
+        if headers.get('ETag'):
+            conditional_headers['If-None-Match'] = headers['ETag']
+        if headers.get('Last-Modified'):
+            conditional_headers['If-Modified-Since'] = headers['Last-Modified']
+        return conditional_headers
+
+    def store(self, key, response):
+        headers = dict((name, response.headers[name]) for name in CACHED_HEADERS if name in response.headers)
+        if 'ETag' not in headers and 'Last-Modified' not in headers:
+            return
+
+        meta_path, body_path = self._get_paths(key)
+        self._write_atomic(body_path, response.content)
+        self._write_atomic(meta_path, json.dumps(headers).encode('utf-8'))
+
+    def _write_atomic(self, path, data):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        replace_file(temp_path, path)
+
+    def build_response(self, entry, response):
+        """
+        Turns a 304 response into a 200 response with the body of a cached entry.
+        """
+        headers, body = entry
+        cached = requests.Response()
+        cached.status_code = 200
+        cached._content = body
+        cached.headers = CaseInsensitiveDict(headers)
+        cached.url = response.url
+        cached.request = response.request
+        return cached
+
+    def record(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.metrics.incr('http_cache.hits' if hit else 'http_cache.misses')
+        self.metrics.gauge('http_cache.hit_ratio', float(self.hits) / (self.hits + self.misses))
+
+
+class MemoryResponseCache(ResponseCache):
+    """
+    Keeps the most recently used ``max_entries`` responses in memory instead of on disk, for
+    a long-running process such as ``lintly serve``. It is safe to share between threads.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, metrics=None):
+        self.max_entries = max_entries
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+            return entry
+
+    def store(self, key, response):
+        headers = dict((name, response.headers[name]) for name in CACHED_HEADERS if name in response.headers)
+        if 'ETag' not in headers and 'Last-Modified' not in headers:
+            return
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (headers, response.content)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record(self, hit):
+        with self._lock:
+            super(MemoryResponseCache, self).record(hit)
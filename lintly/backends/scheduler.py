@@ -0,0 +1,229 @@
+"""
+Paces, retries and budgets the HTTP requests that Lintly makes to Git APIs.
+"""
+import contextlib
+import logging
+import random
+import threading
+import time
+
+import requests
+
+from lintly.metrics import Metrics
+
+from .errors import BudgetExceededError
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REQUESTS_PER_SECOND = 10.0
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BACKOFF_BASE = 1.0
+DEFAULT_BACKOFF_MAX = 60.0
+
+# Rate limit resets further away than this are not waited for
+DEFAULT_MAX_RATE_LIMIT_WAIT = 120.0
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+RETRYABLE_STATUS_CODES = frozenset([500, 502, 503, 504])
+
+SECONDARY_RATE_LIMIT_MESSAGES = ('secondary rate limit', 'abuse detection')
+
+
+def get_rate_limit_header(response, name):
+    """
+    Returns a rate limit header from a response. GitHub prefixes these headers with "X-"
+    while GitLab does not, e.g. "X-RateLimit-Remaining" and "RateLimit-Remaining".
+    """
+    value = response.headers.get('X-' + name)
+    if value is None:
+        value = response.headers.get(name)
+    return value
+
+
+def is_rate_limited(response):
+    """
+    Returns True if the response was rejected because of a primary or secondary rate limit.
+    """
+    if response.status_code == 429:
+        return True
+    if response.status_code == 403:
+        if response.headers.get('Retry-After') or get_rate_limit_header(response, 'RateLimit-Remaining') == '0':
+            return True
+        body = (response.text or '').lower()
+        return any(message in body for message in SECONDARY_RATE_LIMIT_MESSAGES)
+    return False
+
+
+class RequestScheduler(object):
+    """
+    Sends requests through a token bucket so that no more than ``rate`` requests are made per
+    second, retries rate-limited responses and server errors with exponential backoff and
+    jitter, and enforces an optional budget of ``max_calls`` requests.
+
+    A single scheduler should be shared by every API client used during a build so that the
+    pacing and budget apply to the build as a whole. It is safe to share between threads.
+    """
+
+    def __init__(self, rate=DEFAULT_REQUESTS_PER_SECOND, max_calls=None, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_base=DEFAULT_BACKOFF_BASE, backoff_max=DEFAULT_BACKOFF_MAX,
+                 max_rate_limit_wait=DEFAULT_MAX_RATE_LIMIT_WAIT, metrics=None,
+                 clock=time.time, sleep=time.sleep):
+        self.rate = rate
+        self.max_calls = max_calls
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_rate_limit_wait = max_rate_limit_wait
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.clock = clock
+        self.sleep = sleep
+
+        self.calls_made = 0
+        self.reserved_calls = 0
+
+        self._tokens = rate or 0
+        self._last_refill = clock()
+        self._rate_limit_reset = None
+        self._lock = threading.Lock()
+
+    @property
+    def remaining_calls(self):
+        """The number of requests left in the budget, or None if there is no budget."""
+        if self.max_calls is None:
+            return None
+        return max(self.max_calls - self.reserved_calls - self.calls_made, 0)
+
+    def can_afford(self, calls):
+        return self.remaining_calls is None or self.remaining_calls >= calls
+
+    @contextlib.contextmanager
+    def reserve(self, calls):
+        """
+        Holds back ``calls`` requests from the budget for the duration of the block, so that
+        they are still available for whatever needs to happen afterwards.
+        """
+        with self._lock:
+            self.reserved_calls += calls
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.reserved_calls -= calls
+
+    def request(self, method, send):
+        """
+        Calls ``send`` (which performs the HTTP request and returns a response) and retries it
+        when it is safe to do so. Returns the final response.
+        """
+        method = method.upper()
+        idempotent = method in IDEMPOTENT_METHODS
+        attempt = 0
+
+        while True:
+            with self._lock:
+                self._check_budget()
+                self._wait_for_rate_limit_reset()
+                self._acquire_token()
+                self.calls_made += 1
+
+            try:
+                response = send()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                delay = self._get_backoff(attempt)
+                logger.warning('{} request failed ({}). Retrying in {:.1f}s'.format(method, e, delay))
+                self.metrics.incr('api.retries', reason='connection')
+            else:
+                with self._lock:
+                    self._update_rate_limit(response)
+
+                if is_rate_limited(response):
+                    # A rate limited request was never processed, so it is safe to retry
+                    # even if it is not idempotent
+                    if attempt >= self.max_retries:
+                        return response
+                    delay = self._get_rate_limit_delay(response, attempt)
+                    if delay is None:
+                        return response
+                    logger.warning('Rate limited by the API. Retrying in {:.1f}s'.format(delay))
+                    self.metrics.incr('api.retries', reason='rate_limit')
+                elif response.status_code in RETRYABLE_STATUS_CODES and idempotent:
+                    if attempt >= self.max_retries:
+                        return response
+                    delay = self._get_backoff(attempt)
+                    logger.warning('{} request failed with status {}. Retrying in {:.1f}s'.format(
+                        method, response.status_code, delay))
+                    self.metrics.incr('api.retries', reason='server_error')
+                else:
+                    return response
+
+            self.sleep(delay)
+            attempt += 1
+
+    def _check_budget(self):
+        if self.max_calls is not None and self.calls_made + self.reserved_calls >= self.max_calls:
+            self.metrics.incr('api.budget_exceeded')
+            raise BudgetExceededError('The API call budget of {} requests has been used up'.format(self.max_calls))
+
+    def _acquire_token(self):
+        if not self.rate:
+            return
+
+        now = self.clock()
+        self._tokens = min(self.rate, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+        if self._tokens < 1:
+            wait = (1 - self._tokens) / self.rate
+            self.sleep(wait)
+            self._tokens = 1
+            self._last_refill = now + wait
+
+        self._tokens -= 1
+
+    def _update_rate_limit(self, response):
+        remaining = get_rate_limit_header(response, 'RateLimit-Remaining')
+        reset = get_rate_limit_header(response, 'RateLimit-Reset')
+        if remaining is not None:
+            self.metrics.gauge('api.rate_limit_remaining', int(remaining))
+        if remaining == '0' and reset:
+            self._rate_limit_reset = float(reset)
+        else:
+            self._rate_limit_reset = None
+
+    def _wait_for_rate_limit_reset(self):
+        """
+        Waits for the rate limit window to reset if the last response said no requests are left.
+        """
+        if self._rate_limit_reset is None:
+            return
+        wait = self._rate_limit_reset - self.clock()
+        if 0 < wait <= self.max_rate_limit_wait:
+            logger.warning('API rate limit exhausted. Waiting {:.1f}s for it to reset'.format(wait))
+            self.sleep(wait)
+        self._rate_limit_reset = None
+
+    def _get_rate_limit_delay(self, response, attempt):
+        retry_after = response.headers.get('Retry-After')
+        if retry_after is not None:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                delay = self._get_backoff(attempt)
+        elif get_rate_limit_header(response, 'RateLimit-Remaining') == '0' and \
+                get_rate_limit_header(response, 'RateLimit-Reset'):
+            delay = float(get_rate_limit_header(response, 'RateLimit-Reset')) - self.clock()
+            self._rate_limit_reset = None
+        else:
+            delay = self._get_backoff(attempt)
+
+        if delay > self.max_rate_limit_wait:
+            logger.warning('API rate limit resets in {:.0f}s, which is too long to wait'.format(delay))
+            return None
+        return max(delay, 0)
+
+    def _get_backoff(self, attempt):
+        """Exponential backoff with "full jitter"."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
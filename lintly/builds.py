@@ -1,8 +1,17 @@
 import collections
+import contextlib
 import logging
+import time
+
+import six
+from cached_property import cached_property
 
 from .constants import (
+    BACKEND_DUMMY,
+    BACKEND_GITHUB,
+    BACKEND_GITLAB,
     FAIL_ON_ANY,
+    FAIL_ON_TOUCHED,
     ACTION_REVIEW_APPROVE,
     ACTION_REVIEW_COMMENT,
     ACTION_REVIEW_DO_NOTHING,
@@ -11,27 +20,55 @@ from .constants import (
 )
 
 from .exceptions import NotPullRequestException
+from .backends.cassette import RecordingSession, ReplaySession
+from .backends.dummy import DummyGitBackend
 from .backends.github import GitHubBackend
-from .backends.errors import GitClientError
+from .backends.gitlab import GitLabBackend
+from .backends.errors import BudgetExceededError, GitClientError, RateLimitError, UnauthorizedError
+from .backends.httpcache import ResponseCache
+from .backends.scheduler import RequestScheduler
+from .cache import ViolationCache, write_violations_cache
+from .filters import ViolationFilter
 from .formatters import build_pr_comment
+from .inputs import map_input
+from .journal import ReviewJournal, get_step_name
+from .locks import RunCoordinator, prune_state
+from .matching import match_violations
+from .metrics import Metrics
 from .parsers import PARSERS
 from .patch import Patch
+from .policy import Policy, write_baseline
 from .projects import Project
+from .violations import ViolationStats
 
 
 logger = logging.getLogger(__name__)
 
+# The number of API requests a build needs after its PR review: one PR comment and one commit status
+PR_REVIEW_FALLBACK_CALLS = 2
 
-class LintlyBuild(object):
 
-    def __init__(self, config, linter_output):
+class LintlyBuild(object):
+    """
+    Runs Lintly once against a PR. ``linter_output`` is either the linter's output as text or an
+    iterable of its lines, which is parsed as it is read. ``session`` and ``http_cache`` let a
+    long-running process (see ``lintly.server``) share pooled connections and cached API
+    responses between builds.
+    """
+
+    def __init__(self, config, linter_output, session=None, http_cache=None):
         self.config = config
         self.linter_output = linter_output
+        self.session = session
+        self.http_cache = http_cache
 
         self.project = Project(config.repo)
+        self.metrics = Metrics()
+        self.scheduler = RequestScheduler(rate=config.api_rate, max_calls=config.max_api_calls, metrics=self.metrics)
 
-        context = config.context or "Lintly/{0}".format(config.format)
-        self.git_client = GitHubBackend(token=config.api_key, project=self.project, context=context)
+        self.git_client = self.get_git_client()
+        self.violation_filter = ViolationFilter.from_config(config)
+        self.policy = Policy.from_config(config)
 
         # All violations found from the linting output
         self._all_violations = {}
@@ -39,6 +76,84 @@ class LintlyBuild(object):
         # Violations that are only caused by changes to the current PR
         self._diff_violations = {}
 
+        # Counts of the violations above, built once when they are found
+        self._all_stats = ViolationStats()
+        self._diff_stats = ViolationStats()
+
+        # Whether the build passed its policy, with its exit code and commit status
+        self.result = None
+
+    def get_git_client(self):
+        """
+        Returns the backend for the Git hosting service selected with ``--backend``.
+        """
+        backends = {
+            BACKEND_GITHUB: GitHubBackend,
+            BACKEND_GITLAB: GitLabBackend,
+            BACKEND_DUMMY: DummyGitBackend,
+        }
+        http_cache = self.http_cache
+        if self.config.http_cache_dir:
+            http_cache = ResponseCache(self.config.http_cache_dir, metrics=self.metrics)
+
+        return backends[self.config.backend](
+            token=self.config.api_key, project=self.project, context=self.context, metrics=self.metrics,
+            scheduler=self.scheduler, base_url=self.config.api_url, http_cache=http_cache,
+            session=self.get_session())
+
+    def get_session(self):
+        """
+        Returns the session API requests are sent with. With ``--record`` the requests are also
+        written to a cassette, and with ``--replay`` they are answered from one.
+        """
+        if self.config.replay_path:
+            logger.info('Replaying API responses from {}'.format(self.config.replay_path))
+            return ReplaySession(self.config.replay_path)
+        if self.config.record_path:
+            logger.info('Recording API requests to {}'.format(self.config.record_path))
+            return RecordingSession(self.config.record_path, session=self.session)
+        return self.session
+
+    @property
+    def context(self):
+        """The commit status context, e.g. "Lintly/flake8"."""
+        return self.config.context or "Lintly/{0}".format(self.config.format)
+
+    @cached_property
+    def coordinator(self):
+        """
+        Returns the RunCoordinator shared with other Lintly runs for the same commit of this PR,
+        or None if no ``--lock-dir`` is set.
+        """
+        if not self.config.lock_dir:
+            return None
+        prune_state(self.config.lock_dir)
+        key = (self.config.backend, self.config.api_url, self.project.full_name, self.config.pr,
+               self.config.commit_sha)
+        return RunCoordinator(self.config.lock_dir, key, backend=self.config.lock_backend,
+                              timeout=self.config.lock_timeout, metrics=self.metrics)
+
+    @cached_property
+    def journal(self):
+        """
+        Returns the ReviewJournal that records what this build has posted, so that a retry after
+        a failure can skip it, or None if no ``--journal-dir`` is set.
+        """
+        if not self.config.journal_dir:
+            return None
+        key = (self.config.backend, self.config.api_url, self.project.full_name, self.config.pr,
+               self.config.commit_sha, self.context)
+        return ReviewJournal(self.config.journal_dir, key, metrics=self.metrics)
+
+    def coordinate(self):
+        """
+        Returns a context manager that holds the lock shared with other Lintly runs for the
+        same commit, if there is one.
+        """
+        if self.coordinator is None:
+            return _no_lock()
+        return self.coordinator.lock()
+
     @property
     def violations(self):
         """
@@ -46,15 +161,30 @@ class LintlyBuild(object):
         """
         return self._all_violations if self.config.fail_on == FAIL_ON_ANY else self._diff_violations
 
+    @property
+    def stats(self):
+        """
+        Returns the statistics for either the diff violations or all violations depending on configuration.
+        """
+        return self._all_stats if self.config.fail_on == FAIL_ON_ANY else self._diff_stats
+
     @property
     def has_violations(self):
-        return bool(self.violations)
+        return bool(self.stats.total)
 
     @property
     def introduced_issues_count(self):
-        if self.violations is None:
-            return 0
-        return sum(len(item[1]) for item in self.violations.items())
+        return self.stats.total
+
+    @property
+    def new_issues_count(self):
+        """The number of violations on lines changed by the PR."""
+        return self._diff_stats.total
+
+    @property
+    def existing_issues_count(self):
+        """The number of violations on lines the PR did not change."""
+        return self._all_stats.total - self._diff_stats.total
 
     def execute(self):
         """
@@ -69,46 +199,185 @@ class LintlyBuild(object):
 
         logger.info('Running Lintly against PR #{} for repo {}'.format(self.config.pr, self.project))
 
-        parser = PARSERS.get(self.config.format)
-        self._all_violations = parser.parse_violations(self.linter_output)
+        # Join the other runs for this commit before parsing, so that a faster one can't finish
+        # and clear the shared state while this one is still working
+        coordinator = self.coordinator
+        with self.metrics.timer('build.duration'):
+            try:
+                self._execute()
+            finally:
+                if coordinator is not None:
+                    coordinator.finish()
+
+    def _execute(self):
+        self._all_violations = self.parse_violations()
         logger.info('Lintly found violations in {} files'.format(len(self._all_violations)))
 
-        diff = self.get_pr_diff()
-        patch = self.get_pr_patch(diff)
-        self._diff_violations = self.find_diff_violations(patch)
+        try:
+            with self.metrics.timer('diff.fetch'):
+                diff = self.get_pr_diff()
+        except (BudgetExceededError, RateLimitError) as e:
+            # Without the diff nothing can be placed on its lines. Every violation counts as new,
+            # so that the build can't pass because the diff was missing
+            logger.warning('Could not fetch the PR diff ({}). Treating every violation as new'.format(e))
+            self.metrics.incr('diff.unavailable')
+            diff = None
+
+        if diff is None:
+            patch = self.get_pr_patch('')
+            self._diff_violations = self._all_violations
+            self._diff_stats = self._all_stats
+        else:
+            self.metrics.gauge('diff.bytes', len(diff.encode('utf-8')))
+
+            with self.metrics.timer('diff.parse'):
+                patch = self.get_pr_patch(diff)
+                self.metrics.gauge('diff.changed_lines', len(patch.changed_lines))
+
+            with self.metrics.timer('diff.match'):
+                self._diff_violations = self.find_diff_violations(patch)
+                self._diff_stats = ViolationStats(self._diff_violations)
+        self.metrics.gauge('violations.diff', self._diff_stats.total)
         logger.info('Lintly found diff violations in {} files'.format(len(self._diff_violations)))
 
-        self.cleanup_previous_comments()
-        self.submit_to_pr(patch)
-        self.post_commit_status()
+        self.evaluate_policy()
+
+        # Runs for the same commit take turns, so that none of them cleans up the comments
+        # another one has just posted
+        with self.coordinate():
+            with self.metrics.timer('cleanup'):
+                self.cleanup_previous_comments()
+            with self.metrics.timer('submit'):
+                self.submit_to_pr(patch)
+            with self.metrics.timer('status'):
+                self.post_commit_status()
+
+        if self.journal is not None:
+            self.journal.complete()
+
+    def parse_violations(self):
+        """
+        Returns the violations from the linter output, or from a violations cache written by
+        a previous run if one was given.
+        """
+        if self.config.from_cache:
+            logger.info('Loading violations from cache {}'.format(self.config.from_cache))
+            violations = ViolationCache(self.config.from_cache)
+            if self.violation_filter is not None:
+                violations = self.violation_filter.filter_violations(violations)
+                self._all_stats = ViolationStats(violations)
+            else:
+                # The cache holds the counts, so only the files matched against the diff are decoded
+                self._all_stats = violations.get_stats()
+            return violations
+
+        parser = PARSERS.get(self.config.format)
+        start = time.time()
+        if self.config.input_path:
+            logger.info('Reading linter output from {}'.format(self.config.input_path))
+            with map_input(self.config.input_path) as buffer:
+                violations = parser.parse_buffer(buffer, violation_filter=self.violation_filter)
+                input_bytes = len(buffer)
+        elif isinstance(self.linter_output, six.string_types):
+            violations = parser.parse_violations(self.linter_output, violation_filter=self.violation_filter)
+            input_bytes = len(self.linter_output.encode('utf-8'))
+            self.metrics.gauge('parse.lines', self.linter_output.count('\n'))
+        else:
+            # An iterable of lines, e.g. stdin, which is parsed as it is read
+            read = {'lines': 0, 'bytes': 0}
+
+            def count(lines):
+                for line in lines:
+                    read['lines'] += 1
+                    read['bytes'] += len(line.encode('utf-8'))
+                    yield line
+
+            violations = parser.parse_lines(count(self.linter_output), violation_filter=self.violation_filter)
+            input_bytes = read['bytes']
+            self.metrics.gauge('parse.lines', read['lines'])
+        self._all_stats = ViolationStats(violations)
+        elapsed = time.time() - start
+
+        violations_count = self._all_stats.total
+        self.metrics.observe('parse.duration', elapsed, format=self.config.format)
+        self.metrics.gauge('parse.bytes', input_bytes)
+        self.metrics.gauge('violations.total', violations_count)
+        if elapsed:
+            self.metrics.gauge('parse.violations_per_second', violations_count / elapsed)
+
+        if self.config.cache_out:
+            logger.info('Writing violations cache to {}'.format(self.config.cache_out))
+            write_violations_cache(violations, self.config.cache_out)
+
+        return violations
+
+    def evaluate_policy(self):
+        """
+        Evaluates the build's policy against the counts of its violations, and writes them to a
+        baseline file if ``--baseline-out`` is set.
+        """
+        self.result = self.policy.evaluate(self.stats)
+        logger.info('Lintly policy result: {}'.format(self.result.description))
+        self.metrics.incr('policy.result', state=self.result.state)
+
+        if self.config.baseline_out:
+            logger.info('Writing violations baseline to {}'.format(self.config.baseline_out))
+            write_baseline(self.stats, self.config.baseline_out)
 
     def get_pr_diff(self):
+        if self.coordinator is not None:
+            # Only the first run for a commit fetches the diff
+            return self.coordinator.get_shared('pr.diff', lambda: self.git_client.get_pr_diff(self.config.pr))
         return self.git_client.get_pr_diff(self.config.pr)
 
     def get_pr_patch(self, diff):
         return Patch(diff)
 
     def cleanup_previous_comments(self):
-        logger.info('Deleting old PR review comments')
-        self.git_client.delete_pull_request_review_comments(self.config.pr)
+        def cleanup():
+            if self.journal is not None and self.journal.is_done('cleanup'):
+                # Cleaning up again would delete what the earlier attempt already posted
+                logger.info('Old PR comments were already cleaned up by an earlier attempt of this build')
+                return
+            logger.info('Cleaning up old PR comments and review comments ({})'.format(self.config.cleanup_mode))
+            self.git_client.cleanup_pull_request_comments(self.config.pr, mode=self.config.cleanup_mode)
+            if self.journal is not None:
+                self.journal.mark_done('cleanup')
 
-        logger.info('Deleting old PR comment')
-        self.git_client.delete_pull_request_comments(self.config.pr)
+        try:
+            if self.coordinator is None:
+                cleanup()
+            elif not self.coordinator.run_once('cleanup', cleanup):
+                # Cleaning up again would delete the comments of the runs before this one
+                logger.info('Old PR comments were already cleaned up by another Lintly run for this commit')
+                self.metrics.incr('coordination.cleanup_skipped')
+        except (BudgetExceededError, RateLimitError) as e:
+            # Old comments are left behind rather than failing the build. As the cleanup isn't
+            # marked as done, the next run tries again
+            logger.warning('Could not clean up old PR comments ({}). Leaving them in place'.format(e))
+            self.metrics.incr('cleanup.skipped')
 
     def find_diff_violations(self, patch):
         """
-        Uses the diff for this build to find changed lines that also have violations.
+        Uses the diff for this build to find violations on lines that changed, or on any line of
+        the hunks the diff touched for ``--fail-on=touched``. A violation that spans several lines
+        is found if any of its lines are.
         """
+        touched = self.config.fail_on == FAIL_ON_TOUCHED
         violations = collections.defaultdict(list)
-        for line in patch.changed_lines:
-            file_violations = self._all_violations.get(line['file_name'])
+        # Only the files in the diff are looked up, so a violations cache only decodes those
+        for file_name, index in patch.hunks.items():
+            file_violations = self._all_violations.get(file_name)
             if not file_violations:
                 continue
 
-            line_violations = [v for v in file_violations if v.line == line['line_number']]
-
-            for v in line_violations:
-                violations[line['file_name']].append(v)
+            if touched:
+                matched = match_violations(file_violations, index.starts, index.ends)
+            else:
+                # Each added line is an interval of its own
+                matched = match_violations(file_violations, index.added_lines, index.added_lines)
+            if matched:
+                violations[file_name] = matched
 
         return violations
 
@@ -121,8 +390,8 @@ class LintlyBuild(object):
         if self.config.github_check_run_id and self.config.use_checks:
             action = ACTION_REVIEW_USE_CHECKS
         elif self.config.request_changes:
-            # Use PR reviews
-            if self.has_violations:
+            # Use PR reviews. Violations the policy allows are commented on, but don't request changes
+            if not self.result.passed:
                 action = ACTION_REVIEW_REQUEST_CHANGES
             else:
                 action = ACTION_REVIEW_APPROVE
@@ -141,11 +410,11 @@ class LintlyBuild(object):
 
         if pr_review_action == ACTION_REVIEW_USE_CHECKS:
             logger.info('Updating GitHub check run')
-            description = self.get_result_description()
             self.git_client.create_check_run(
                 self.config.commit_sha,
-                description,
-                self._diff_violations
+                self.result.description,
+                self._diff_violations,
+                conclusion=self.result.state
             )
         else:
             self.submit_pr_review(patch, pr_review_action)
@@ -159,14 +428,25 @@ class LintlyBuild(object):
 
         post_pr_comment = True
         try:
-            logger.info('Creating PR review')
-            self.git_client.create_pull_request_review(
-                self.config.pr,
-                patch,
-                self._diff_violations,
-                pr_review_action
-            )
+            # Keep enough of the API budget to fall back to a PR comment and post the commit status
+            with self.scheduler.reserve(PR_REVIEW_FALLBACK_CALLS):
+                if not self.scheduler.can_afford(self.git_client.estimate_pr_review_calls(self._diff_violations)):
+                    raise BudgetExceededError('Not enough API budget left to post a PR review')
+
+                logger.info('Creating PR review')
+                self.git_client.create_pull_request_review(
+                    self.config.pr,
+                    patch,
+                    self._diff_violations,
+                    pr_review_action,
+                    journal=self.journal
+                )
             post_pr_comment = False
+        except (BudgetExceededError, RateLimitError) as e:
+            # The rate limit may still be hit after the scheduler's retries
+            logger.warning('Could not post PR review ({}). Posting a PR comment instead'.format(e))
+        except UnauthorizedError:
+            logger.warning("Could not post PR review (the account didn't have permission)")
         except GitClientError as e:
             # TODO: Make `create_pull_request_review` raise an `UnauthorizedError`
             # so that we don't have to check for a specific message in the exception
@@ -178,22 +458,18 @@ class LintlyBuild(object):
 
         if post_pr_comment and pr_review_action in (ACTION_REVIEW_COMMENT, ACTION_REVIEW_REQUEST_CHANGES):
             logger.info('Creating PR comment')
-            comment = build_pr_comment(self.config, self.violations)
-            self.git_client.create_pull_request_comment(self.config.pr, comment)
-
-    def get_result_description(self):
-        plural = '' if self.introduced_issues_count == 1 else 's'
-        return 'Pull Request introduced {} linting violation{}'.format(
-            self.introduced_issues_count, plural)
+            comment = build_pr_comment(self.config, self.violations, stats=self.stats)
+            step = get_step_name('comment', comment)
+            if self.journal is None or not self.journal.is_done(step):
+                self.git_client.create_pull_request_comment(self.config.pr, comment)
+                if self.journal is not None:
+                    self.journal.mark_done(step)
 
     def post_commit_status(self):
         """
         Posts results to a commit status in GitHub if this build is for a pull request.
         """
-        if self.violations:
-            self._post_status('failure', self.get_result_description())
-        else:
-            self._post_status('success', 'Linting detected no new issues.')
+        self._post_status(self.result.state, self.result.description)
 
     def _post_status(self, state, description):
         """
@@ -216,3 +492,8 @@ class LintlyBuild(object):
                                'set the LINTLY_COMMIT_SHA environment variable.')
         else:
             logger.info('Commit statuses disabled')
+
+
+@contextlib.contextmanager
+def _no_lock():
+    yield
@@ -0,0 +1,204 @@
+"""
+Reads and writes a compact binary cache of parsed violations so that re-running Lintly
+against the same linter output does not require parsing it again.
+
+The cache file is laid out as follows (all integers are little-endian):
+
+    header        magic, version, string count, file count, string table offset, index offset,
+                  stats offset, stats count
+    sections      one section per file, each a run of fixed-size violation records
+    string table  (offset, length) pairs followed by the UTF-8 string data
+    index         one (path string id, section offset, violation count) entry per file
+    stats         one (code string id, severity, violation count) entry per code and severity
+
+Every string (paths, codes and messages) is stored once in the string table and referenced
+by id, so repeated codes and messages cost four bytes per violation. Each violation record
+also holds its end line (0 for single-line violations) and its severity in one byte. The stats
+and the index give a build its ViolationStats without decoding any of the sections.
+"""
+import collections
+import mmap
+import os
+import struct
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from .violations import Severity, Violation, ViolationStats
+
+
+MAGIC = b'LNTC'
+VERSION = 4
+
+HEADER = struct.Struct('<4sHIIQQQI')
+STRING_ENTRY = struct.Struct('<QI')
+INDEX_ENTRY = struct.Struct('<IQI')
+STATS_ENTRY = struct.Struct('<IBI')
+VIOLATION_RECORD = struct.Struct('<IIIIIB')
+
+
+class CacheError(Exception):
+    """Raised when a violations cache file cannot be read."""
+    pass
+
+
+def write_violations_cache(violations, path):
+    """
+    Writes a dict of file paths to violations to a binary cache file.
+    """
+    strings = {}
+
+    def intern(value):
+        if value not in strings:
+            strings[value] = len(strings)
+        return strings[value]
+
+    with open(path, 'wb') as f:
+        f.write(b'\0' * HEADER.size)
+
+        index = []
+        counts = collections.Counter()
+        for file_path, file_violations in violations.items():
+            index.append((intern(file_path), f.tell(), len(file_violations)))
+            for violation in file_violations:
+                counts[(intern(violation.code), int(violation.severity))] += 1
+                f.write(VIOLATION_RECORD.pack(
+                    violation.line,
+                    violation.column,
+                    intern(violation.code),
+                    intern(violation.message),
+                    violation.end_line or 0,
+                    violation.severity
+                ))
+
+        strings_offset = f.tell()
+        encoded_strings = [value.encode('utf-8') for value in sorted(strings, key=strings.get)]
+        data_offset = strings_offset + STRING_ENTRY.size * len(encoded_strings)
+        for encoded in encoded_strings:
+            f.write(STRING_ENTRY.pack(data_offset, len(encoded)))
+            data_offset += len(encoded)
+        for encoded in encoded_strings:
+            f.write(encoded)
+
+        index_offset = f.tell()
+        for entry in index:
+            f.write(INDEX_ENTRY.pack(*entry))
+
+        stats_offset = f.tell()
+        for (code_id, severity), count in sorted(counts.items()):
+            f.write(STATS_ENTRY.pack(code_id, severity, count))
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, len(strings), len(index), strings_offset, index_offset,
+                            stats_offset, len(counts)))
+
+
+class ViolationCache(Mapping):
+    """
+    A read-only mapping of file paths to violations backed by a memory-mapped cache file.
+
+    Only the index and the file paths are read up front. The violations for a file are
+    decoded the first time that file is looked up, so a build that only needs the files
+    touched by a diff never reads the rest of the cache.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            # mmap cannot map an empty file
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise CacheError('{} is not a Lintly violations cache'.format(path))
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._buffer[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise CacheError('{} is not a Lintly violations cache'.format(path))
+
+        version = struct.unpack_from('<H', self._buffer, len(MAGIC))[0]
+        if version != VERSION:
+            self.close()
+            raise CacheError('Unsupported violations cache version {} in {}'.format(version, path))
+
+        magic, version, string_count, file_count, strings_offset, index_offset, stats_offset, stats_count = \
+            HEADER.unpack_from(self._buffer, 0)
+        tables = ((strings_offset, string_count, STRING_ENTRY), (index_offset, file_count, INDEX_ENTRY),
+                  (stats_offset, stats_count, STATS_ENTRY))
+        if any(offset + count * entry.size > len(self._buffer) for offset, count, entry in tables):
+            self.close()
+            raise CacheError('{} is truncated'.format(path))
+
+        self._stats_offset = stats_offset
+        self._stats_count = stats_count
+
+        self._strings_offset = strings_offset
+        self._strings = [None] * string_count
+        self._loaded = {}
+
+        self._index = {}
+        for i in range(file_count):
+            path_id, section_offset, count = INDEX_ENTRY.unpack_from(
+                self._buffer, index_offset + i * INDEX_ENTRY.size)
+            self._index[self._get_string(path_id)] = (section_offset, count)
+
+    def get_stats(self):
+        """
+        Returns the ViolationStats of every file in the cache, read from the stats table and the
+        index, so no violations are decoded.
+        """
+        stats = ViolationStats()
+        for i in range(self._stats_count):
+            code_id, severity, count = STATS_ENTRY.unpack_from(self._buffer, self._stats_offset + i * STATS_ENTRY.size)
+            stats.by_code[self._get_string(code_id)] += count
+            stats.by_severity[Severity(severity)] += count
+        for file_path, (section_offset, count) in self._index.items():
+            if count:
+                stats.by_file[file_path] += count
+                stats.total += count
+        return stats
+
+    def _get_string(self, string_id):
+        value = self._strings[string_id]
+        if value is None:
+            offset, length = STRING_ENTRY.unpack_from(
+                self._buffer, self._strings_offset + string_id * STRING_ENTRY.size)
+            value = self._buffer[offset:offset + length].decode('utf-8')
+            self._strings[string_id] = value
+        return value
+
+    def __getitem__(self, file_path):
+        if file_path not in self._loaded:
+            section_offset, count = self._index[file_path]
+            violations = []
+            for i in range(count):
+                line, column, code_id, message_id, end_line, severity = VIOLATION_RECORD.unpack_from(
+                    self._buffer, section_offset + i * VIOLATION_RECORD.size)
+                violations.append(Violation(
+                    line=line,
+                    column=column,
+                    code=self._get_string(code_id),
+                    message=self._get_string(message_id),
+                    severity=Severity(severity),
+                    end_line=end_line or None
+                ))
+            self._loaded[file_path] = violations
+        return self._loaded[file_path]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, file_path):
+        return file_path in self._index
+
+    def close(self):
+        self._buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -3,24 +3,66 @@ import logging.config
 import sys
 
 import click
+import six
 
 from .builds import LintlyBuild
 from .config import Config
-from .constants import FAIL_ON_ANY, FAIL_ON_NEW
+from .constants import (
+    BACKEND_DUMMY, BACKEND_GITHUB, BACKEND_GITLAB, CLEANUP_DELETE, CLEANUP_MINIMIZE, FAIL_ON_ANY, FAIL_ON_NEW,
+    FAIL_ON_TOUCHED
+)
 from .exceptions import NotPullRequestException
+from .inputs import map_input
+from .locks import DEFAULT_LOCK_TIMEOUT, LOCK_BACKENDS
+from .metrics import METRICS_FORMATS, METRICS_FORMAT_JSON
 from .parsers import PARSERS
+from .policy import parse_budget
+from .server import DEFAULT_HOST, DEFAULT_PORT, LintlyService, ServerError, get_server_url, make_server, submit_build
+from .violations import Severity
 
 
 logger = logging.getLogger(__name__)
 
 
-@click.command()
+def validate_non_negative(ctx, param, value):
+    # click.FloatRange needs click 7
+    if value is not None and value < 0:
+        raise click.BadParameter('{} must not be negative'.format(value))
+    return value
+
+
+def validate_positive(ctx, param, value):
+    if value is not None and value <= 0:
+        raise click.BadParameter('{} must be greater than 0'.format(value))
+    return value
+
+
+def validate_budgets(ctx, param, value):
+    for budget in value:
+        try:
+            parse_budget(budget)
+        except ValueError as e:
+            raise click.BadParameter(str(e))
+    return value
+
+
+@click.group(invoke_without_command=True)
 @click.option('--api-key',
               envvar='LINTLY_API_KEY',
               help='The GitHub API key to use for commenting on PRs (required)')
 @click.option('--repo',
               envvar='LINTLY_REPO',
               help='The GitHub repo name in the format {owner}/{repo}')
+@click.option('--backend',
+              envvar='LINTLY_BACKEND',
+              type=click.Choice([BACKEND_GITHUB, BACKEND_GITLAB, BACKEND_DUMMY]),
+              default=BACKEND_GITHUB,
+              help=('The Git hosting service to post results to. "dummy" posts nothing and treats the PR '
+                    'diff as empty, for dry runs. Default "github"'))
+@click.option('--api-url',
+              envvar='LINTLY_API_URL',
+              help=('The base URL of the Git hosting API, for GitHub Enterprise or self-hosted GitLab. '
+                    'Defaults to https://api.github.com or https://gitlab.com/api/v4'))
 @click.option('--pr',
               envvar='LINTLY_PR',
               help='The pull request number for this build (required)')
@@ -32,14 +74,66 @@ logger = logging.getLogger(__name__)
               type=click.Choice(list(PARSERS.keys())),
               default='flake8',
               help='The linting output format Lintly should expect to receive. Default "flake8"')
+@click.option('--include-code', 'include_codes',
+              envvar='LINTLY_INCLUDE_CODES',
+              multiple=True,
+              help=('Only report violations whose code matches this pattern, e.g. "E5*". '
+                    'Can be given more than once'))
+@click.option('--exclude-code', 'exclude_codes',
+              envvar='LINTLY_EXCLUDE_CODES',
+              multiple=True,
+              help='Do not report violations whose code matches this pattern. Can be given more than once')
+@click.option('--min-severity',
+              envvar='LINTLY_MIN_SEVERITY',
+              type=click.Choice([severity.label for severity in Severity]),
+              help='Only report violations of at least this severity. Default all')
+@click.option('--include', 'include_paths',
+              envvar='LINTLY_INCLUDE',
+              multiple=True,
+              help=('Only report violations in files matching this glob, e.g. "src/*". '
+                    'Can be given more than once'))
+@click.option('--exclude', 'exclude_paths',
+              envvar='LINTLY_EXCLUDE',
+              multiple=True,
+              help='Do not report violations in files matching this glob. Can be given more than once')
 @click.option('--context',
               help='Override the commit status context')
 @click.option('--fail-on',
               envvar='LINTLY_FAIL_ON',
-              type=click.Choice([FAIL_ON_ANY, FAIL_ON_NEW]),
+              type=click.Choice([FAIL_ON_ANY, FAIL_ON_NEW, FAIL_ON_TOUCHED]),
               default=FAIL_ON_ANY,
-              help=('Whether Lintly should fail if any violations are detected '
-                    'or only if new violations are detected. Default "any"'))
+              help=('Whether Lintly should fail if any violations are detected, only if new violations '
+                    '(on lines the PR changed) are detected or if violations anywhere in the hunks the PR '
+                    'touched are detected. Default "any"'))
+@click.option('--max-violations',
+              envvar='LINTLY_MAX_VIOLATIONS',
+              type=click.IntRange(min=0),
+              help='Only fail if there are more than this many violations. Default 0')
+@click.option('--max-errors',
+              envvar='LINTLY_MAX_ERRORS',
+              type=click.IntRange(min=0),
+              help='Only fail if there are more than this many violations of "error" severity')
+@click.option('--budget', 'budgets',
+              envvar='LINTLY_BUDGETS',
+              multiple=True,
+              callback=validate_budgets,
+              help=('Only fail if there are more than COUNT violations with codes matching a pattern, '
+                    'given as CODE=COUNT, e.g. "E501=10" or "E5*=10". Can be given more than once'))
+@click.option('--baseline',
+              envvar='LINTLY_BASELINE',
+              type=click.Path(dir_okay=False),
+              help=('Fail if there are more violations, in total or of any code, than in this baseline '
+                    'file written by --baseline-out. A missing file is not enforced'))
+@click.option('--baseline-out',
+              envvar='LINTLY_BASELINE_OUT',
+              type=click.Path(dir_okay=False, writable=True),
+              help='Write the counts of violations to a baseline file at this path')
+@click.option('--cleanup-mode',
+              envvar='LINTLY_CLEANUP_MODE',
+              type=click.Choice([CLEANUP_DELETE, CLEANUP_MINIMIZE]),
+              default=CLEANUP_DELETE,
+              help=('Whether Lintly should delete the comments it posted on previous builds or '
+                    'minimize them as outdated. Default "delete"'))
 @click.option('--post-status/--no-post-status',
               default=True,
               help='Used to determine if Lintly should post a PR status to GitHub. Default true')
@@ -52,37 +146,202 @@ logger = logging.getLogger(__name__)
               help=('Whether Lintly should try to use the GitHub Checks API '
                     'to report on changes requested. This only works when '
                     'running in GitHub Actions. Default false'))
+@click.option('--cache-out',
+              type=click.Path(dir_okay=False, writable=True),
+              help='Write the parsed violations to a binary cache file at this path')
+@click.option('--input', 'input',
+              type=click.Path(exists=True, dir_okay=False),
+              help=('Read linter output from this file (e.g. written by "flake8 --output-file") instead of '
+                    'stdin. The file is memory-mapped, so large reports are not read into memory'))
+@click.option('--from-cache',
+              type=click.Path(exists=True, dir_okay=False),
+              help=('Load violations from a cache file written with --cache-out '
+                    'instead of reading linter output from stdin'))
+@click.option('--metrics-out',
+              envvar='LINTLY_METRICS_OUT',
+              type=click.Path(dir_okay=False, writable=True),
+              help='Write timings and API call metrics for this run to a file at this path')
+@click.option('--metrics-format',
+              envvar='LINTLY_METRICS_FORMAT',
+              type=click.Choice(METRICS_FORMATS),
+              default=METRICS_FORMAT_JSON,
+              help='The format of the --metrics-out file. Default "json"')
+@click.option('--max-api-calls',
+              envvar='LINTLY_MAX_API_CALLS',
+              type=click.IntRange(min=1),
+              help=('The maximum number of API requests Lintly may make. When the PR review would '
+                    'not fit in the budget a single PR comment is posted instead. Default unlimited'))
+@click.option('--api-rate',
+              envvar='LINTLY_API_RATE',
+              type=float,
+              callback=validate_positive,
+              help='The maximum number of API requests Lintly makes per second. Default 10')
+@click.option('--http-cache-dir',
+              envvar='LINTLY_HTTP_CACHE_DIR',
+              type=click.Path(file_okay=False, writable=True),
+              help=('A directory for caching API responses between runs. Cached responses are '
+                    'revalidated with conditional requests, which do not count against the rate limit'))
+@click.option('--lock-dir',
+              envvar='LINTLY_LOCK_DIR',
+              type=click.Path(file_okay=False, writable=True),
+              help=('A directory shared by the CI jobs that run Lintly for the same commit. Jobs for the '
+                    'same commit fetch the PR diff once, clean up old comments once and post one at a time'))
+@click.option('--lock-backend',
+              envvar='LINTLY_LOCK_BACKEND',
+              type=click.Choice(sorted(LOCK_BACKENDS)),
+              help=('How jobs lock --lock-dir: "file" uses flock and "directory" works on any file system. '
+                    'Default "file" where flock is available'))
+@click.option('--lock-timeout',
+              envvar='LINTLY_LOCK_TIMEOUT',
+              type=float,
+              callback=validate_non_negative,
+              help=('How many seconds to wait for other jobs for the same commit before posting anyway. '
+                    'Default {:.0f}'.format(DEFAULT_LOCK_TIMEOUT)))
+@click.option('--journal-dir',
+              envvar='LINTLY_JOURNAL_DIR',
+              type=click.Path(file_okay=False, writable=True),
+              help=('A directory that keeps track of the comments a build has posted. If the build fails '
+                    'part of the way through, running it again only posts what is left'))
+@click.option('--record',
+              envvar='LINTLY_RECORD',
+              type=click.Path(dir_okay=False, writable=True),
+              help=('Record every API request of the build, its response and its timing to a JSON Lines '
+                    'cassette at this path'))
+@click.option('--replay',
+              type=click.Path(exists=True, dir_okay=False),
+              help=('Serve API responses from a cassette written with --record instead of sending requests, '
+                    'so the build runs offline. Requests are not rate limited unless --api-rate is given'))
+@click.option('--server',
+              envvar='LINTLY_SERVER',
+              help=('Submit the build to a running "lintly serve" service at this URL instead of '
+                    'running it here, e.g. "http://127.0.0.1:8765" or "unix:///tmp/lintly.sock"'))
 @click.option('--log',
               is_flag=True,
               help='Send Lintly debug logs to the console. Default false')
 @click.option('--exit-zero/--no-exit-zero', default=False,
-              help=('Whether Lintly should exit with error code indicating '
-                    'amount of violations or not. Default false'))
-def main(**options):
+              help=('Whether Lintly should exit with 0 even if the build fails. A failed build exits with '
+                    'the number of files with violations, or with 1 if it broke a --max-violations, '
+                    '--max-errors, --budget or --baseline rule. Default false'))
+@click.pass_context
+def main(ctx, **options):
     """Slurp up linter output and send it to a GitHub PR review."""
+    if ctx.invoked_subcommand is not None:
+        return
+
     configure_logging(log_all=options.get('log'))
 
-    stdin_stream = click.get_text_stream('stdin')
-    stdin_text = stdin_stream.read()
+    linter_output = None
+    if not options.get('from_cache') and not options.get('input'):
+        stdin_stream = click.get_text_stream('stdin')
+        if not options.get('server') and PARSERS[options['format']].supports_streaming:
+            # The output is parsed as it is read, so it is never held in memory all at once
+            linter_output = echo_lines(stdin_stream)
+        else:
+            linter_output = stdin_stream.read()
+            click.echo(linter_output)
 
-    click.echo(stdin_text)
+    if options.get('server'):
+        if options.get('input'):
+            # The service may not be able to read the file, so its contents are sent instead
+            with map_input(options['input']) as buffer:
+                linter_output = six.text_type(buffer, 'utf-8')
+        submit_to_server(options, linter_output, get_changed_options(ctx, options))
 
     config = Config(options)
 
-    build = LintlyBuild(config, stdin_text)
+    build = LintlyBuild(config, linter_output)
     try:
         build.execute()
     except NotPullRequestException:
         logger.info('Not a PR. Lintly is exiting.')
         sys.exit(0)
+    finally:
+        if config.metrics_out:
+            build.metrics.write(config.metrics_out, config.metrics_format)
 
     exit_code = 0
-    # Exit with the number of files that have violations
+    # Exit with the number of files that have violations if the build failed its policy
     if not options['exit_zero']:
-        exit_code = len(build.violations)
+        exit_code = build.result.exit_code
     sys.exit(exit_code)
 
 
+def echo_lines(stream):
+    """Yields the lines of ``stream``, echoing each one as it is read."""
+    for line in stream:
+        click.echo(line, nl=False)
+        yield line
+
+
+def get_changed_options(ctx, options):
+    """
+    Returns the options that are not set to their defaults, so that the defaults of a "lintly
+    serve" service apply to the rest. click 6 can't tell an option given with its default value
+    from one that wasn't given, so both are left out.
+    """
+    defaults = dict((param.name, param.get_default(ctx)) for param in ctx.command.params)
+    return dict((name, value) for name, value in options.items()
+                if value != defaults.get(name) and not (value == () and defaults.get(name) is None))
+
+
+def submit_to_server(options, linter_output, changed_options):
+    """
+    Runs the build on a "lintly serve" service and exits with the status it reports. Only the
+    ``changed_options`` are submitted.
+    """
+    try:
+        result = submit_build(options['server'], changed_options, linter_output)
+    except (ServerError, IOError) as e:
+        logger.error('Could not submit the build to {}: {}'.format(options['server'], e))
+        sys.exit(1)
+
+    if result.get('superseded'):
+        logger.warning('The build was not run because a newer submission for the same PR (commit {}) '
+                       'replaced it'.format(result.get('superseded_by')))
+    if result.get('coalesced'):
+        logger.info('The build was combined with {} other submission(s) for the same PR'.format(result['coalesced']))
+    sys.exit(0 if options['exit_zero'] else result['exit_code'])
+
+
+@main.command()
+@click.option('--host',
+              envvar='LINTLY_SERVE_HOST',
+              default=DEFAULT_HOST,
+              help='The address to listen on. Default "{}"'.format(DEFAULT_HOST))
+@click.option('--port',
+              envvar='LINTLY_SERVE_PORT',
+              type=click.IntRange(min=0, max=65535),
+              default=DEFAULT_PORT,
+              help='The port to listen on. Default {}'.format(DEFAULT_PORT))
+@click.option('--socket', 'socket_path',
+              envvar='LINTLY_SERVE_SOCKET',
+              type=click.Path(dir_okay=False),
+              help='Listen on a Unix socket at this path instead of a TCP port')
+@click.pass_context
+def serve(ctx, host, port, socket_path):
+    """
+    Run Lintly as a long-running service that accepts builds from "lintly --server".
+
+    Options given before "serve" (e.g. "lintly --api-key=... serve") are the defaults for
+    every build.
+    """
+    defaults = dict(ctx.parent.params)
+    configure_logging(log_all=defaults.get('log'))
+
+    server = make_server(LintlyService(defaults), host=host, port=port, socket_path=socket_path)
+    if socket_path:
+        url = get_server_url(socket_path=socket_path)
+    else:
+        url = get_server_url(host, server.server_address[1])
+    click.echo('Lintly is listening on {}'.format(url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
 def configure_logging(log_all=False):
     log_level = 'DEBUG' if log_all else 'WARNING'
     logging.config.dictConfig({
@@ -0,0 +1,18 @@
+"""
+Helpers for the differences between the Python versions and platforms Lintly supports.
+"""
+import os
+import sys
+
+
+def replace_file(source, destination):
+    """
+    Renames ``source`` to ``destination``, replacing ``destination`` if it exists. This is
+    atomic except on Windows with Python 2, where the destination has to be removed first.
+    """
+    if hasattr(os, 'replace'):
+        os.replace(source, destination)
+        return
+    if sys.platform == 'win32' and os.path.exists(destination):
+        os.remove(destination)
+    os.rename(source, destination)
@@ -1,14 +1,63 @@
 import ci
 import os
+import re
+
+import click
+from cached_property import cached_property
+from six.moves import configparser
+
+from .backends.scheduler import DEFAULT_REQUESTS_PER_SECOND
+from .constants import BACKEND_GITHUB, CLEANUP_DELETE
+from .locks import DEFAULT_LOCK_TIMEOUT
+from .metrics import METRICS_FORMAT_JSON
+from .violations import Severity
 
 REDACTED = '********'
 
+# Files that can hold a [lintly] section, in the order they are searched
+CONFIG_FILES = ('setup.cfg', 'tox.ini', '.lintly')
+CONFIG_SECTION = 'lintly'
+
+
+def read_config_file(paths=CONFIG_FILES):
+    """
+    Returns the options in the [lintly] section of the first of ``paths`` that has one. Option
+    names are normalized to use underscores, e.g. "min-severity" becomes "min_severity".
+    """
+    for path in paths:
+        parser = configparser.RawConfigParser()
+        parser.read(path)
+        if parser.has_section(CONFIG_SECTION):
+            return dict((name.replace('-', '_'), value) for name, value in parser.items(CONFIG_SECTION))
+    return {}
+
+
+def split_list(value):
+    """Splits a config file value on commas and newlines."""
+    return [item.strip() for item in re.split(r'[,\n]', value or '') if item.strip()]
+
 
 class Config(object):
-    """A Config object that knows how to return configuration from the CLI or Continuous Integration services"""
+    """A Config object that knows how to return configuration from the CLI, a config file or
+    Continuous Integration services"""
 
-    def __init__(self, cli_config):
+    def __init__(self, cli_config, file_config=None):
         self.cli_config = cli_config
+        if file_config is not None:
+            self.file_config = file_config
+
+    @cached_property
+    def file_config(self):
+        return read_config_file()
+
+    def _get_list(self, name, file_name):
+        """
+        Returns a list option from the CLI, or else from the [lintly] section of the config file.
+        """
+        values = self.cli_config.get(name)
+        if values:
+            return list(values)
+        return split_list(self.file_config.get(file_name))
 
     def as_dict(self):
         return {
@@ -21,6 +70,33 @@ class Config(object):
             'post_status': self.post_status,
             'request_changes': self.request_changes,
             'github_check_run_id': self.github_check_run_id,
+            'from_cache': self.from_cache,
+            'cache_out': self.cache_out,
+            'metrics_out': self.metrics_out,
+            'metrics_format': self.metrics_format,
+            'max_api_calls': self.max_api_calls,
+            'api_rate': self.api_rate,
+            'cleanup_mode': self.cleanup_mode,
+            'http_cache_dir': self.http_cache_dir,
+            'backend': self.backend,
+            'api_url': self.api_url,
+            'include_codes': self.include_codes,
+            'exclude_codes': self.exclude_codes,
+            'min_severity': self.min_severity,
+            'include_paths': self.include_paths,
+            'exclude_paths': self.exclude_paths,
+            'lock_dir': self.lock_dir,
+            'lock_backend': self.lock_backend,
+            'lock_timeout': self.lock_timeout,
+            'journal_dir': self.journal_dir,
+            'input_path': self.input_path,
+            'max_violations': self.max_violations,
+            'max_errors': self.max_errors,
+            'budgets': self.budgets,
+            'baseline': self.baseline,
+            'baseline_out': self.baseline_out,
+            'record_path': self.record_path,
+            'replay_path': self.replay_path,
         }
 
     @property
@@ -70,3 +146,125 @@ class Config(object):
     @property
     def use_checks(self):
         return self.cli_config['use_checks']
+
+    @property
+    def from_cache(self):
+        return self.cli_config.get('from_cache')
+
+    @property
+    def cache_out(self):
+        return self.cli_config.get('cache_out')
+
+    @property
+    def metrics_out(self):
+        return self.cli_config.get('metrics_out')
+
+    @property
+    def metrics_format(self):
+        return self.cli_config.get('metrics_format') or METRICS_FORMAT_JSON
+
+    @property
+    def max_api_calls(self):
+        return self.cli_config.get('max_api_calls')
+
+    @property
+    def api_rate(self):
+        api_rate = self.cli_config.get('api_rate')
+        if api_rate is not None:
+            return api_rate
+        if self.replay_path:
+            # Replayed responses are served locally, so they are not paced unless asked to be
+            return None
+        return DEFAULT_REQUESTS_PER_SECOND
+
+    @property
+    def cleanup_mode(self):
+        return self.cli_config.get('cleanup_mode') or CLEANUP_DELETE
+
+    @property
+    def http_cache_dir(self):
+        return self.cli_config.get('http_cache_dir')
+
+    @property
+    def backend(self):
+        return self.cli_config.get('backend') or BACKEND_GITHUB
+
+    @property
+    def api_url(self):
+        return self.cli_config.get('api_url')
+
+    @property
+    def include_codes(self):
+        return self._get_list('include_codes', 'include_code')
+
+    @property
+    def exclude_codes(self):
+        return self._get_list('exclude_codes', 'exclude_code')
+
+    @property
+    def min_severity(self):
+        min_severity = self.cli_config.get('min_severity') or self.file_config.get('min_severity')
+        if not min_severity:
+            return None
+        try:
+            return Severity.from_name(min_severity.strip())
+        except ValueError as e:
+            # Only a config file can hold an invalid severity, as the CLI option is a choice
+            raise click.BadParameter(str(e), param_hint='min-severity')
+
+    @property
+    def include_paths(self):
+        return self._get_list('include_paths', 'include')
+
+    @property
+    def exclude_paths(self):
+        return self._get_list('exclude_paths', 'exclude')
+
+    @property
+    def lock_dir(self):
+        return self.cli_config.get('lock_dir')
+
+    @property
+    def lock_backend(self):
+        return self.cli_config.get('lock_backend')
+
+    @property
+    def lock_timeout(self):
+        lock_timeout = self.cli_config.get('lock_timeout')
+        return DEFAULT_LOCK_TIMEOUT if lock_timeout is None else lock_timeout
+
+    @property
+    def journal_dir(self):
+        return self.cli_config.get('journal_dir')
+
+    @property
+    def input_path(self):
+        return self.cli_config.get('input')
+
+    @property
+    def max_violations(self):
+        return self.cli_config.get('max_violations')
+
+    @property
+    def max_errors(self):
+        return self.cli_config.get('max_errors')
+
+    @property
+    def budgets(self):
+        return self._get_list('budgets', 'budget')
+
+    @property
+    def baseline(self):
+        return self.cli_config.get('baseline')
+
+    @property
+    def baseline_out(self):
+        return self.cli_config.get('baseline_out')
+
+    @property
+    def record_path(self):
+        return self.cli_config.get('record')
+
+    @property
+    def replay_path(self):
+        return self.cli_config.get('replay')
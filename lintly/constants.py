@@ -1,5 +1,6 @@
 FAIL_ON_ANY = 'any'
 FAIL_ON_NEW = 'new'
+FAIL_ON_TOUCHED = 'touched'
 
 # Identifies that a comment came from Lintly. This is used to aid in automatically
 # deleting old PR comments/reviews. This is valid Markdown that is hidden from
@@ -13,3 +14,13 @@ ACTION_REVIEW_REQUEST_CHANGES = 'request_changes'
 ACTION_REVIEW_APPROVE = 'approve'
 ACTION_REVIEW_COMMENT = 'comment'
 ACTION_REVIEW_DO_NOTHING = 'do_nothing'
+
+# How Lintly cleans up the comments it posted on previous builds
+CLEANUP_DELETE = 'delete'
+CLEANUP_MINIMIZE = 'minimize'
+
+# The Git hosting services Lintly can post results to
+BACKEND_GITHUB = 'github'
+BACKEND_GITLAB = 'gitlab'
+# Posts nothing, for dry runs
+BACKEND_DUMMY = 'dummy'
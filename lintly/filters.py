@@ -0,0 +1,180 @@
+"""
+Decides which violations Lintly reports, by code pattern, severity and path glob.
+"""
+import fnmatch
+import re
+
+from .violations import Severity
+
+
+def compile_patterns(patterns):
+    """
+    Compiles a list of shell-style patterns (e.g. "E5*") into a single regex, or returns None
+    if there are no patterns.
+    """
+    patterns = list(patterns or [])
+    if not patterns:
+        return None
+    return re.compile('|'.join('(?:{})'.format(fnmatch.translate(pattern)) for pattern in patterns))
+
+
+def translate_glob(pattern):
+    """
+    Translates a path glob into a regex. Globs follow .gitignore conventions:
+
+        - ``*`` and ``?`` do not match "/", while ``**`` matches any number of directories
+        - a glob without a "/" (other than a trailing one) matches at any depth, so "*.min.js"
+          matches "static/app.min.js"
+        - a glob that matches a directory also matches everything in it, so "vendor" matches
+          "vendor/six.py"
+    """
+    pattern = pattern.strip()
+    if pattern.startswith('./'):
+        pattern = pattern[2:]
+    anchored = '/' in pattern.rstrip('/')
+    pattern = pattern.strip('/')
+
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+            continue
+        elif pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+            continue
+        elif char == '*':
+            parts.append('[^/]*')
+        elif char == '?':
+            parts.append('[^/]')
+        elif char == '[' and pattern.find(']', i + 2) != -1:
+            end = pattern.find(']', i + 2)
+            body = pattern[i + 1:end]
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            parts.append('[{}]'.format(body.replace('\\', '\\\\')))
+            i = end + 1
+            continue
+        else:
+            parts.append(re.escape(char))
+        i += 1
+
+    regex = ''.join(parts)
+    if not anchored:
+        regex = '(?:.*/)?' + regex
+    return regex + '(?:/.*)?'
+
+
+def compile_globs(globs):
+    """
+    Compiles a list of path globs into a single regex, or returns None if there are no globs.
+    """
+    globs = [glob for glob in (globs or []) if glob.strip()]
+    if not globs:
+        return None
+    return re.compile('(?:{})\\Z'.format('|'.join(translate_glob(glob) for glob in globs)))
+
+
+class PathMatcher(object):
+    """
+    Matches file paths against sets of include and exclude globs. A path matches when it
+    matches an include glob (or there are none) and does not match any exclude glob.
+
+    Each set of globs is compiled into one regex, and the result for every path is remembered,
+    so the cost of filtering depends on the number of distinct paths rather than the number
+    of violations.
+    """
+
+    def __init__(self, include=None, exclude=None):
+        self.include = compile_globs(include)
+        self.exclude = compile_globs(exclude)
+        self._results = {}
+
+    @property
+    def is_active(self):
+        return self.include is not None or self.exclude is not None
+
+    def matches(self, path):
+        result = self._results.get(path)
+        if result is None:
+            result = (self.include is None or self.include.match(path) is not None) and \
+                (self.exclude is None or self.exclude.match(path) is None)
+            self._results[path] = result
+        return result
+
+
+class ViolationFilter(object):
+    """
+    Matches violations against include and exclude patterns for their code and file path and
+    against a minimum severity. A violation is reported when it matches an include pattern
+    (or there are none) and does not match any exclude pattern.
+
+    The patterns are compiled once, and the result for each distinct path and code is
+    remembered, so checking a violation is usually two dict lookups. Paths are matched with a
+    ``PathMatcher``, see ``translate_glob`` for the glob syntax.
+    """
+
+    def __init__(self, include_codes=None, exclude_codes=None, min_severity=None,
+                 include_paths=None, exclude_paths=None):
+        self.min_severity = min_severity
+        self._include_codes = compile_patterns(include_codes)
+        self._exclude_codes = compile_patterns(exclude_codes)
+        self.path_matcher = PathMatcher(include_paths, exclude_paths)
+        self._code_results = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Returns a filter for the build's configuration, or None if nothing is filtered.
+        """
+        violation_filter = cls(
+            include_codes=config.include_codes,
+            exclude_codes=config.exclude_codes,
+            min_severity=config.min_severity,
+            include_paths=config.include_paths,
+            exclude_paths=config.exclude_paths,
+        )
+        return violation_filter if violation_filter.is_active else None
+
+    @property
+    def is_active(self):
+        return self.path_matcher.is_active or any(value is not None for value in (
+            self.min_severity, self._include_codes, self._exclude_codes))
+
+    @staticmethod
+    def _matches(value, include, exclude):
+        if include is not None and not include.match(value):
+            return False
+        return exclude is None or not exclude.match(value)
+
+    def matches_path(self, path):
+        return self.path_matcher.matches(path)
+
+    def matches_code(self, code):
+        result = self._code_results.get(code)
+        if result is None:
+            result = self._code_results[code] = self._matches(code, self._include_codes, self._exclude_codes)
+        return result
+
+    def matches_severity(self, severity):
+        return self.min_severity is None or severity >= self.min_severity
+
+    def matches(self, path, code, severity=Severity.WARNING):
+        return self.matches_path(path) and self.matches_code(code) and self.matches_severity(severity)
+
+    def filter_violations(self, violations):
+        """
+        Returns a new dict of file paths to violations with only the violations that match.
+        """
+        filtered = {}
+        for path, file_violations in violations.items():
+            if not self.matches_path(path):
+                continue
+            file_violations = [v for v in file_violations
+                               if self.matches_code(v.code) and self.matches_severity(v.severity)]
+            if file_violations:
+                filtered[path] = file_violations
+        return filtered
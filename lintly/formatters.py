@@ -1,45 +1,121 @@
 """
 Formats text that will be posted to Pull Requests.
 """
+import collections
+import heapq
+import operator
 import os
 
 from jinja2 import Environment, FileSystemLoader
 
 from .constants import LINTLY_IDENTIFIER
+from .violations import ViolationStats
 
 
 TEMPLATES_PATH = os.path.join(os.path.dirname(__file__), 'templates')
 
 
+# Templates ship with Lintly and never change while it runs, so they are compiled once and
+# not checked for changes on every render
 env = Environment(
     loader=FileSystemLoader(TEMPLATES_PATH),
-    autoescape=False
+    autoescape=False,
+    auto_reload=False
 )
 
 
-def build_pr_comment(config, violations):
+# GitHub rejects comments and review bodies longer than this many characters
+MAX_COMMENT_LENGTH = 65536
+
+# Room kept free in a truncated comment for the summary of the issues that were left out
+SUMMARY_LENGTH = 4096
+
+# The number of files and codes listed in the summary of a truncated comment
+SUMMARY_TOP_N = 10
+
+# The number of files and codes listed as the top offenders at the start of a comment or review
+TOP_OFFENDERS_N = 5
+
+# These are rendered once per file and once per violation, so they are formatted directly
+# instead of through a template
+FILE_HEADER = '\n#### {file_path}\n\n'
+VIOLATION_LINE = '* **{violation.code}**: {violation.message} (line: {violation.line}, column: {violation.column})\n'
+
+
+def build_pr_comment(config, violations, max_length=MAX_COMMENT_LENGTH, stats=None):
     """
     Creates a Markdown representation of the comment to be posted to a pull request.
+
+    Violations are added until the comment would be longer than ``max_length`` characters.
+    The rest are not rendered; they are summarized by the files and codes with the most issues.
     :return: The comment
     """
     template = env.get_template('pr_comment.txt')
-    return template.render(violations=violations, LINTLY_IDENTIFIER=LINTLY_IDENTIFIER)
+    context = {
+        'violations': violations,
+        'stats': stats if stats is not None else ViolationStats(violations),
+        'top_n': TOP_OFFENDERS_N,
+        'body': '',
+        'omitted_count': 0,
+        'LINTLY_IDENTIFIER': LINTLY_IDENTIFIER,
+    }
+    if not violations:
+        return template.render(**context)
 
+    budget = max_length - len(template.render(**context)) - SUMMARY_LENGTH
+    parts = []
+    truncated = False
+    omitted_files = collections.Counter()
+    omitted_codes = collections.Counter()
 
-def build_pr_review_line_comment(violation):
+    for file_path, file_violations in violations.items():
+        omitted = file_violations
+        if not truncated:
+            header = FILE_HEADER.format(file_path=file_path)
+            budget -= len(header)
+            parts.append(header)
+            for i, violation in enumerate(file_violations):
+                line = VIOLATION_LINE.format(violation=violation)
+                budget -= len(line)
+                if budget < 0:
+                    truncated = True
+                    if i == 0:
+                        parts.pop()
+                    break
+                parts.append(line)
+            else:
+                continue
+            omitted = file_violations[i:]
+
+        omitted_files[file_path] += len(omitted)
+        omitted_codes.update(v.code for v in omitted)
+
+    context['body'] = ''.join(parts)
+    if truncated:
+        context.update(
+            omitted_count=sum(omitted_files.values()),
+            top_files=heapq.nlargest(SUMMARY_TOP_N, omitted_files.items(), key=operator.itemgetter(1)),
+            top_codes=heapq.nlargest(SUMMARY_TOP_N, omitted_codes.items(), key=operator.itemgetter(1)),
+        )
+    return template.render(**context)
+
+
+def build_pr_review_line_comment(violations):
     """
-    Creates a Markdown representation of the comment to be posted to a pull request.
+    Creates a Markdown representation of the comment to be posted on a single line of a pull request.
+    :param violations: The violations on the line
     :return: The comment
     """
     template = env.get_template('pr_review_line_comment.txt')
-    return template.render(violation=violation, LINTLY_IDENTIFIER=LINTLY_IDENTIFIER)
+    return template.render(violations=violations, LINTLY_IDENTIFIER=LINTLY_IDENTIFIER)
 
 
-def build_check_line_comment(violation):
+def build_check_line_comment(violation_range):
     template = env.get_template('check_line_comment.txt')
-    return template.render(violation=violation)
+    return template.render(violation=violation_range)
 
 
-def build_pr_review_body(violations):
+def build_pr_review_body(violations, stats=None):
     template = env.get_template('pr_review_body.txt')
-    return template.render(violations=violations, LINTLY_IDENTIFIER=LINTLY_IDENTIFIER)
+    return template.render(violations=violations, top_n=TOP_OFFENDERS_N, LINTLY_IDENTIFIER=LINTLY_IDENTIFIER,
+                           stats=stats if stats is not None else ViolationStats(violations))
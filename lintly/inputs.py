@@ -0,0 +1,28 @@
+"""
+Reads linter output from a file on disk instead of stdin.
+"""
+import contextlib
+import mmap
+
+
+@contextlib.contextmanager
+def map_input(path):
+    """
+    Memory-maps the file at ``path`` for reading and yields the map, which parsers read as a
+    bytes-like buffer without copying the whole file into memory. An empty file cannot be
+    mapped, so empty bytes are yielded for it instead.
+    """
+    with open(path, 'rb') as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # The file is empty
+            buffer = None
+
+        if buffer is None:
+            yield b''
+            return
+        try:
+            yield buffer
+        finally:
+            buffer.close()
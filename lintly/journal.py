@@ -0,0 +1,92 @@
+"""
+A checkpoint journal that lets a retried Lintly run pick up where a failed one stopped. It
+records the steps of a run (the cleanup and each batch of review comments) that the Git API
+accepted, so a retry does not delete and post them again.
+"""
+import errno
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from .compat import replace_file
+from .metrics import Metrics
+
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_VERSION = 1
+
+
+def get_step_name(kind, data):
+    """
+    Returns the name of a step that posts ``data``, e.g. "review:3f2a..." for a batch of review
+    comments. The same data always gives the same name, so a retry finds the steps it already did.
+    """
+    digest = hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+    return '{}:{}'.format(kind, digest[:16])
+
+
+class ReviewJournal(object):
+    """
+    The steps completed by the runs for one PR, head SHA and context, kept in a small JSON
+    file in ``directory``. The file is removed when a run finishes, so it only exists after a
+    run has failed part of the way through. Steps can be marked as done from several threads.
+    """
+
+    def __init__(self, directory, key, metrics=None):
+        self.directory = directory
+        self.key = [str(part) for part in key]
+        self.metrics = metrics if metrics is not None else Metrics()
+
+        digest = hashlib.sha256('\n'.join(self.key).encode('utf-8')).hexdigest()
+        self.path = os.path.join(directory, '{}.json'.format(digest[:32]))
+        self._lock = threading.Lock()
+        self.steps = self._load()
+        if self.steps:
+            logger.info('Resuming from {} step(s) completed by an earlier attempt'.format(len(self.steps)))
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return set()
+        if data.get('version') != JOURNAL_VERSION or data.get('key') != self.key:
+            return set()
+        return set(data.get('steps', []))
+
+    def is_done(self, step):
+        done = step in self.steps
+        if done:
+            self.metrics.incr('journal.skipped', step=step.split(':', 1)[0])
+        return done
+
+    def mark_done(self, step):
+        with self._lock:
+            self.steps.add(step)
+            self._save()
+
+    def _save(self):
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+        data = {'version': JOURNAL_VERSION, 'key': self.key, 'steps': sorted(self.steps)}
+        fd, temp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        replace_file(temp_path, self.path)
+
+    def complete(self):
+        """Removes the journal once every step of the run has succeeded."""
+        self.steps = set()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,309 @@
+"""
+Coordinates Lintly runs for the same commit of a PR (e.g. several CI jobs that lint the same
+push) through a directory they all share. The runs take turns to clean up and post, so they
+never delete each other's fresh comments, and they share a single copy of the PR diff.
+
+The shared state only lasts for one wave of runs, i.e. runs that overlap in time. It is
+cleared when the last run of a wave finishes, so running CI again for the same commit later
+cleans up the comments of the earlier runs as usual.
+"""
+import contextlib
+import errno
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .compat import replace_file
+from .metrics import Metrics
+
+
+logger = logging.getLogger(__name__)
+
+LOCK_BACKEND_FILE = 'file'
+LOCK_BACKEND_DIRECTORY = 'directory'
+
+DEFAULT_LOCK_TIMEOUT = 600.0
+
+# How often a waiting run checks whether the lock has been released
+LOCK_POLL_INTERVAL = 0.1
+
+# Directory locks older than this are assumed to belong to a run that died while holding them
+DIRECTORY_LOCK_STALE_AFTER = 1800.0
+
+# State kept for commits older than this is removed
+STATE_MAX_AGE = 24 * 60 * 60
+
+# The names of the state directories and lock files in the lock directory
+STATE_NAME_REGEX = re.compile(r'^[0-9a-f]{32}(\.lock|\.lockdir)?$')
+
+# Each run in a wave has a file with this prefix in the state directory
+PARTICIPANT_PREFIX = 'run-'
+
+
+class BaseLock(object):
+    """
+    An inter-process lock identified by a path. Subclasses implement ``_try_acquire`` and
+    ``release``.
+    """
+
+    def __init__(self, path, poll_interval=LOCK_POLL_INTERVAL, clock=time.time, sleep=time.sleep):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.sleep = sleep
+
+    def acquire(self, timeout=None):
+        """
+        Waits up to ``timeout`` seconds (forever if None) for the lock. Returns True if it was
+        acquired.
+        """
+        deadline = None if timeout is None else self.clock() + timeout
+        while not self._try_acquire():
+            if deadline is not None and self.clock() >= deadline:
+                return False
+            self.sleep(self.poll_interval)
+        return True
+
+    def _try_acquire(self):
+        raise NotImplementedError
+
+    def release(self):
+        raise NotImplementedError
+
+
+class FileLock(BaseLock):
+    """
+    A lock held with ``flock`` on a lock file. The operating system releases it if the process
+    holding it dies. Only available on POSIX systems.
+    """
+
+    def __init__(self, path, **kwargs):
+        super(FileLock, self).__init__(path + '.lock', **kwargs)
+        self._file = None
+
+    def _try_acquire(self):
+        lock_file = open(self.path, 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError) as e:
+            lock_file.close()
+            if e.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+            return False
+        self._file = lock_file
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class DirectoryLock(BaseLock):
+    """
+    A lock held by creating a directory, which is atomic on every platform and on most network
+    file systems. A lock that has been held for longer than ``stale_after`` seconds is broken.
+    """
+
+    def __init__(self, path, stale_after=DIRECTORY_LOCK_STALE_AFTER, **kwargs):
+        super(DirectoryLock, self).__init__(path + '.lockdir', **kwargs)
+        self.stale_after = stale_after
+
+    def _try_acquire(self):
+        try:
+            os.mkdir(self.path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+            self._break_if_stale()
+            return False
+        return True
+
+    def _break_if_stale(self):
+        try:
+            age = self.clock() - os.path.getmtime(self.path)
+        except OSError:
+            return
+        if age > self.stale_after:
+            logger.warning('Breaking lock {} which has been held for {:.0f}s'.format(self.path, age))
+            try:
+                os.rmdir(self.path)
+            except OSError:
+                pass
+
+    def release(self):
+        try:
+            os.rmdir(self.path)
+        except OSError:
+            pass
+
+
+LOCK_BACKENDS = {
+    LOCK_BACKEND_FILE: FileLock,
+    LOCK_BACKEND_DIRECTORY: DirectoryLock,
+}
+
+
+def get_default_lock_backend():
+    return LOCK_BACKEND_FILE if fcntl is not None else LOCK_BACKEND_DIRECTORY
+
+
+class RunCoordinator(object):
+    """
+    Shares a lock and a little state between the Lintly runs for one commit of a PR. The
+    state lives in a subdirectory of ``lock_dir`` named after a hash of ``key``.
+    """
+
+    def __init__(self, lock_dir, key, backend=None, timeout=DEFAULT_LOCK_TIMEOUT, metrics=None):
+        self.lock_dir = lock_dir
+        self.timeout = timeout
+        self.metrics = metrics if metrics is not None else Metrics()
+
+        digest = hashlib.sha256('\n'.join(str(part) for part in key).encode('utf-8')).hexdigest()
+        self.state_dir = os.path.join(lock_dir, digest[:32])
+        if not os.path.isdir(self.state_dir):
+            try:
+                os.makedirs(self.state_dir)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+        lock_class = LOCK_BACKENDS[backend or get_default_lock_backend()]
+        self._lock = lock_class(self.state_dir)
+        self._depth = 0
+
+        # Joining the wave doesn't need the lock: a run that finishes either sees this file,
+        # or it has already cleared the state and this run starts a new wave
+        self._participant = self._get_path(PARTICIPANT_PREFIX + uuid.uuid4().hex)
+        open(self._participant, 'w').close()
+
+    @contextlib.contextmanager
+    def lock(self):
+        """
+        Holds the lock for the duration of the block. If the lock cannot be acquired within the
+        timeout the block runs anyway, so a stuck run never blocks the others for good.
+        """
+        if self._depth:
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+            return
+
+        with self.metrics.timer('coordination.wait'):
+            acquired = self._lock.acquire(self.timeout)
+        if not acquired:
+            logger.warning('Timed out after {:.0f}s waiting for other Lintly runs for this commit. '
+                           'Continuing without the lock'.format(self.timeout))
+            self.metrics.incr('coordination.lock_timeouts')
+
+        self._depth = 1
+        try:
+            yield
+        finally:
+            self._depth = 0
+            if acquired:
+                self._lock.release()
+
+    def _get_path(self, name):
+        return os.path.join(self.state_dir, name)
+
+    def get_shared(self, name, produce):
+        """
+        Returns the text stored under ``name`` by an earlier run, or else calls ``produce``,
+        stores its result for later runs and returns it.
+        """
+        path = self._get_path(name)
+        with self.lock():
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    self.metrics.incr('coordination.shared', item=name)
+                    return f.read().decode('utf-8')
+
+            value = produce()
+            self._write_atomic(path, value.encode('utf-8'))
+            return value
+
+    def run_once(self, name, func):
+        """
+        Calls ``func`` unless an earlier run has already called it successfully for ``name``.
+        Returns True if ``func`` was called.
+        """
+        path = self._get_path(name)
+        with self.lock():
+            if os.path.exists(path):
+                return False
+            func()
+            self._write_atomic(path, b'')
+            return True
+
+    def finish(self, stale_after=DIRECTORY_LOCK_STALE_AFTER, clock=time.time):
+        """
+        Leaves the wave. The last run to leave clears the shared state, so that the next wave
+        fetches the diff and cleans up again. Runs that joined more than ``stale_after``
+        seconds ago are assumed to have died without leaving.
+        """
+        with self.lock():
+            _remove(self._participant)
+            names = os.listdir(self.state_dir)
+            for name in names:
+                path = self._get_path(name)
+                if name.startswith(PARTICIPANT_PREFIX):
+                    try:
+                        if clock() - os.path.getmtime(path) <= stale_after:
+                            return
+                    except OSError:
+                        continue
+                    _remove(path)
+            for name in names:
+                if not name.startswith(PARTICIPANT_PREFIX):
+                    _remove(self._get_path(name))
+
+    def _write_atomic(self, path, data):
+        fd, temp_path = tempfile.mkstemp(dir=self.state_dir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        replace_file(temp_path, path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def prune_state(lock_dir, max_age=STATE_MAX_AGE, clock=time.time):
+    """
+    Removes the state and lock files kept for commits that have not been touched for
+    ``max_age`` seconds. Anything else in ``lock_dir`` is left alone.
+    """
+    try:
+        names = os.listdir(lock_dir)
+    except OSError:
+        return
+    for name in names:
+        if not STATE_NAME_REGEX.match(name):
+            continue
+        path = os.path.join(lock_dir, name)
+        try:
+            if clock() - os.path.getmtime(path) <= max_age:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+        except OSError:
+            continue
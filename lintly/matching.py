@@ -0,0 +1,81 @@
+"""
+Matches the violations in a file against the lines of a diff in bulk. The line numbers of the
+violations and of the diff are held in sorted arrays and intersected with a single merge, or
+with NumPy's ``searchsorted`` when NumPy is installed and the file has many violations, and the
+matching Violation objects are only picked out at the end.
+"""
+import bisect
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Files with fewer violations than this are matched in pure Python, which is faster than
+# converting small arrays for NumPy
+NUMPY_MIN_VIOLATIONS = 2048
+
+
+def get_line_arrays(violations):
+    """Returns arrays of the first and last line of each violation, in the same order."""
+    starts = array('I', [v.line for v in violations])
+    ends = array('I', [v.end_line or v.line for v in violations])
+    return starts, ends
+
+
+def match_intervals(starts, ends, interval_starts, interval_ends):
+    """
+    Returns the indices of the ranges from ``starts[i]`` to ``ends[i]`` that overlap any of the
+    intervals from ``interval_starts[j]`` to ``interval_ends[j]``. The intervals must be sorted
+    and must not overlap each other, e.g. the hunks of a file, or its added lines as intervals of
+    a single line. The ranges can be in any order, but sorted ranges are matched with a merge.
+    """
+    if not interval_starts:
+        return []
+    if numpy is not None and len(starts) >= NUMPY_MIN_VIOLATIONS:
+        return _match_intervals_numpy(starts, ends, interval_starts, interval_ends)
+
+    matched = []
+    count = len(interval_ends)
+    j = 0
+    previous = 0
+    for i, start in enumerate(starts):
+        if start < previous:
+            # The ranges went back, so find the first interval that could overlap again
+            j = bisect.bisect_left(interval_ends, start)
+        else:
+            while j < count and interval_ends[j] < start:
+                j += 1
+        previous = start
+        if j == count:
+            continue
+        if interval_starts[j] <= ends[i]:
+            matched.append(i)
+    return matched
+
+
+def _as_numpy(values):
+    return numpy.frombuffer(values, dtype='=u{}'.format(values.itemsize))
+
+
+def _match_intervals_numpy(starts, ends, interval_starts, interval_ends):
+    starts, ends = _as_numpy(starts), _as_numpy(ends)
+    interval_starts, interval_ends = _as_numpy(interval_starts), _as_numpy(interval_ends)
+
+    # The first interval that ends at or after the start of each range is the only one that can overlap it
+    first = numpy.searchsorted(interval_ends, starts, side='left')
+    in_bounds = first < len(interval_ends)
+    overlaps = numpy.zeros(len(starts), dtype=bool)
+    overlaps[in_bounds] = interval_starts[first[in_bounds]] <= ends[in_bounds]
+    return numpy.flatnonzero(overlaps).tolist()
+
+
+def match_violations(violations, interval_starts, interval_ends):
+    """
+    Returns the violations (in their original order) whose lines overlap any of the sorted
+    intervals from ``interval_starts[j]`` to ``interval_ends[j]``.
+    """
+    starts, ends = get_line_arrays(violations)
+    return [violations[i] for i in match_intervals(starts, ends, interval_starts, interval_ends)]
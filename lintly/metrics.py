@@ -0,0 +1,190 @@
+"""
+Collects timings and counters for a Lintly build and writes them out as JSON, StatsD or
+Prometheus text so that runs can be compared over time.
+"""
+import bisect
+import collections
+import contextlib
+import json
+import re
+import threading
+import time
+
+
+METRICS_FORMAT_JSON = 'json'
+METRICS_FORMAT_STATSD = 'statsd'
+METRICS_FORMAT_PROMETHEUS = 'prometheus'
+METRICS_FORMATS = [METRICS_FORMAT_JSON, METRICS_FORMAT_STATSD, METRICS_FORMAT_PROMETHEUS]
+
+METRICS_PREFIX = 'lintly'
+
+# Upper bounds (in seconds) of the histogram buckets used for every timer
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+ENDPOINT_SUBSTITUTIONS = [
+    (re.compile(r'^/repos/[^/]+/[^/]+'), '/repos/{owner}/{repo}'),
+    (re.compile(r'^/projects/[^/]+'), '/projects/{project}'),
+    (re.compile(r'/[0-9a-f]{40}(?=/|$)'), '/{sha}'),
+    (re.compile(r'/\d+(?=/|$)'), '/{id}'),
+]
+
+
+def normalize_endpoint(url):
+    """
+    Turns a request path into an endpoint name by replacing owners, repos, IDs and SHAs with
+    placeholders, e.g. "/repos/owner/repo/pulls/12" becomes "/repos/{owner}/{repo}/pulls/{id}".
+    """
+    endpoint = url.split('?', 1)[0]
+    for regex, replacement in ENDPOINT_SUBSTITUTIONS:
+        endpoint = regex.sub(replacement, endpoint)
+    return endpoint
+
+
+def _key(name, tags):
+    return name, tuple(sorted((tags or {}).items()))
+
+
+class Timer(object):
+    """Keeps summary statistics and histogram bucket counts for a series of durations."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+        self.buckets[bisect.bisect_left(HISTOGRAM_BUCKETS, seconds)] += 1
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.total / self.count if self.count else None,
+            'buckets': dict(zip([str(b) for b in HISTOGRAM_BUCKETS] + ['+Inf'], self.buckets)),
+        }
+
+
+class Metrics(object):
+    """
+    A collection of counters, gauges and timers. Each metric is identified by a name and an
+    optional dict of tags, e.g. ``metrics.incr('api.requests', endpoint='/user')``.
+    """
+
+    def __init__(self):
+        self.counters = collections.defaultdict(int)
+        self.gauges = {}
+        self.timers = collections.defaultdict(Timer)
+        self._lock = threading.Lock()
+
+    def incr(self, name, value=1, **tags):
+        with self._lock:
+            self.counters[_key(name, tags)] += value
+
+    def gauge(self, name, value, **tags):
+        self.gauges[_key(name, tags)] = value
+
+    def observe(self, name, seconds, **tags):
+        with self._lock:
+            self.timers[_key(name, tags)].observe(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name, **tags):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(name, time.time() - start, **tags)
+
+    def get_counter(self, name, **tags):
+        return self.counters.get(_key(name, tags), 0)
+
+    def get_total(self, name):
+        """Returns the sum of a counter across all of its tags."""
+        return sum(value for (counter_name, _), value in self.counters.items() if counter_name == name)
+
+    def as_dict(self):
+        def records(metrics, value_func):
+            return [dict(name=name, tags=dict(tags), **value_func(value))
+                    for (name, tags), value in sorted(metrics.items())]
+
+        return {
+            'counters': records(self.counters, lambda value: {'value': value}),
+            'gauges': records(self.gauges, lambda value: {'value': value}),
+            'timers': records(self.timers, lambda timer: timer.as_dict()),
+        }
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2, sort_keys=True)
+
+    def to_statsd(self):
+        """
+        Returns the metrics as StatsD lines. Tags are written in the DogStatsD "|#tag:value" style.
+        """
+        def line(name, tags, value, metric_type):
+            text = '{}.{}:{}|{}'.format(METRICS_PREFIX, name, value, metric_type)
+            if tags:
+                text += '|#' + ','.join('{}:{}'.format(k, v) for k, v in tags)
+            return text
+
+        lines = []
+        for (name, tags), value in sorted(self.counters.items()):
+            lines.append(line(name, tags, value, 'c'))
+        for (name, tags), value in sorted(self.gauges.items()):
+            lines.append(line(name, tags, value, 'g'))
+        for (name, tags), timer in sorted(self.timers.items()):
+            lines.append(line(name, tags, int(round(timer.total * 1000)), 'ms'))
+        return '\n'.join(lines) + '\n'
+
+    def to_prometheus(self):
+        """
+        Returns the metrics in the Prometheus text exposition format. Timers are written as
+        histograms measured in seconds.
+        """
+        def metric_name(name):
+            return '{}_{}'.format(METRICS_PREFIX, re.sub(r'[^a-zA-Z0-9_]', '_', name))
+
+        def labels(tags, extra=()):
+            pairs = list(tags) + list(extra)
+            if not pairs:
+                return ''
+            return '{' + ','.join('{}="{}"'.format(k, str(v).replace('"', '\\"')) for k, v in pairs) + '}'
+
+        lines = []
+        for metric_type, metrics in (('counter', self.counters), ('gauge', self.gauges)):
+            seen = set()
+            for (name, tags), value in sorted(metrics.items()):
+                if name not in seen:
+                    lines.append('# TYPE {} {}'.format(metric_name(name), metric_type))
+                    seen.add(name)
+                lines.append('{}{} {}'.format(metric_name(name), labels(tags), value))
+
+        seen = set()
+        for (name, tags), timer in sorted(self.timers.items()):
+            base = metric_name(name) + '_seconds'
+            if name not in seen:
+                lines.append('# TYPE {} histogram'.format(base))
+                seen.add(name)
+            cumulative = 0
+            for bound, count in zip([str(b) for b in HISTOGRAM_BUCKETS] + ['+Inf'], timer.buckets):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(base, labels(tags, [('le', bound)]), cumulative))
+            lines.append('{}_sum{} {}'.format(base, labels(tags), timer.total))
+            lines.append('{}_count{} {}'.format(base, labels(tags), timer.count))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path, metrics_format=METRICS_FORMAT_JSON):
+        renderers = {
+            METRICS_FORMAT_JSON: self.to_json,
+            METRICS_FORMAT_STATSD: self.to_statsd,
+            METRICS_FORMAT_PROMETHEUS: self.to_prometheus,
+        }
+        with open(path, 'w') as f:
+            f.write(renderers[metrics_format]())
@@ -3,18 +3,88 @@
 Parsers accept linter output and return file paths and all of the violations in that file.
 """
 import collections
+import functools
+import importlib
+import io
+import itertools
 import json
+import logging
 import os
 import re
+from xml.etree import ElementTree
 
-from .violations import Violation
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+import six
+from cached_property import cached_property
+from six.moves.urllib.parse import unquote
+
+from .violations import Severity, Violation
+
+
+logger = logging.getLogger(__name__)
+
+# Third-party packages register parsers under this entry point group, e.g. in setup.py:
+#
+#     entry_points={'lintly.parsers': ['mylinter = mypackage.lintly:MyLinterParser']}
+PARSER_ENTRY_POINT_GROUP = 'lintly.parsers'
+
+# The whitespace stripped from the ends of lines read from a buffer, as byte values
+BUFFER_WHITESPACE = frozenset(b' \t\r\x0b\x0c')
+
+BLANK_BUFFER_REGEX = re.compile(br'\s*\Z')
 
 
 class BaseLintParser(object):
 
-    def parse_violations(self, output):
+    # True if the parser implements ``parse_lines`` and only needs to see one line of the
+    # output at a time, so output piped to Lintly is parsed as it is read, rather than read
+    # into memory all at once.
+    supports_streaming = False
+
+    # True if the output can be split on line boundaries and each chunk parsed on its own.
+    # Merging the violations of every chunk gives the same result as parsing the whole output,
+    # so ``parse_buffer`` decodes and parses a large buffer one chunk at a time.
+    supports_parallel = False
+
+    def parse_violations(self, output, violation_filter=None):
+        """
+        Returns a dict of file paths to the violations in that file. Violations that do not
+        match ``violation_filter`` (a ``lintly.filters.ViolationFilter``) are skipped before
+        they are created.
+        """
         raise NotImplementedError
 
+    def parse_lines(self, lines, violation_filter=None):
+        """
+        Returns the violations in an iterable of output lines. Parsers that do not support
+        streaming join the lines and parse them as a whole.
+        """
+        return self.parse_violations('\n'.join(line.rstrip('\r\n') for line in lines),
+                                     violation_filter=violation_filter)
+
+    def parse_buffer(self, buffer, violation_filter=None):
+        """
+        Returns the violations in a buffer of UTF-8 encoded output, such as a memory-mapped
+        file. Parsers that cannot read the bytes directly decode the buffer, a chunk of whole
+        lines at a time if they support parallel parsing, or all at once otherwise.
+        """
+        if not self.supports_parallel:
+            return self.parse_violations(six.text_type(buffer, 'utf-8'), violation_filter=violation_filter)
+
+        violations = collections.defaultdict(list)
+        for chunk in _iter_buffer_chunks(buffer):
+            chunk_violations = self.parse_violations(six.text_type(chunk, 'utf-8'), violation_filter=violation_filter)
+            for path, path_violations in chunk_violations.items():
+                violations[path].extend(path_violations)
+        return violations
+
+    def _is_filtered_out(self, violation_filter, path, code, severity=Severity.WARNING):
+        return violation_filter is not None and not violation_filter.matches(path, code, severity)
+
     def _get_working_dir(self):
         return os.getcwd()
 
@@ -36,39 +106,185 @@ class LineRegexParser(BaseLintParser):
         - column
         - code
         - message
+
+    It may also match a "severity" group, which is looked up in ``severities``.
     """
 
-    def __init__(self, regex):
+    supports_streaming = True
+    supports_parallel = True
+
+    def __init__(self, regex, severities=None):
         self.regex = regex
+        self.severities = severities or {}
 
-    def parse_violations(self, output):
-        violations = collections.defaultdict(list)
+    def parse_violations(self, output, violation_filter=None):
+        return self.parse_lines(output.strip().splitlines(), violation_filter=violation_filter)
 
-        line_regex = re.compile(self.regex)
+    @cached_property
+    def _line_regex(self):
+        return re.compile(self.regex)
+
+    def parse_lines(self, lines, violation_filter=None):
+        violations = collections.defaultdict(list)
 
         # Collect all the issues into a dict where the keys are the file paths and the values are a
         # list of the issues in that file.
-        for line in output.strip().splitlines():
-            clean_line = line.strip()
+        for line in lines:
+            self._parse_line(line, violations, violation_filter)
+
+        return violations
+
+    def _parse_line(self, line, violations, violation_filter):
+        match = self._line_regex.match(line.strip())
+        if not match:
+            return
 
-            match = line_regex.match(clean_line)
+        path = self._normalize_path(match.group('path'))
+        code = match.group('code')
+        severity = self.severities.get(match.groupdict().get('severity'), Severity.WARNING)
+        if self._is_filtered_out(violation_filter, path, code, severity):
+            return
 
+        violation = Violation(
+            line=int(match.group('line')),
+            column=int(match.group('column')),
+            code=code,
+            message=match.group('message'),
+            severity=severity
+        )
+
+        violations[path].append(violation)
+
+    @cached_property
+    def _bytes_regex(self):
+        return re.compile(self.regex.encode('utf-8'), re.MULTILINE)
+
+    def parse_buffer(self, buffer, violation_filter=None):
+        """
+        Matches the regex against each line of the buffer in place, so that only the fields of
+        matching lines are copied and decoded. Each distinct path is only normalized once.
+        """
+        violations = collections.defaultdict(list)
+        line_regex = self._bytes_regex
+        paths = {}
+
+        size = len(buffer)
+        start = 0
+        while start < size:
+            end = buffer.find(b'\n', start)
+            next_start = end + 1
+            if end < 0:
+                end = next_start = size
+            while end > start and buffer[end - 1] in BUFFER_WHITESPACE:
+                end -= 1
+
+            if buffer[start] in BUFFER_WHITESPACE:
+                # Lines with leading whitespace are rare, so they are copied to be stripped
+                match = line_regex.match(buffer[start:end].lstrip())
+            else:
+                match = line_regex.match(buffer, start, end)
+            start = next_start
             if not match:
                 continue
 
-            path = self._normalize_path(match.group('path'))
+            raw_path = match.group('path')
+            path = paths.get(raw_path)
+            if path is None:
+                path = paths[raw_path] = self._normalize_path(raw_path.decode('utf-8', 'replace'))
+            code = match.group('code').decode('utf-8', 'replace')
+            severity_name = match.groupdict().get('severity')
+            severity = self.severities.get(severity_name and severity_name.decode('utf-8'), Severity.WARNING)
+            if self._is_filtered_out(violation_filter, path, code, severity):
+                continue
 
-            violation = Violation(
+            violations[path].append(Violation(
                 line=int(match.group('line')),
                 column=int(match.group('column')),
-                code=match.group('code'),
-                message=match.group('message')
-            )
+                code=code,
+                message=match.group('message').decode('utf-8', 'replace'),
+                severity=severity
+            ))
+
+        return violations
 
-            violations[path].append(violation)
 
+class Flake8Parser(LineRegexParser):
+    """
+    A parser for flake8's default ``path:line:column: CODE message`` format. Rather than running
+    the regex on every decoded line, each line is split on its raw bytes, and only the lines that
+    don't fit the simple format (e.g. Windows paths, or messages with a colon in them) fall back
+    to the regex, so the result is always the same as the regex's.
+    """
+
+    def __init__(self):
+        super(Flake8Parser, self).__init__(FLAKE8_REGEX)
+
+    def parse_violations(self, output, violation_filter=None):
+        violations = collections.defaultdict(list)
+        # surrogatepass keeps any lone surrogates from stdin through the round trip to bytes
+        self._parse_bytes(output.encode('utf-8', 'surrogatepass'), violations, {}, violation_filter, 'surrogatepass')
+        return violations
+
+    def parse_buffer(self, buffer, violation_filter=None):
+        """
+        Parses the buffer a chunk of whole lines at a time, so that a memory-mapped file is never
+        copied in full.
+        """
+        violations = collections.defaultdict(list)
+        paths = {}
+        for chunk in _iter_buffer_chunks(buffer):
+            self._parse_bytes(chunk, violations, paths, violation_filter, 'replace')
         return violations
 
+    def _parse_bytes(self, data, violations, paths, violation_filter, errors):
+        for line in data.splitlines():
+            line = line.strip()
+            parts = line.split(b':', 3)
+            if len(parts) == 4 and line[0] < 0x80 and line[-1] < 0x80:
+                raw_path, line_number, column, rest = parts
+                code, space, message = rest[1:].partition(b' ')
+                if (space and rest[:1] == b' ' and line_number.isdigit() and column.isdigit() and
+                        code[1:].isdigit() and (code[:1].isalnum() or code[:1] == b'_') and b':' not in message):
+                    path = paths.get(raw_path)
+                    if path is None:
+                        path = paths[raw_path] = self._normalize_path(raw_path.decode('utf-8', errors))
+                    code = code.decode('ascii')
+                    if self._is_filtered_out(violation_filter, path, code, Severity.WARNING):
+                        continue
+                    violations[path].append(Violation(
+                        line=int(line_number),
+                        column=int(column),
+                        code=code,
+                        message=message.decode('utf-8', errors),
+                        severity=Severity.WARNING
+                    ))
+                    continue
+            if line:
+                self._parse_line(line.decode('utf-8', errors), violations, violation_filter)
+
+
+# The size of the chunks that parsers supporting parallel parsing read from a buffer
+BUFFER_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def _iter_buffer_chunks(buffer, chunk_size=None):
+    """
+    Yields copies of ``buffer`` that end on a line break, each about ``chunk_size`` (by default
+    ``BUFFER_CHUNK_SIZE``) long.
+    """
+    chunk_size = chunk_size or BUFFER_CHUNK_SIZE
+    size = len(buffer)
+    start = 0
+    while start < size:
+        end = start + chunk_size
+        if end < size:
+            line_end = buffer.rfind(b'\n', start, end)
+            if line_end < 0:
+                line_end = buffer.find(b'\n', end)
+            end = size if line_end < 0 else line_end + 1
+        yield buffer[start:end]
+        start = end
+
 
 class PylintJSONParser(BaseLintParser):
     """
@@ -89,7 +305,16 @@ class PylintJSONParser(BaseLintParser):
         ]
     """
 
-    def parse_violations(self, output):
+    SEVERITIES = {
+        'fatal': Severity.ERROR,
+        'error': Severity.ERROR,
+        'warning': Severity.WARNING,
+        'refactor': Severity.INFO,
+        'convention': Severity.INFO,
+        'info': Severity.INFO,
+    }
+
+    def parse_violations(self, output, violation_filter=None):
         # Sometimes pylint will output "No config file found, using default configuration".
         # This handles that case by removing that line.
         if output and output.startswith('No config'):
@@ -104,14 +329,19 @@ class PylintJSONParser(BaseLintParser):
         violations = collections.defaultdict(list)
 
         for violation_json in json_data:
+            path = self._normalize_path(violation_json['path'])
+            code = '{} ({})'.format(violation_json['message-id'], violation_json['symbol'])
+            severity = self.SEVERITIES.get(violation_json.get('type'), Severity.WARNING)
+            if self._is_filtered_out(violation_filter, path, code, severity):
+                continue
+
             violation = Violation(
                 line=violation_json['line'],
                 column=violation_json['column'],
-                code='{} ({})'.format(violation_json['message-id'], violation_json['symbol']),
-                message=violation_json['message']
+                code=code,
+                message=violation_json['message'],
+                severity=severity
             )
-
-            path = self._normalize_path(violation_json['path'])
             violations[path].append(violation)
 
         return violations
@@ -119,7 +349,12 @@ class PylintJSONParser(BaseLintParser):
 
 class ESLintParser(BaseLintParser):
 
-    def parse_violations(self, output):
+    SEVERITIES = {
+        'error': Severity.ERROR,
+        'warning': Severity.WARNING,
+    }
+
+    def parse_violations(self, output, violation_filter=None):
         violations = collections.defaultdict(list)
 
         current_file = None
@@ -129,14 +364,21 @@ class ESLintParser(BaseLintParser):
         for line in output.strip().splitlines():
             if line.startswith(' '):
                 # This line is a linting violation
-                regex = r'^(?P<line>\d+):(?P<column>\d+)\s+(error|warning)\s+(?P<message>.*)\s+(?P<code>.+)$'
+                regex = (r'^(?P<line>\d+):(?P<column>\d+)\s+(?P<severity>error|warning)\s+'
+                         r'(?P<message>.*)\s+(?P<code>.+)$')
                 match = re.match(regex, line.strip())
 
+                code = match.group('code').strip()
+                severity = self.SEVERITIES[match.group('severity')]
+                if self._is_filtered_out(violation_filter, current_file, code, severity):
+                    continue
+
                 violation = Violation(
                     line=int(match.group('line')),
                     column=int(match.group('column')),
-                    code=match.group('code').strip(),
-                    message=match.group('message').strip()
+                    code=code,
+                    message=match.group('message').strip(),
+                    severity=severity
                 )
                 violations[current_file].append(violation)
             elif line.startswith('✖'):
@@ -151,7 +393,7 @@ class ESLintParser(BaseLintParser):
 
 class StylelintParser(BaseLintParser):
 
-    def parse_violations(self, output):
+    def parse_violations(self, output, violation_filter=None):
         violations = collections.defaultdict(list)
 
         current_file = None
@@ -164,11 +406,17 @@ class StylelintParser(BaseLintParser):
                 regex = r'^(?P<line>\d+):(?P<column>\d+)\s+✖\s+(?P<message>.*)\s+(?P<code>.+)$'
                 match = re.match(regex, line.strip())
 
+                # Stylelint marks errors with ✖
+                code = match.group('code').strip()
+                if self._is_filtered_out(violation_filter, current_file, code, Severity.ERROR):
+                    continue
+
                 violation = Violation(
                     line=int(match.group('line')),
                     column=int(match.group('column')),
-                    code=match.group('code').strip(),
-                    message=match.group('message').strip()
+                    code=code,
+                    message=match.group('message').strip(),
+                    severity=Severity.ERROR
                 )
                 violations[current_file].append(violation)
             else:
@@ -181,13 +429,15 @@ class StylelintParser(BaseLintParser):
 class BlackParser(BaseLintParser):
     """A parser for the `black [source] --check` command."""
 
-    def parse_violations(self, output):
+    def parse_violations(self, output, violation_filter=None):
         violations = {}
         for line in output.strip().splitlines():
             # That means a file needs to be formatted by `black`.
             if line.startswith('would reformat '):
                 # Last part is the file path.
                 path = self._normalize_path(line.split(' ')[-1])
+                if self._is_filtered_out(violation_filter, path, '`black`'):
+                    continue
                 violations[path] = [Violation(
                     line=1, column=1, code='`black`', message='this file needs to be formatted'
                 )]
@@ -203,10 +453,16 @@ class CfnLintParser(BaseLintParser):
       template.yaml:2:9
     """
 
-    def parse_violations(self, output):
+    SEVERITIES = {
+        'E': Severity.ERROR,
+        'W': Severity.WARNING,
+        'I': Severity.INFO,
+    }
+
+    def parse_violations(self, output, violation_filter=None):
         violations = collections.defaultdict(list)
 
-        regex = re.compile(r"[EW]\d{4}\s")
+        regex = re.compile(r"[EWI]\d{4}\s")
 
         next_line_is_path = False
         current_violation = None
@@ -221,12 +477,15 @@ class CfnLintParser(BaseLintParser):
                 path = self._normalize_path(path)
 
                 code, message = current_violation.split(" ", 1)
+                severity = self.SEVERITIES[code[0]]
 
-                violation = Violation(line=int(line_number),
-                                      column=int(column),
-                                      code=code,
-                                      message=message)
-                violations[path].append(violation)
+                if not self._is_filtered_out(violation_filter, path, code, severity):
+                    violation = Violation(line=int(line_number),
+                                          column=int(column),
+                                          code=code,
+                                          message=message,
+                                          severity=severity)
+                    violations[path].append(violation)
 
                 next_line_is_path = False
                 current_violation = None
@@ -236,7 +495,12 @@ class CfnLintParser(BaseLintParser):
 
 class CfnNagParser(BaseLintParser):
 
-    def parse_violations(self, output):
+    SEVERITIES = {
+        'FAIL': Severity.ERROR,
+        'WARN': Severity.WARNING,
+    }
+
+    def parse_violations(self, output, violation_filter=None):
 
         file_list = json.loads(output)
         violations = {}
@@ -244,12 +508,16 @@ class CfnNagParser(BaseLintParser):
         for file in file_list:
             file_violations = []
             for violation_info in file["file_results"]["violations"]:
+                severity = self.SEVERITIES.get(violation_info.get("type"), Severity.WARNING)
+                if self._is_filtered_out(violation_filter, file["filename"], violation_info["id"], severity):
+                    continue
                 for line_number in violation_info["line_numbers"]:
                     violation = Violation(
                         line=line_number,
                         column=0,
                         code=violation_info["id"],
-                        message=violation_info["message"]
+                        message=violation_info["message"],
+                        severity=severity
                     )
 
                     file_violations.append(violation)
@@ -259,41 +527,435 @@ class CfnNagParser(BaseLintParser):
         return violations
 
 
-DEFAULT_PARSER = LineRegexParser(r'^(?P<path>.*):(?P<line>\d+):(?P<column>\d+): (?P<code>\w\d+) (?P<message>.*)$')
+class LineStream(object):
+    """
+    A minimal binary file object that reads from an iterable of lines, so that parsers built
+    on file-based readers can stream their input. Lines may be text or bytes, with or without
+    their line endings.
+    """
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._buffer = bytearray()
+
+    def read(self, size=-1):
+        while size is None or size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            if not isinstance(line, bytes):
+                line = line.encode('utf-8')
+            self._buffer += line
+            if not line.endswith(b'\n'):
+                self._buffer += b'\n'
+
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+class BufferReader(object):
+    """
+    A minimal binary file object that reads from a buffer, such as a memory-mapped file, one
+    chunk at a time.
+    """
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        self._position = 0
+
+    def read(self, size=-1):
+        start = self._position
+        end = len(self._buffer) if size is None or size < 0 else min(start + size, len(self._buffer))
+        self._position = end
+        return bytes(self._buffer[start:end])
+
+
+def _is_blank(buffer):
+    return BLANK_BUFFER_REGEX.match(buffer) is not None
+
+
+def _skip_blank_lines(lines):
+    """Returns ``lines`` without its leading blank lines, or None if every line is blank."""
+    lines = iter(lines)
+    for line in lines:
+        if line.strip():
+            return itertools.chain([line], lines)
+    return None
+
+
+def _import_ijson():
+    try:
+        import ijson
+    except ImportError:
+        return None
+    return ijson
+
+
+class SarifParser(BaseLintParser):
+    """
+    A parser for SARIF 2.1 logs, as written by CodeQL, Semgrep and many other tools:
+
+        {
+            "runs": [{
+                "tool": {"driver": {"name": "Semgrep", "rules": [...]}},
+                "results": [{
+                    "ruleId": "python.lang.security.audit.eval-detected",
+                    "level": "warning",
+                    "message": {"text": "Detected the use of eval()."},
+                    "locations": [{
+                        "physicalLocation": {
+                            "artifactLocation": {"uri": "app/views.py"},
+                            "region": {"startLine": 12, "startColumn": 5, "endLine": 14}
+                        }
+                    }]
+                }]
+            }]
+        }
+
+    When ijson is installed the log is read one result at a time, so memory use does not
+    grow with the size of the log. Otherwise the whole log is loaded with ``json``.
+
+    A result without a level takes the default level of its rule, which is only known if the
+    rules come before the results in the log (as they do in the output of every common tool).
+    """
+
+    supports_streaming = True
+
+    LEVELS = {
+        'error': Severity.ERROR,
+        'warning': Severity.WARNING,
+        'note': Severity.INFO,
+        'none': Severity.INFO,
+    }
+
+    RULE_PREFIX = 'runs.item.tool.driver.rules.item'
+    RESULT_PREFIX = 'runs.item.results.item'
+
+    def parse_violations(self, output, violation_filter=None):
+        if not output.strip():
+            return {}
+        return self.parse_lines(output.splitlines(True), violation_filter=violation_filter)
+
+    def parse_lines(self, lines, violation_filter=None):
+        lines = _skip_blank_lines(lines)
+        if lines is None:
+            return {}
+        ijson = _import_ijson()
+        if ijson is None:
+            log = json.loads(''.join(line if isinstance(line, six.text_type) else line.decode('utf-8')
+                                     for line in lines) or '{}')
+            items = self._iter_log_items(log)
+        else:
+            items = self._iter_stream_items(ijson, LineStream(lines))
+        return self._parse_items(items, violation_filter)
+
+    def parse_buffer(self, buffer, violation_filter=None):
+        if _is_blank(buffer):
+            return {}
+        ijson = _import_ijson()
+        if ijson is None:
+            return super(SarifParser, self).parse_buffer(buffer, violation_filter=violation_filter)
+        return self._parse_items(self._iter_stream_items(ijson, BufferReader(buffer)), violation_filter)
+
+    def _parse_items(self, items, violation_filter):
+        violations = collections.defaultdict(list)
+        rules = []
+        for prefix, item in items:
+            if prefix == 'runs.item':
+                rules = []
+            elif prefix == self.RULE_PREFIX:
+                rules.append(item)
+            else:
+                self._add_result(violations, item, rules, violation_filter)
+        return violations
+
+    def _iter_log_items(self, log):
+        for run in log.get('runs') or []:
+            yield 'runs.item', run
+            for rule in ((run.get('tool') or {}).get('driver') or {}).get('rules') or []:
+                yield self.RULE_PREFIX, rule
+            for result in run.get('results') or []:
+                yield self.RESULT_PREFIX, result
+
+    def _iter_stream_items(self, ijson, stream):
+        """
+        Yields every run (before its contents are read), rule and result from a SARIF log as
+        they are read from the stream. Only one rule or result is held in memory at a time.
+        """
+        builder = None
+        item_prefix = None
+        for prefix, event, value in ijson.parse(stream):
+            if builder is None:
+                if event == 'start_map' and prefix in (self.RULE_PREFIX, self.RESULT_PREFIX):
+                    builder = ijson.ObjectBuilder()
+                    item_prefix = prefix
+                elif event == 'start_map' and prefix == 'runs.item':
+                    yield prefix, None
+                    continue
+                else:
+                    continue
+
+            builder.event(event, value)
+            if event == 'end_map' and prefix == item_prefix:
+                yield item_prefix, builder.value
+                builder = None
+
+    def _get_path(self, artifact_location):
+        uri = unquote(artifact_location.get('uri') or '')
+        if uri.startswith('file://'):
+            uri = uri[len('file://'):]
+        return self._normalize_path(uri) if uri else None
+
+    def _add_result(self, violations, result, rules, violation_filter):
+        locations = result.get('locations') or []
+        physical_location = (locations[0] if locations else {}).get('physicalLocation') or {}
+        path = self._get_path(physical_location.get('artifactLocation') or {})
+        if path is None:
+            # Results that are not about a file (e.g. about the whole repository) cannot be posted
+            return
+
+        rule = {}
+        rule_index = result.get('ruleIndex', (result.get('rule') or {}).get('index'))
+        if rule_index is not None and 0 <= rule_index < len(rules):
+            rule = rules[rule_index]
+        code = result.get('ruleId') or (result.get('rule') or {}).get('id') or rule.get('id') or ''
+
+        level = result.get('level') or (rule.get('defaultConfiguration') or {}).get('level') or 'warning'
+        severity = self.LEVELS.get(level, Severity.WARNING)
+        if self._is_filtered_out(violation_filter, path, code, severity):
+            return
+
+        region = physical_location.get('region') or {}
+        line = int(region.get('startLine') or 1)
+        violations[path].append(Violation(
+            line=line,
+            column=int(region.get('startColumn') or 0),
+            code=code,
+            message=(result.get('message') or {}).get('text') or '',
+            severity=severity,
+            end_line=int(region['endLine']) if region.get('endLine') else None
+        ))
+
+
+class CheckstyleParser(BaseLintParser):
+    """
+    A parser for Checkstyle XML, which is also written by ktlint, ESLint, PHP_CodeSniffer and
+    others:
+
+        <checkstyle version="8.36">
+            <file name="src/main/java/App.java">
+                <error line="12" column="5" severity="warning" message="Missing a Javadoc comment."
+                       source="com.puppycrawl.tools.checkstyle.checks.javadoc.MissingJavadocMethodCheck"/>
+            </file>
+        </checkstyle>
+
+    The report is read with ``iterparse`` and every element is cleared once it has been
+    handled, so memory use does not grow with the size of the report.
+    """
+
+    supports_streaming = True
+
+    SEVERITIES = {
+        'error': Severity.ERROR,
+        'warning': Severity.WARNING,
+        'info': Severity.INFO,
+        'ignore': Severity.INFO,
+    }
+
+    def parse_violations(self, output, violation_filter=None):
+        if not output.strip():
+            return {}
+        return self._parse(io.BytesIO(output.encode('utf-8')), violation_filter)
+
+    def parse_lines(self, lines, violation_filter=None):
+        lines = _skip_blank_lines(lines)
+        if lines is None:
+            return {}
+        return self._parse(LineStream(lines), violation_filter)
+
+    def parse_buffer(self, buffer, violation_filter=None):
+        if _is_blank(buffer):
+            return {}
+        return self._parse(BufferReader(buffer), violation_filter)
+
+    def _parse(self, stream, violation_filter):
+        violations = collections.defaultdict(list)
+
+        root = None
+        path = None
+        for event, element in ElementTree.iterparse(stream, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = element
+                elif element.tag == 'file':
+                    path = self._normalize_path(element.get('name'))
+                continue
+
+            if element.tag == 'error' and path is not None:
+                code = element.get('source') or ''
+                severity = self.SEVERITIES.get(element.get('severity'), Severity.WARNING)
+                if not self._is_filtered_out(violation_filter, path, code, severity):
+                    violations[path].append(Violation(
+                        line=int(element.get('line') or 1),
+                        column=int(element.get('column') or 0),
+                        code=code,
+                        message=element.get('message') or '',
+                        severity=severity
+                    ))
+                element.clear()
+            elif element.tag == 'file':
+                path = None
+                # Drop the finished file element from the tree
+                element.clear()
+                root.clear()
+
+        return violations
+
+
+def _iter_entry_points(group):
+    """
+    Returns the (name, entry point) pairs registered for ``group`` by installed packages.
+    Entry points are only read from package metadata here, nothing is imported.
+    """
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        try:
+            import pkg_resources
+        except ImportError:
+            return []
+        return [(entry_point.name, entry_point) for entry_point in pkg_resources.iter_entry_points(group)]
+
+    all_entry_points = entry_points()
+    if hasattr(all_entry_points, 'select'):
+        selected = all_entry_points.select(group=group)
+    else:
+        selected = all_entry_points.get(group, [])
+    return [(entry_point.name, entry_point) for entry_point in selected]
+
+
+def _import_object(reference):
+    """
+    Imports an object from a "module:attribute" reference.
+    """
+    module_name, _, attribute = reference.partition(':')
+    obj = importlib.import_module(module_name)
+    for name in attribute.split('.') if attribute else []:
+        obj = getattr(obj, name)
+    return obj
+
+
+class ParserRegistry(Mapping):
+    """
+    A mapping of format names to parsers. Parsers are registered as a parser class, a factory
+    that returns a parser, or a "module:attribute" reference to either, and are only imported
+    and created the first time their format is looked up.
+
+    Parsers registered under the ``entry_point_group`` entry point group by installed packages
+    are added after the built-in ones. A package cannot replace a built-in format.
+    """
+
+    def __init__(self, entry_point_group=None):
+        self.entry_point_group = entry_point_group
+        self._factories = collections.OrderedDict()
+        self._parsers = {}
+        self._entry_points_loaded = entry_point_group is None
+
+    def register(self, name, parser):
+        self._factories[name] = parser
+        self._parsers.pop(name, None)
+
+    def _load_entry_points(self):
+        if self._entry_points_loaded:
+            return
+        self._entry_points_loaded = True
+        for name, entry_point in _iter_entry_points(self.entry_point_group):
+            if name in self._factories:
+                logger.warning('Ignoring parser "{}" from entry point {} because the format is already '
+                               'registered'.format(name, entry_point))
+                continue
+            self._factories[name] = entry_point.load
+
+    def _create(self, name):
+        factory = self._factories[name]
+        if isinstance(factory, six.string_types):
+            factory = _import_object(factory)
+
+        parser = factory if isinstance(factory, BaseLintParser) else factory()
+        # Entry points are registered by their load function, which returns the parser class
+        if isinstance(parser, type):
+            parser = parser()
+        return parser
+
+    def __getitem__(self, name):
+        parser = self._parsers.get(name)
+        if parser is None:
+            if name not in self._factories:
+                self._load_entry_points()
+            parser = self._parsers[name] = self._create(name)
+        return parser
+
+    def __contains__(self, name):
+        if name not in self._factories:
+            self._load_entry_points()
+        return name in self._factories
+
+    def __iter__(self):
+        self._load_entry_points()
+        return iter(list(self._factories))
+
+    def __len__(self):
+        self._load_entry_points()
+        return len(self._factories)
+
+
+FLAKE8_REGEX = r'^(?P<path>.*):(?P<line>\d+):(?P<column>\d+): (?P<code>\w\d+) (?P<message>.*)$'
+
+
+PARSERS = ParserRegistry(entry_point_group=PARSER_ENTRY_POINT_GROUP)
+
+# Default flake8 format
+# docs/conf.py:230:1: E265 block comment should start with '# '
+# path:line:column: CODE message
+PARSERS.register('unix', Flake8Parser)
+PARSERS.register('flake8', Flake8Parser)
 
+# Pylint ---output-format=json
+PARSERS.register('pylint-json', PylintJSONParser)
 
-PARSERS = {
-    # Default flake8 format
-    # docs/conf.py:230:1: E265 block comment should start with '# '
-    # path:line:column: CODE message
-    'unix': DEFAULT_PARSER,
-    'flake8': DEFAULT_PARSER,
+# ESLint's default formatter
+# /Users/grant/project/file1.js
+#     1:1    error  '$' is not defined                              no-undef
+PARSERS.register('eslint', ESLintParser)
 
-    # Pylint ---output-format=json
-    'pylint-json': PylintJSONParser(),
+# ESLint's unix formatter
+# lintly/static/js/scripts.js:69:1: 'lintly' is not defined. [Error/no-undef]
+# path:line:column: message [CODE]
+PARSERS.register('eslint-unix', functools.partial(
+    LineRegexParser,
+    r'^(?P<path>.*):(?P<line>\d+):(?P<column>\d+): (?P<message>.+) \[(?P<severity>Warning|Error)/(?P<code>.+)\]$',
+    severities={'Error': Severity.ERROR, 'Warning': Severity.WARNING}
+))
 
-    # ESLint's default formatter
-    # /Users/grant/project/file1.js
-    #     1:1    error  '$' is not defined                              no-undef
-    'eslint': ESLintParser(),
+# Stylelint's default formatter
+# lintly/static/sass/file1.scss
+#   13:1  ✖  Expected no more than 1 empty line   max-empty-lines
+PARSERS.register('stylelint', StylelintParser)
 
-    # ESLint's unix formatter
-    # lintly/static/js/scripts.js:69:1: 'lintly' is not defined. [Error/no-undef]
-    # path:line:column: message [CODE]
-    'eslint-unix': LineRegexParser(r'^(?P<path>.*):(?P<line>\d+):(?P<column>\d+): '
-                                   r'(?P<message>.+) \[(Warning|Error)/(?P<code>.+)\]$'),
+# Black's check command default formatter.
+PARSERS.register('black', BlackParser)
 
-    # Stylelint's default formatter
-    # lintly/static/sass/file1.scss
-    #   13:1  ✖  Expected no more than 1 empty line   max-empty-lines
-    'stylelint': StylelintParser(),
+# cfn-lint default formatter
+PARSERS.register('cfn-lint', CfnLintParser)
 
-    # Black's check command default formatter.
-    'black': BlackParser(),
+# cfn-nag JSON output
+PARSERS.register('cfn-nag', CfnNagParser)
 
-    # cfn-lint default formatter
-    'cfn-lint': CfnLintParser(),
+# SARIF 2.1 JSON (CodeQL, Semgrep, ...)
+PARSERS.register('sarif', SarifParser)
 
-    # cfn-nag JSON output
-    'cfn-nag': CfnNagParser(),
-}
+# Checkstyle XML (checkstyle, ktlint --reporter=checkstyle, eslint --format checkstyle, ...)
+PARSERS.register('checkstyle', CheckstyleParser)
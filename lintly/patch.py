@@ -1,18 +1,400 @@
+import bisect
+import hashlib
 import logging
 import re
+from array import array
 
 from cached_property import cached_property
 
 
-FILE_NAME_LINE = re.compile(r'^\+\+\+ b/(?P<file_name>.+)')
-RANGE_INFORMATION_LINE = re.compile(r'^@@ .+\+(?P<line_number>\d+),')
-MODIFIED_LINE = re.compile(r'^\+(?!\+|\+)')
-NOT_REMOVED_OR_NEWLINE_WARNING = re.compile(r'^[^-\\]')
+HUNK_HEADER_LINE = re.compile(r'^@@ -(?P<old_line_number>\d+)(?:,(?P<old_count>\d+))? '
+                              r'\+(?P<line_number>\d+)(?:,(?P<new_count>\d+))? @@')
+
+GIT_DIFF_PREFIX = 'diff --git '
+DEV_NULL = '/dev/null'
+
+# The characters that git escapes in quoted paths, other than octal escapes for bytes
+OCTAL_ESCAPE = re.compile(r'[0-7]{1,3}')
+GIT_QUOTED_ESCAPES = {'a': 7, 'b': 8, 't': 9, 'n': 10, 'v': 11, 'f': 12, 'r': 13, '"': 34, '\\': 92}
+
+# What the parser does with each line: read file headers, count the lines of a hunk, or skip
+# everything up to the next "diff --git" line (for binary and deleted files)
+STATE_HEADER = 'header'
+STATE_HUNK = 'hunk'
+STATE_SKIP = 'skip'
+
+# The side of the diff that the lines of the new version of a file are shown on
+SIDE_RIGHT = 'RIGHT'
 
 
 logger = logging.getLogger(__name__)
 
 
+class DiffLine(object):
+    """
+    A line of the new version of a file that is shown in a hunk of the diff, either because the
+    diff added it or as context, and so can be commented on.
+    """
+
+    __slots__ = ('file_name', 'line_number', 'old_line_number', 'position', 'added')
+
+    side = SIDE_RIGHT
+
+    def __init__(self, file_name, line_number, old_line_number, position, added):
+        self.file_name = file_name
+        self.line_number = line_number
+        self.old_line_number = old_line_number
+        self.position = position
+        self.added = added
+
+    def __repr__(self):
+        return 'DiffLine(file_name="{}", line_number={}, position={}, added={})'.format(
+            self.file_name, self.line_number, self.position, self.added)
+
+
+class Hunk(object):
+    """
+    The lines of the new version of a file that one hunk of a diff shows, which are always
+    consecutive. Each line's position and old line number is kept in a list indexed by its
+    offset from ``start_line``.
+    """
+
+    __slots__ = ('file_name', 'start_line', 'positions', 'old_line_numbers', 'added')
+
+    def __init__(self, file_name, start_line):
+        self.file_name = file_name
+        self.start_line = start_line
+        self.positions = []
+        self.old_line_numbers = []
+        self.added = []
+
+    def __contains__(self, line_number):
+        return self.start_line <= line_number <= self.end_line
+
+    def __repr__(self):
+        return 'Hunk(file_name="{}", start_line={}, end_line={})'.format(
+            self.file_name, self.start_line, self.end_line)
+
+    @property
+    def end_line(self):
+        return self.start_line + len(self.positions) - 1
+
+    def append(self, position, old_line_number, added):
+        self.positions.append(position)
+        self.old_line_numbers.append(old_line_number)
+        self.added.append(added)
+
+    def get_line(self, line_number):
+        i = line_number - self.start_line
+        return DiffLine(self.file_name, line_number, self.old_line_numbers[i], self.positions[i], self.added[i])
+
+
+class HunkIndex(object):
+    """
+    The hunks of one file sorted by their first line, so that the hunk that shows a line (or
+    overlaps a range of lines) is found with a binary search, and the sorted numbers of the
+    lines the diff added to the file.
+    """
+
+    def __init__(self, hunks, added_lines):
+        self.hunks = sorted(hunks, key=lambda hunk: hunk.start_line)
+        # Sorted arrays of line numbers, which the bulk matching in lintly.matching works on
+        self.added_lines = array('I', sorted(added_lines))
+        self.starts = array('I', [hunk.start_line for hunk in self.hunks])
+        self.ends = array('I', [hunk.end_line for hunk in self.hunks])
+
+    def find(self, line_number):
+        """Returns the hunk that shows ``line_number``, or None."""
+        i = bisect.bisect_right(self.starts, line_number) - 1
+        if i >= 0 and line_number in self.hunks[i]:
+            return self.hunks[i]
+        return None
+
+    def find_overlapping(self, start_line, end_line):
+        """Returns the first hunk that shows any of the lines from ``start_line`` to ``end_line``, or None."""
+        i = bisect.bisect_right(self.starts, start_line) - 1
+        if i >= 0 and self.hunks[i].end_line >= start_line:
+            return self.hunks[i]
+        if i + 1 < len(self.hunks) and self.hunks[i + 1].start_line <= end_line:
+            return self.hunks[i + 1]
+        return None
+
+    def has_added_line(self, start_line, end_line):
+        """Returns whether the diff added any of the lines from ``start_line`` to ``end_line``."""
+        i = bisect.bisect_left(self.added_lines, start_line)
+        return i < len(self.added_lines) and self.added_lines[i] <= end_line
+
+
+def _read_quoted_path(text):
+    """
+    Reads the quoted path at the start of ``text`` and returns it with the rest of the text, or
+    None and ``text`` if the quotes are not closed. Git quotes paths with special or non-ASCII
+    characters and writes their bytes as C-style escapes, e.g. "caf\\303\\251.py".
+    """
+    data = bytearray()
+    i = 1
+    while i < len(text):
+        char = text[i]
+        if char == '"':
+            return data.decode('utf-8', 'replace'), text[i + 1:]
+        octal_match = OCTAL_ESCAPE.match(text, i + 1) if char == '\\' else None
+        if octal_match:
+            data.append(int(octal_match.group(), 8) & 0xFF)
+            i = octal_match.end()
+        elif char == '\\' and i + 1 < len(text):
+            data.append(GIT_QUOTED_ESCAPES.get(text[i + 1], ord(text[i + 1]) & 0xFF))
+            i += 2
+        else:
+            data.extend(char.encode('utf-8'))
+            i += 1
+    return None, text
+
+
+def unquote_path(path):
+    """Returns a path from a diff header without the quotes and escapes git adds to it."""
+    if path.startswith('"'):
+        unquoted, rest = _read_quoted_path(path)
+        if unquoted is not None:
+            return unquoted
+    return path
+
+
+def _strip_prefix(path, prefix):
+    """Returns a path without its "a/" or "b/" prefix, or None for /dev/null."""
+    if path == DEV_NULL:
+        return None
+    return path[len(prefix):] if path.startswith(prefix) else path
+
+
+def parse_header_path(text, prefix):
+    """
+    Returns the path of a "---" or "+++" line without its prefix, or None for /dev/null.
+    Anything after a tab (a timestamp, or the tab git adds after paths with spaces) is ignored.
+    """
+    if text.startswith('"'):
+        return _strip_prefix(unquote_path(text.rstrip()), prefix)
+    return _strip_prefix(text.split('\t', 1)[0], prefix)
+
+
+def parse_git_diff_paths(text):
+    """
+    Returns the old and new paths of a "diff --git a/<old> b/<new>" line. Unquoted paths with
+    spaces are ambiguous, so both halves are assumed to be the same path unless the file was
+    renamed, in which case the "rename from" and "rename to" lines that follow give the paths.
+    """
+    if text.startswith('"'):
+        old_path, rest = _read_quoted_path(text)
+        if old_path is not None:
+            return _strip_prefix(old_path, 'a/'), _strip_prefix(unquote_path(rest.lstrip(' ')), 'b/')
+    elif text.endswith('"') and ' "' in text:
+        i = text.rindex(' "')
+        return _strip_prefix(text[:i], 'a/'), _strip_prefix(unquote_path(text[i + 1:]), 'b/')
+
+    middle = len(text) // 2
+    if len(text) % 2 and text[middle] == ' ' and text[2:middle] == text[middle + 3:]:
+        return _strip_prefix(text[:middle], 'a/'), _strip_prefix(text[middle + 1:], 'b/')
+    i = text.find(' b/')
+    if i < 0:
+        return text, text
+    return _strip_prefix(text[:i], 'a/'), _strip_prefix(text[i + 1:], 'b/')
+
+
+class FileDiff(object):
+    """
+    The header of the diff of one file. ``old_path`` is None for a new file and ``new_path`` is
+    None for a deleted one.
+    """
+
+    __slots__ = ('old_path', 'new_path', 'git', 'binary', 'renamed', 'copied', 'has_hunks')
+
+    def __init__(self, old_path=None, new_path=None, git=False):
+        self.old_path = old_path
+        self.new_path = new_path
+        self.git = git
+        self.binary = False
+        self.renamed = False
+        self.copied = False
+        self.has_hunks = False
+
+    def __repr__(self):
+        return 'FileDiff(old_path={!r}, new_path={!r})'.format(self.old_path, self.new_path)
+
+    @property
+    def deleted(self):
+        return self.new_path is None
+
+
+class PatchParser(object):
+    """
+    Parses a unified diff, as written by git or by ``diff -u``, line by line with a small state
+    machine. File headers give the path each hunk belongs to, including renames, copies and
+    quoted paths. Hunks are read using the line counts in their headers, and the rest of the
+    diff of a binary or deleted file is skipped without looking at its lines.
+    """
+
+    def __init__(self):
+        self.changed_lines = []
+        self.old_line_numbers = {}
+        self.files = []
+        self.hunks = {}
+        self.file = None
+        self.state = STATE_HEADER
+        self._hunks = {}
+        self._added_lines = {}
+        self._hunk = None
+        self._position = 0
+        self._line_number = self._old_line_number = 0
+        # The old and new lines left in the current hunk, as given by its header
+        self._old_remaining = self._new_remaining = 0
+
+    def parse(self, body):
+        for content in body.splitlines():
+            self._position += 1
+            if self.state == STATE_SKIP:
+                if not content.startswith(GIT_DIFF_PREFIX):
+                    continue
+                self.state = STATE_HEADER
+            elif self.state == STATE_HUNK:
+                if self._read_hunk_line(content):
+                    continue
+                # A line that cannot be part of a hunk ends it early
+                self.state = STATE_HEADER
+            self._read_header_line(content)
+
+        self.hunks = dict((name, HunkIndex([h for h in hunks if h.positions], self._added_lines.get(name, [])))
+                          for name, hunks in self._hunks.items())
+        return self
+
+    def _read_hunk_line(self, content):
+        """Reads a line of a hunk and returns True, or returns False if the line is not part of a hunk."""
+        if content.startswith('+'):
+            self._add_line(content, added=True)
+            self._new_remaining -= 1
+        elif content.startswith(' ') or content == '':
+            self._add_line(content, added=False)
+            self._old_remaining -= 1
+            self._new_remaining -= 1
+            self._old_line_number += 1
+        elif content.startswith('-'):
+            self._old_remaining -= 1
+            self._old_line_number += 1
+        elif not content.startswith('\\'):
+            return False
+
+        if self._old_remaining <= 0 and self._new_remaining <= 0:
+            self.state = STATE_HEADER
+        return True
+
+    def _add_line(self, content, added):
+        if self._hunk is not None:
+            file_name = self._hunk.file_name
+            if added:
+                self.changed_lines.append({
+                    'file_name': file_name,
+                    'content': content,
+                    'line_number': self._line_number,
+                    'position': self._position
+                })
+                self.old_line_numbers[(file_name, self._line_number)] = self._old_line_number
+                self._added_lines.setdefault(file_name, []).append(self._line_number)
+            self._hunk.append(self._position, self._old_line_number, added)
+        self._line_number += 1
+
+    def _read_header_line(self, content):
+        for prefix, read in HEADER_READERS:
+            if content.startswith(prefix):
+                read(self, content[len(prefix):])
+                return
+
+    def _start_file(self, file_diff):
+        self.file = file_diff
+        self.files.append(file_diff)
+
+    def _get_file(self):
+        # Hunks and extended header lines without a file header before them get a file of their own
+        if self.file is None:
+            self._start_file(FileDiff(new_path=''))
+        return self.file
+
+    def _skip_file(self):
+        # Without a "diff --git" line to stop at, the hunks are read (and ignored) instead
+        if self.file.git:
+            self.state = STATE_SKIP
+
+    def _read_git_diff(self, text):
+        old_path, new_path = parse_git_diff_paths(text)
+        self._start_file(FileDiff(old_path, new_path, git=True))
+
+    def _read_old_path(self, text):
+        # Each file of a diff that was not written by git starts at its "---" line
+        if self.file is None or not self.file.git or self.file.has_hunks:
+            self._start_file(FileDiff())
+        self.file.old_path = parse_header_path(text, 'a/')
+
+    def _read_new_path(self, text):
+        self._get_file().new_path = parse_header_path(text, 'b/')
+        if self.file.deleted:
+            self._skip_file()
+
+    def _read_hunk_header(self, text):
+        match = HUNK_HEADER_LINE.match('@@ ' + text)
+        if match is None:
+            return
+        if not self._get_file().has_hunks:
+            # Positions are counted from the first hunk header of each file
+            self._position = 0
+            self.file.has_hunks = True
+
+        self._line_number = int(match.group('line_number'))
+        self._old_line_number = int(match.group('old_line_number'))
+        self._old_remaining = int(match.group('old_count') or 1)
+        self._new_remaining = int(match.group('new_count') or 1)
+        self._hunk = None
+        if not self.file.deleted and not self.file.binary:
+            self._hunk = Hunk(self.file.new_path, self._line_number)
+            self._hunks.setdefault(self.file.new_path, []).append(self._hunk)
+        self.state = STATE_HUNK
+
+    def _read_rename_from(self, text):
+        self._get_file().old_path = unquote_path(text)
+        self.file.renamed = True
+
+    def _read_copy_from(self, text):
+        self._get_file().old_path = unquote_path(text)
+        self.file.copied = True
+
+    def _read_rename_or_copy_to(self, text):
+        self._get_file().new_path = unquote_path(text)
+
+    def _read_new_file_mode(self, text):
+        self._get_file().old_path = None
+
+    def _read_deleted_file_mode(self, text):
+        self._get_file().new_path = None
+        self._skip_file()
+
+    def _read_binary(self, text):
+        self._get_file().binary = True
+        self._skip_file()
+
+
+# The lines that can appear between the hunks of a diff, and the PatchParser method that reads each one
+HEADER_READERS = (
+    (GIT_DIFF_PREFIX, PatchParser._read_git_diff),
+    ('--- ', PatchParser._read_old_path),
+    ('+++ ', PatchParser._read_new_path),
+    ('@@ ', PatchParser._read_hunk_header),
+    ('rename from ', PatchParser._read_rename_from),
+    ('rename to ', PatchParser._read_rename_or_copy_to),
+    ('copy from ', PatchParser._read_copy_from),
+    ('copy to ', PatchParser._read_rename_or_copy_to),
+    ('new file mode ', PatchParser._read_new_file_mode),
+    ('deleted file mode ', PatchParser._read_deleted_file_mode),
+    ('Binary files ', PatchParser._read_binary),
+    ('GIT binary patch', PatchParser._read_binary),
+)
+
+
 class Patch(object):
     """
     Parses the body of a diff and returns the lines that changed as well as their "position",
@@ -33,51 +415,80 @@ class Patch(object):
                 'position': int
             }
         """
-        lines = []
-        file_name = ''
-        line_number = 0
-        patch_position = -1
-        found_first_information_line = False
-
-        for i, content in enumerate(self.body.splitlines()):
-            range_information_match = RANGE_INFORMATION_LINE.search(content)
-            file_name_line_match = FILE_NAME_LINE.search(content)
-
-            if file_name_line_match:
-                file_name = file_name_line_match.group('file_name')
-                found_first_information_line = False
-            elif range_information_match:
-                line_number = int(range_information_match.group('line_number'))
-                if not found_first_information_line:
-                    # This is the first information line. Set patch position to 1 and start counting
-                    patch_position = 0
-                    found_first_information_line = True
-            elif MODIFIED_LINE.search(content):
-                line = {
-                    'file_name': file_name,
-                    'content': content,
-                    'line_number': line_number,
-                    'position': patch_position
-                }
+        return self._parsed.changed_lines
+
+    @cached_property
+    def old_line_numbers(self):
+        """
+        A dict of (file_name, line_number) to the line number in the old version of the file
+        that each changed line was added before.
+        """
+        return self._parsed.old_line_numbers
+
+    @cached_property
+    def hunks(self):
+        """
+        A dict of file name to the HunkIndex of the lines of the file that the diff shows.
+        """
+        return self._parsed.hunks
+
+    @cached_property
+    def files(self):
+        """
+        A list of the FileDiffs of each file in the diff, including binary, renamed and deleted files.
+        """
+        return self._parsed.files
 
-                lines.append(line)
-                line_number += 1
-            elif NOT_REMOVED_OR_NEWLINE_WARNING.search(content) or content == '':
-                line_number += 1
+    @cached_property
+    def _parsed(self):
+        return PatchParser().parse(self.body)
 
-            patch_position += 1
+    def get_line(self, file_name, line_number):
+        """
+        Returns the DiffLine for a line of the new version of a file if the diff shows it,
+        or None if the line cannot be commented on.
+        """
+        index = self.hunks.get(file_name)
+        hunk = index.find(line_number) if index is not None else None
+        return hunk.get_line(line_number) if hunk is not None else None
+
+    def is_changed(self, file_name, start_line, end_line=None):
+        """Returns whether the diff added any of the lines from ``start_line`` to ``end_line``."""
+        index = self.hunks.get(file_name)
+        return index is not None and index.has_added_line(start_line, end_line or start_line)
+
+    def is_touched(self, file_name, start_line, end_line=None):
+        """
+        Returns whether any of the lines from ``start_line`` to ``end_line`` are in a hunk of
+        the diff, either added or shown as context.
+        """
+        index = self.hunks.get(file_name)
+        return index is not None and index.find_overlapping(start_line, end_line or start_line) is not None
 
-        return lines
+    def get_comment_range(self, file_name, start_line, end_line=None):
+        """
+        Returns the first and last DiffLine of the part of the lines from ``start_line`` to
+        ``end_line`` that can be commented on together, which is the part in the first hunk that
+        shows any of them, or None if the diff shows none of them.
+        """
+        end_line = end_line or start_line
+        index = self.hunks.get(file_name)
+        hunk = index.find_overlapping(start_line, end_line) if index is not None else None
+        if hunk is None:
+            return None
+        return hunk.get_line(max(start_line, hunk.start_line)), hunk.get_line(min(end_line, hunk.end_line))
 
     def get_patch_position(self, file_name, line_number):
-        matching_lines = [line for line in self.changed_lines
-                          if line['file_name'] == file_name and line['line_number'] == line_number]
+        line = self.get_line(file_name, line_number)
+        return line.position if line is not None else None
 
-        if len(matching_lines) == 0:
+    def get_line_code(self, file_name, line_number):
+        """
+        Returns the GitLab line code of a line the diff shows, which is
+        "<SHA-1 of the path>_<old line>_<new line>", or None if the diff does not show the line.
+        """
+        line = self.get_line(file_name, line_number)
+        if line is None:
             return None
-        elif len(matching_lines) == 1:
-            return matching_lines[0]['position']
-        else:
-            logger.warning('Invalid patch or build.')
-            logger.warning('Multiple matching lines found for {file_name} on line '
-                           '{line_number}'.format(file_name=file_name, line_number=line_number))
+        return '{}_{}_{}'.format(hashlib.sha1(file_name.encode('utf-8')).hexdigest(), line.old_line_number,
+                                 line_number)
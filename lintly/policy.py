@@ -0,0 +1,211 @@
+"""
+Decides whether a build passes, and the exit code and commit status it reports, from the
+ViolationStats built when its violations were found. Policies only look at the counts, so they
+never walk the violations again.
+"""
+import errno
+import json
+import logging
+
+import click
+
+from .filters import compile_patterns
+from .violations import Severity
+
+
+logger = logging.getLogger(__name__)
+
+BASELINE_VERSION = 1
+
+STATE_SUCCESS = 'success'
+STATE_FAILURE = 'failure'
+
+# GitHub rejects commit statuses with longer descriptions
+MAX_DESCRIPTION_LENGTH = 140
+
+# The exit code of a build that breaks one of its policy's rules
+EXIT_CODE_POLICY_FAILURE = 1
+
+# Exit codes above this wrap around, so 256 files with violations would exit with 0
+MAX_EXIT_CODE = 255
+
+
+def parse_budget(value):
+    """
+    Parses a budget such as "E501=10" or "E5*=10" into its code pattern and count.
+    """
+    pattern, sep, count = value.partition('=')
+    pattern = pattern.strip()
+    try:
+        count = int(count)
+    except ValueError:
+        count = -1
+    if not sep or not pattern or count < 0:
+        raise ValueError('Invalid budget "{}". Expected CODE=COUNT, e.g. "E501=10"'.format(value))
+    return pattern, count
+
+
+def read_baseline(path):
+    """
+    Returns the counts stored in a baseline file written with ``write_baseline``, or None if
+    the file does not exist yet.
+    """
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (IOError, OSError) as e:
+        if e.errno == errno.ENOENT:
+            return None
+        raise
+    if not isinstance(data, dict):
+        raise ValueError('{} is not a Lintly baseline'.format(path))
+    if data.get('version') != BASELINE_VERSION:
+        raise ValueError('Unsupported baseline version {} in {}'.format(data.get('version'), path))
+    return data
+
+
+def write_baseline(stats, path):
+    """Writes the counts of ``stats`` to a baseline file for a later build to ratchet against."""
+    data = {'version': BASELINE_VERSION, 'total': stats.total, 'by_code': dict(stats.by_code)}
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+class MaxViolationsRule(object):
+    """
+    Fails when there are more than ``limit`` violations, or more than ``limit`` violations of at
+    least ``severity`` if one is given.
+    """
+
+    def __init__(self, limit, severity=None):
+        self.limit = limit
+        self.severity = severity
+
+    def check(self, stats):
+        """Returns why the stats break the rule, or None if they don't."""
+        if self.severity is None:
+            count, noun = stats.total, 'violations'
+        else:
+            count = sum(n for severity, n in stats.by_severity.items() if severity >= self.severity)
+            noun = '{}s'.format(self.severity.label)
+        if count > self.limit:
+            return '{} {} (limit {})'.format(count, noun, self.limit)
+        return None
+
+
+class CodeBudgetRule(object):
+    """
+    Fails when there are more than ``limit`` violations with codes matching ``pattern``,
+    e.g. "E501" or "E5*".
+    """
+
+    def __init__(self, pattern, limit):
+        self.pattern = pattern
+        self.limit = limit
+        self._regex = compile_patterns([pattern])
+
+    def check(self, stats):
+        count = sum(n for code, n in stats.by_code.items() if self._regex.match(code))
+        if count > self.limit:
+            return '{} {} (budget {})'.format(count, self.pattern, self.limit)
+        return None
+
+
+class BaselineRule(object):
+    """
+    Ratchets against the counts of an earlier build: fails when there are more violations in
+    total, or more of any one code, than the baseline had.
+    """
+
+    def __init__(self, baseline):
+        self.total = baseline.get('total', 0)
+        self.by_code = baseline.get('by_code', {})
+
+    def check(self, stats):
+        increases = ['{} {} > {}'.format(code, count, self.by_code.get(code, 0))
+                     for code, count in sorted(stats.by_code.items()) if count > self.by_code.get(code, 0)]
+        if stats.total > self.total:
+            increases.insert(0, '{} violations > {}'.format(stats.total, self.total))
+        if increases:
+            return 'above baseline: {}'.format(', '.join(increases))
+        return None
+
+
+class PolicyResult(object):
+    """The outcome of evaluating a Policy: whether it passed, the exit code and the commit status."""
+
+    def __init__(self, passed, exit_code, state, description, failures=None):
+        self.passed = passed
+        self.exit_code = exit_code
+        self.state = state
+        self.description = description
+        self.failures = failures or []
+
+    def __repr__(self):
+        return 'PolicyResult(state="{}", exit_code={}, description="{}")'.format(
+            self.state, self.exit_code, self.description)
+
+
+class Policy(object):
+    """
+    A set of rules a build's violations must keep to. Without any rules a build fails if it
+    has any violations. With rules, it only fails if one of them is broken.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = list(rules or [])
+
+    @classmethod
+    def from_config(cls, config):
+        rules = []
+        if config.max_violations is not None:
+            rules.append(MaxViolationsRule(config.max_violations))
+        if config.max_errors is not None:
+            rules.append(MaxViolationsRule(config.max_errors, severity=Severity.ERROR))
+        for budget in config.budgets:
+            try:
+                rules.append(CodeBudgetRule(*parse_budget(budget)))
+            except ValueError as e:
+                # Budgets given on the command line are validated by click, but not those in a config file
+                raise click.BadParameter(str(e), param_hint='budget')
+        if config.baseline:
+            try:
+                baseline = read_baseline(config.baseline)
+            except (IOError, OSError, ValueError) as e:
+                raise click.BadParameter('Could not read the baseline: {}'.format(e), param_hint='baseline')
+            if baseline is None:
+                logger.warning('Baseline {} does not exist yet, so it is not enforced'.format(config.baseline))
+            else:
+                rules.append(BaselineRule(baseline))
+        return cls(rules)
+
+    def evaluate(self, stats):
+        """
+        Returns the PolicyResult for a build with the given ViolationStats. Without rules a
+        failed build exits with the number of files that have violations (up to 255), as Lintly
+        always has. A build that breaks a rule exits with ``EXIT_CODE_POLICY_FAILURE``, because
+        the number of files says nothing about a budget or baseline.
+        """
+        if stats.total:
+            plural = '' if stats.total == 1 else 's'
+            description = 'Pull Request introduced {} linting violation{}'.format(stats.total, plural)
+        else:
+            description = 'Linting detected no new issues.'
+
+        if not self.rules:
+            failures = ['{} violations'.format(stats.total)] if stats.total else []
+            exit_code = min(stats.files_count, MAX_EXIT_CODE)
+        else:
+            exit_code = EXIT_CODE_POLICY_FAILURE
+            failures = [failure for failure in (rule.check(stats) for rule in self.rules) if failure]
+            if failures:
+                description = '{}: {}'.format(description, '; '.join(failures))
+            elif stats.total:
+                description = '{}, within the allowed limits'.format(description)
+
+        if len(description) > MAX_DESCRIPTION_LENGTH:
+            description = description[:MAX_DESCRIPTION_LENGTH - 3] + '...'
+
+        if failures:
+            return PolicyResult(False, exit_code, STATE_FAILURE, description, failures)
+        return PolicyResult(True, 0, STATE_SUCCESS, description)
@@ -0,0 +1,349 @@
+"""
+A long-running Lintly service (``lintly serve``) that accepts linter output over HTTP or a
+Unix socket and runs builds with warm connections and caches, and the client that
+``lintly --server`` uses to submit to it.
+
+The service has a small JSON API:
+
+    POST /builds    {"options": {...}, "linter_output": "..."}, where the options are any of
+                    ``SUBMISSION_OPTIONS``, e.g. {"pr": "12", "format": "flake8"}
+    GET /health     {"status": "ok"}
+    GET /metrics    metrics for every build run by the service, in Prometheus text format
+"""
+import json
+import logging
+import os
+import socket
+import threading
+
+import requests
+from six.moves import BaseHTTPServer, http_client, socketserver
+from six.moves.urllib.parse import urlparse
+
+from .backends.httpcache import MemoryResponseCache
+from .builds import LintlyBuild
+from .config import Config
+from .exceptions import NotPullRequestException
+from .metrics import Metrics
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# The options a submission may set. Everything else, e.g. the API key and URL and every option
+# that names a file or directory, can only be set when the service is started, so that a client
+# can neither send the service's API key to another host nor read or write the service's files
+SUBMISSION_OPTIONS = frozenset([
+    'pr', 'repo', 'commit_sha', 'format', 'context', 'fail_on',
+    'include_codes', 'exclude_codes', 'min_severity', 'include_paths', 'exclude_paths',
+    'max_violations', 'max_errors', 'budgets',
+    'post_status', 'request_changes', 'cleanup_mode',
+])
+
+UNIX_URL_SCHEME = 'unix'
+
+
+class SubmissionError(ValueError):
+    """Raised when a submission sets an option it is not allowed to."""
+    pass
+
+
+class BuildQueue(object):
+    """
+    Runs at most one build at a time for each key (a PR and lint context) and coalesces the
+    submissions that arrive while a build is running. Only the newest of them is run once the
+    current build finishes, so a burst of pushes to a PR ends in one review for the latest one.
+    The submissions it replaced are not run at all: they get its Batch, in which ``submission``
+    is the newer submission that superseded theirs.
+    """
+
+    def __init__(self, run):
+        self.run = run
+        self._running = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, submission):
+        """
+        Blocks until ``submission`` (or a newer submission that replaced it) has been run and
+        returns its Batch. ``batch.is_superseded(submission)`` tells which of the two it was.
+        """
+        with self._lock:
+            if key not in self._running:
+                batch = self._running[key] = Batch(submission)
+                batch.ready.set()
+                owner = True
+            elif key in self._pending:
+                batch = self._pending[key]
+                batch.submission = submission
+                batch.size += 1
+                owner = False
+            else:
+                batch = self._pending[key] = Batch(submission)
+                owner = True
+
+        if owner:
+            batch.ready.wait()
+            self._run(key, batch)
+
+        batch.done.wait()
+        return batch
+
+    def _run(self, key, batch):
+        try:
+            batch.result = self.run(batch.submission)
+        except Exception as e:
+            batch.error = e
+        finally:
+            with self._lock:
+                next_batch = self._pending.pop(key, None)
+                if next_batch is None:
+                    del self._running[key]
+                else:
+                    self._running[key] = next_batch
+            batch.done.set()
+            if next_batch is not None:
+                next_batch.ready.set()
+
+
+class Batch(object):
+    """One or more submissions for the same key that are answered by a single build."""
+
+    def __init__(self, submission):
+        self.submission = submission
+        self.size = 1
+        self.result = None
+        self.error = None
+        self.ready = threading.Event()
+        self.done = threading.Event()
+
+    def is_superseded(self, submission):
+        """Returns True if ``submission`` was replaced by a newer one and never run."""
+        return submission is not self.submission
+
+
+class LintlyService(object):
+    """
+    Runs Lintly builds for a long-running process. Builds share a pooled HTTP session per API
+    and an in-memory cache of API responses, which are revalidated with conditional requests
+    so that unchanged diffs and comment lists are neither downloaded again nor counted against
+    the rate limit.
+
+    ``defaults`` holds the options used for anything a submission does not set, e.g. the API key.
+    """
+
+    def __init__(self, defaults=None):
+        self.defaults = dict(defaults or {})
+        self.metrics = Metrics()
+        self.http_cache = MemoryResponseCache(metrics=self.metrics)
+        self.queue = BuildQueue(self._run_build)
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get_options(self, options):
+        """
+        Returns the defaults updated with every option the submission sets. Raises a
+        SubmissionError for options that are not in ``SUBMISSION_OPTIONS``.
+        """
+        merged = dict(self.defaults)
+        for name, value in options.items():
+            if value is None or value == [] or value == ():
+                continue
+            if name not in SUBMISSION_OPTIONS:
+                raise SubmissionError('Option "{}" cannot be set by a submission'.format(name))
+            merged[name] = value
+        return merged
+
+    def get_session(self, config):
+        key = (config.backend, config.api_url)
+        with self._lock:
+            if key not in self._sessions:
+                self._sessions[key] = requests.Session()
+            return self._sessions[key]
+
+    def submit(self, options, linter_output):
+        """
+        Runs a build for the given options and linter output and returns its result as a dict.
+        """
+        config = Config(self.get_options(options))
+        key = (config.backend, config.api_url, config.repo, str(config.pr), config.context or config.format)
+
+        submission = (config, linter_output)
+        batch = self.queue.submit(key, submission)
+        if batch.is_superseded(submission):
+            # The build that ran was for a newer submission, maybe for another commit, so its
+            # result says nothing about this one
+            return {'superseded': True, 'exit_code': 0, 'commit_sha': config.commit_sha,
+                    'superseded_by': batch.submission[0].commit_sha}
+        if batch.error is not None:
+            raise batch.error
+        result = dict(batch.result)
+        result['coalesced'] = batch.size - 1
+        return result
+
+    def _run_build(self, submission):
+        config, linter_output = submission
+        build = LintlyBuild(config, linter_output, session=self.get_session(config),
+                            http_cache=None if config.http_cache_dir else self.http_cache)
+        try:
+            build.execute()
+        except NotPullRequestException:
+            logger.info('Not a PR. Skipping the build.')
+            return {'exit_code': 0, 'violations': 0, 'files': 0, 'commit_sha': config.commit_sha}
+        finally:
+            if config.metrics_out:
+                build.metrics.write(config.metrics_out, config.metrics_format)
+            self._record_build(build)
+
+        return {
+            'exit_code': build.result.exit_code,
+            'violations': build.stats.total,
+            'files': build.stats.files_count,
+            'commit_sha': config.commit_sha,
+        }
+
+    def _record_build(self, build):
+        self.metrics.incr('server.builds', backend=build.config.backend)
+        for (name, tags), value in build.metrics.counters.items():
+            self.metrics.incr(name, value, **dict(tags))
+
+
+class LintlyRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif self.path == '/metrics':
+            self._send(200, self.server.service.metrics.to_prometheus().encode('utf-8'), 'text/plain; version=0.0.4')
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        if self.path != '/builds':
+            self._send_json(404, {'error': 'Not found'})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            payload = json.loads(self.rfile.read(length).decode('utf-8'))
+            options = payload['options']
+            linter_output = payload.get('linter_output')
+            if not isinstance(options, dict):
+                raise ValueError('"options" must be an object')
+        except (KeyError, TypeError, ValueError) as e:
+            self._send_json(400, {'error': 'Invalid build request: {}'.format(e)})
+            return
+
+        try:
+            result = self.server.service.submit(options, linter_output)
+        except SubmissionError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        except Exception as e:
+            logger.exception('Build failed')
+            self._send_json(500, {'error': str(e)})
+            return
+        self._send_json(200, result)
+
+    def _send_json(self, status, data):
+        self._send(status, json.dumps(data).encode('utf-8'), 'application/json')
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        # Remove the socket file left behind by a previous server
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        socketserver.UnixStreamServer.server_bind(self)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+    """
+    Returns an HTTP server for ``service`` listening on a Unix socket if ``socket_path`` is
+    given, or else on ``host`` and ``port``. Each request is handled in its own thread.
+    """
+    if socket_path:
+        server = ThreadingUnixHTTPServer(socket_path, LintlyRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), LintlyRequestHandler)
+    server.service = service
+    return server
+
+
+class UnixHTTPConnection(http_client.HTTPConnection):
+    """An HTTP connection over a Unix socket."""
+
+    def __init__(self, path, timeout=None):
+        http_client.HTTPConnection.__init__(self, 'localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        self.sock = sock
+
+
+class ServerError(Exception):
+    """Raised when the Lintly service rejects or fails a build."""
+    pass
+
+
+def submit_build(server_url, options, linter_output, timeout=None):
+    """
+    Submits a build to the Lintly service at ``server_url`` and returns its result. The URL is
+    either "http://host:port" or "unix:///path/to/socket".
+    """
+    url = urlparse(server_url)
+    if url.scheme == UNIX_URL_SCHEME:
+        connection = UnixHTTPConnection(url.path, timeout=timeout)
+    else:
+        connection = http_client.HTTPConnection(url.hostname, url.port or DEFAULT_PORT, timeout=timeout)
+
+    options = dict((name, list(value) if isinstance(value, tuple) else value)
+                   for name, value in options.items() if name in SUBMISSION_OPTIONS)
+    body = json.dumps({'options': options, 'linter_output': linter_output})
+    try:
+        connection.request('POST', '/builds', body=body.encode('utf-8'),
+                           headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        data = response.read()
+    finally:
+        connection.close()
+
+    try:
+        result = json.loads(data.decode('utf-8'))
+    except ValueError:
+        result = {'error': data.decode('utf-8', 'replace')}
+    if response.status != 200:
+        raise ServerError('Lintly service returned {}: {}'.format(response.status, result.get('error')))
+    return result
+
+
+def get_server_url(host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+    if socket_path:
+        return '{}://{}'.format(UNIX_URL_SCHEME, socket_path)
+    return 'http://{}:{}'.format(host, port)
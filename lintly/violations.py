@@ -1,13 +1,154 @@
+import collections
+import enum
+
+
+class Severity(enum.IntEnum):
+    """
+    How serious a violation is. Severities are ordered, so ``Severity.ERROR > Severity.WARNING``.
+    """
+
+    INFO = 1
+    WARNING = 2
+    ERROR = 3
+
+    @classmethod
+    def from_name(cls, name):
+        try:
+            return cls[name.upper()]
+        except KeyError:
+            raise ValueError('Unknown severity "{}". Expected one of: {}'.format(
+                name, ', '.join(severity.label for severity in cls)))
+
+    @property
+    def label(self):
+        return self.name.lower()
+
+
 class Violation(object):
-    def __init__(self, line, column, code, message):
+    """
+    A single issue reported by a linter. ``end_line`` is set when the linter reports the
+    region a violation spans, and is None for violations on a single line.
+    """
+
+    __slots__ = ('line', 'column', 'code', 'message', 'severity', 'end_line')
+
+    def __init__(self, line, column, code, message, severity=Severity.WARNING, end_line=None):
         self.line = line
         self.column = column
         self.code = code
         self.message = message
+        self.severity = severity
+        self.end_line = end_line if end_line is not None and end_line > line else None
 
     def __str__(self):
         return self.message
 
     def __repr__(self):
-        return 'Violation(line={}, column={}, code="{}", message="{}")'.format(
-                        self.line, self.column, self.code, self.message)
+        return 'Violation(line={}, column={}, code="{}", message="{}", severity={})'.format(
+                        self.line, self.column, self.code, self.message, self.severity.label)
+
+
+class ViolationRange(object):
+    """
+    A run of violations with the same code on consecutive lines of a file.
+    """
+
+    def __init__(self, start_line, end_line, code, message, count=1, severity=Severity.WARNING):
+        self.start_line = start_line
+        self.end_line = end_line
+        self.code = code
+        self.message = message
+        self.count = count
+        self.severity = severity
+
+    def __repr__(self):
+        return 'ViolationRange(start_line={}, end_line={}, code="{}", message="{}", count={})'.format(
+            self.start_line, self.end_line, self.code, self.message, self.count)
+
+
+def group_violations_by_line(violations):
+    """
+    Returns an OrderedDict of line number to the violations on that line, in line order.
+    Duplicate violations (the same code and message on the same line) are only kept once.
+    """
+    lines = collections.OrderedDict()
+    seen = set()
+    for violation in sorted(violations, key=lambda v: v.line):
+        key = (violation.line, violation.code, violation.message)
+        if key in seen:
+            continue
+        seen.add(key)
+        lines.setdefault(violation.line, []).append(violation)
+    return lines
+
+
+def collapse_violation_ranges(violations):
+    """
+    Returns a list of ViolationRanges, ordered by start line, where violations with the same
+    code on consecutive (or overlapping) lines are collapsed into a single range. A range keeps
+    the message of its first violation and the highest severity of its violations.
+    """
+    ranges = []
+    open_ranges = {}
+    for line, line_violations in group_violations_by_line(violations).items():
+        for violation in line_violations:
+            end_line = violation.end_line or line
+            current = open_ranges.get(violation.code)
+            if current is not None and line - current.end_line <= 1:
+                current.end_line = max(current.end_line, end_line)
+                current.count += 1
+                current.severity = max(current.severity, violation.severity)
+            else:
+                current = ViolationRange(line, end_line, violation.code, violation.message,
+                                         severity=violation.severity)
+                open_ranges[violation.code] = current
+                ranges.append(current)
+    return ranges
+
+
+def count_violation_lines(violations):
+    """
+    Returns the number of distinct (file, line) pairs in a dict of file path to violations.
+    """
+    return sum(len(set(v.line for v in file_violations)) for file_violations in violations.values())
+
+
+class ViolationStats(object):
+    """
+    Counts of violations in total, per code, per file and per severity, built in a single pass
+    so that summaries, commit statuses and the exit code don't have to walk the violations again.
+    """
+
+    def __init__(self, violations=None):
+        self.total = 0
+        self.by_code = collections.Counter()
+        self.by_file = collections.Counter()
+        self.by_severity = collections.Counter()
+        if violations:
+            for file_path, file_violations in violations.items():
+                self.add(file_path, file_violations)
+
+    def __repr__(self):
+        return 'ViolationStats(total={}, files={})'.format(self.total, self.files_count)
+
+    def add(self, file_path, file_violations):
+        count = 0
+        for violation in file_violations:
+            self.by_code[violation.code] += 1
+            self.by_severity[violation.severity] += 1
+            count += 1
+        if count:
+            self.by_file[file_path] += count
+            self.total += count
+
+    @property
+    def files_count(self):
+        return len(self.by_file)
+
+    def top_codes(self, n):
+        """Returns the n most common codes and their counts."""
+        return self.by_code.most_common(n)
+
+    def top_files(self, n):
+        """Returns the n files with the most violations and their counts."""
+        return self.by_file.most_common(n)
@@ -10,8 +10,9 @@ dependencies = [
     'cached-property<2.0',
     'click<8.0',
     'Jinja2<3.0',
-    'PyGithub<2.0',
-    'python-gitlab<2.0',
+    'enum34; python_version < "3.4"',
+    'futures; python_version < "3.0"',
+    'requests',
     'six',
 ]
 
@@ -32,11 +33,17 @@ setup(
     description='Automated GitHub PR code reviewer for Python, JavaScript, CSS, and more.',
     long_description=read('README.md'),
     long_description_content_type='text/markdown',
-    packages=find_packages(exclude=['tests']),
+    packages=find_packages(exclude=['tests', 'benchmarks']),
     include_package_data=True,
     zip_safe=False,
     platforms='any',
     install_requires=dependencies,
+    extras_require={
+        # Streams large SARIF logs instead of loading them into memory
+        'sarif': ['ijson'],
+        # Matches files with many violations against the diff with vectorized searches
+        'numpy': ['numpy'],
+    },
     entry_points={
         'console_scripts': [
             'lintly = lintly.cli:main',
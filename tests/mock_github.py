@@ -0,0 +1,115 @@
+"""
+A tiny HTTP server that stands in for the GitHub API in tests and records every request it receives.
+"""
+import json
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+class MockResponse(object):
+
+    def __init__(self, body=None, status=200, headers=None, content_type='application/json'):
+        self.body = body
+        self.status = status
+        self.headers = dict(headers or {})
+        self.content_type = content_type
+
+    def encode(self):
+        if self.body is None:
+            return b''
+        if isinstance(self.body, bytes):
+            return self.body
+        if isinstance(self.body, str) and self.content_type != 'application/json':
+            return self.body.encode('utf-8')
+        return json.dumps(self.body).encode('utf-8')
+
+
+class RecordedRequest(object):
+
+    def __init__(self, method, path, headers, body):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+    @property
+    def json(self):
+        return json.loads(self.body.decode('utf-8')) if self.body else None
+
+    def __repr__(self):
+        return 'RecordedRequest({} {})'.format(self.method, self.path)
+
+
+class MockGitHubHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        request = RecordedRequest(self.command, self.path, dict(self.headers), body)
+        self.server.requests.append(request)
+
+        response = self.server.get_response(request)
+        data = response.encode()
+        self.send_response(response.status)
+        if data or response.status != 204:
+            self.send_header('Content-Type', response.content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in response.headers.items():
+            self.send_header(name, value.format(base_url=self.server.base_url))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+
+class MockGitHubServer(ThreadingMixIn, HTTPServer):
+    """
+    Serves canned responses registered with ``add``. A route's response can be a
+    ``MockResponse``, a list of them (returned in order, the last one repeating) or a callable
+    that takes the ``RecordedRequest`` and returns a ``MockResponse``. Unknown routes return 404.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), MockGitHubHandler)
+        self.routes = {}
+        self.requests = []
+        self.base_url = 'http://127.0.0.1:{}'.format(self.server_address[1])
+        self._thread = None
+
+    def add(self, method, path, response):
+        self.routes[(method.upper(), path)] = response
+
+    def get_response(self, request):
+        response = self.routes.get((request.method, request.path))
+        if response is None:
+            response = self.routes.get((request.method, request.path.split('?', 1)[0]))
+        if callable(response):
+            return response(request)
+        if isinstance(response, list):
+            return response.pop(0) if len(response) > 1 else response[0]
+        return response or MockResponse({'message': 'Not Found'}, status=404)
+
+    def requests_for(self, method=None, path=None):
+        return [r for r in self.requests
+                if (method is None or r.method == method) and (path is None or r.path.split('?')[0] == path)]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.01})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,41 @@
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from click.testing import CliRunner
+
+from benchmarks import run
+from benchmarks.generators import GENERATORS, generate_diff
+from lintly.parsers import PARSERS
+from lintly.patch import Patch
+
+
+class GeneratorTests(unittest.TestCase):
+
+    def test_generated_output_parses(self):
+        for fmt, generator in GENERATORS.items():
+            output = generator(lines=50, files=5, lines_per_file=100)
+            violations = PARSERS[fmt].parse_violations(output)
+            self.assertEqual(sum(len(v) for v in violations.values()), 50, fmt)
+            self.assertEqual(len(violations), 50 if fmt == 'black' else 5, fmt)
+
+    def test_generated_diff_parses(self):
+        diff = generate_diff(files=3, lines_per_file=200, hunks_per_file=4, added_per_hunk=5)
+        changed_lines = Patch(diff).changed_lines
+        self.assertEqual(len(changed_lines), 3 * 4 * 5)
+        self.assertEqual(changed_lines[0]['line_number'], 4)
+        self.assertEqual(changed_lines[0]['position'], 5)
+
+    def test_parsers_without_a_generator_are_reported(self):
+        parsers = dict.fromkeys(['flake8', 'custom'])
+        with mock.patch.object(run, 'PARSERS', parsers), \
+                mock.patch.object(run, 'run_benchmarks', return_value=[]) as run_benchmarks, \
+                mock.patch.object(run.click, 'echo') as echo:
+            result = CliRunner().invoke(run.main, [])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('no generator for the "custom" parser', echo.call_args_list[0][0][0])
+        self.assertEqual(run_benchmarks.call_args[0][5], ['flake8'])
@@ -1,12 +1,19 @@
 import pytest
 
 from lintly import builds
+from lintly.backends.errors import BudgetExceededError, RateLimitError
+from lintly.cache import write_violations_cache
 from lintly.config import Config
+from lintly.constants import ACTION_REVIEW_APPROVE, ACTION_REVIEW_REQUEST_CHANGES, ACTION_REVIEW_USE_CHECKS
+from lintly.patch import Patch
+from lintly.violations import Violation
+
+from .test_patch import load_diff
 
 try:
-    from unittest.mock import Mock
+    from unittest.mock import Mock, patch
 except ImportError:
-    from mock import Mock
+    from mock import Mock, patch
 
 
 @pytest.fixture(
@@ -46,3 +53,222 @@ def GitHubBackend(monkeypatch):
 def test_lintly_build(config, GitHubBackend, format_and_context):
     builds.LintlyBuild(config, "Some linter output")
     assert GitHubBackend.call_args[1]["context"] == format_and_context[2]
+
+
+def test_lintly_build_stats(GitHubBackend):
+    config = Config({
+        "api_key": "api_key",
+        "repo": "owner/repo",
+        "pr": 1,
+        "format": "flake8",
+        "commit_sha": "xyz123notarealsha",
+        "context": None,
+        "fail_on": "new",
+    })
+    build = builds.LintlyBuild(config, "a.py:1:1: E501 line too long\na.py:2:1: W291 trailing whitespace\n")
+
+    build._all_violations = build.parse_violations()
+
+    assert build._all_stats.total == 2
+    assert build.existing_issues_count == 2
+    assert build.introduced_issues_count == 0
+    assert not build.has_violations
+
+
+@pytest.mark.parametrize("fail_on, expected_lines", [
+    ("new", [270, 276]),
+    ("touched", [270, 271, 276]),
+])
+def test_find_diff_violations(GitHubBackend, fail_on, expected_lines):
+    config = Config({
+        "api_key": "api_key",
+        "repo": "owner/repo",
+        "pr": 1,
+        "format": "flake8",
+        "commit_sha": "xyz123notarealsha",
+        "context": None,
+        "fail_on": fail_on,
+    })
+    build = builds.LintlyBuild(config, "")
+    build._all_violations = {
+        "dir1/dir2/britecore.py": [
+            Violation(line=270, column=1, code="E501", message="line too long"),
+            Violation(line=271, column=1, code="W291", message="trailing whitespace"),
+            Violation(line=276, column=1, code="E127", message="over-indented", end_line=800),
+            Violation(line=300, column=1, code="E501", message="line too long"),
+        ],
+        "other.py": [Violation(line=1, column=1, code="E501", message="line too long")],
+    }
+
+    violations = build.find_diff_violations(Patch(load_diff("single_file.diff")))
+
+    assert list(violations) == ["dir1/dir2/britecore.py"]
+    assert [v.line for v in violations["dir1/dir2/britecore.py"]] == expected_lines
+
+
+def test_find_diff_violations_only_decodes_the_diff_files_of_a_cache(GitHubBackend, tmp_path):
+    cache_path = tmp_path / "violations.cache"
+    violations = {"file{}.py".format(i): [Violation(line=1, column=1, code="E501", message="line too long")]
+                  for i in range(1000)}
+    violations["dir1/dir2/britecore.py"] = [Violation(line=270, column=1, code="E501", message="line too long")]
+    write_violations_cache(violations, str(cache_path))
+    config = Config({
+        "api_key": "api_key",
+        "repo": "owner/repo",
+        "pr": 1,
+        "format": "flake8",
+        "commit_sha": "xyz123notarealsha",
+        "context": None,
+        "fail_on": "new",
+        "from_cache": str(cache_path),
+    })
+    build = builds.LintlyBuild(config, None)
+    build._all_violations = build.parse_violations()
+
+    diff_violations = build.find_diff_violations(Patch(load_diff("single_file.diff")))
+
+    assert list(diff_violations) == ["dir1/dir2/britecore.py"]
+    assert list(build._all_violations._loaded) == ["dir1/dir2/britecore.py"]
+    assert build._all_stats.total == 1001
+    build._all_violations.close()
+
+
+def test_lintly_build_parses_lines_as_they_are_read(GitHubBackend):
+    config = Config({
+        "api_key": "api_key",
+        "repo": "owner/repo",
+        "pr": 1,
+        "format": "flake8",
+        "commit_sha": "xyz123notarealsha",
+        "context": None,
+    })
+    lines = ["a.py:1:1: E501 line too long\n", "b.py:2:1: W291 trailing whitespace\n"]
+    build = builds.LintlyBuild(config, iter(lines))
+
+    with patch.object(builds.PARSERS["flake8"], "parse_violations") as parse_violations:
+        violations = build.parse_violations()
+
+    assert not parse_violations.called
+    assert sorted(violations) == ["a.py", "b.py"]
+    assert build.metrics.gauges[("parse.lines", ())] == 2
+    assert build.metrics.gauges[("parse.bytes", ())] == len("".join(lines))
+
+
+def test_lintly_build_reads_input_file(GitHubBackend, tmp_path):
+    input_path = tmp_path / "flake8.txt"
+    input_path.write_bytes(b"a.py:1:1: E501 line too long\nb.py:2:1: W291 trailing whitespace\n")
+    config = Config({
+        "api_key": "api_key",
+        "repo": "owner/repo",
+        "pr": 1,
+        "format": "flake8",
+        "commit_sha": "xyz123notarealsha",
+        "context": None,
+        "input": str(input_path),
+    })
+    build = builds.LintlyBuild(config, None)
+
+    violations = build.parse_violations()
+
+    assert sorted(violations) == ["a.py", "b.py"]
+    assert build.metrics.gauges[("parse.bytes", ())] == input_path.stat().st_size
+
+
+def test_lintly_build_posts_policy_result(GitHubBackend, tmp_path):
+    baseline_path = tmp_path / "baseline.json"
+    config = Config({
+        "api_key": "api_key",
+        "repo": "owner/repo",
+        "pr": 1,
+        "format": "flake8",
+        "commit_sha": "xyz123notarealsha",
+        "context": None,
+        "fail_on": "any",
+        "post_status": True,
+        "max_violations": 5,
+        "budgets": ("W291=0",),
+        "baseline_out": str(baseline_path),
+    })
+    build = builds.LintlyBuild(config, "a.py:1:1: E501 line too long\nb.py:2:1: W291 trailing whitespace\n")
+    build._all_violations = build.parse_violations()
+
+    build.evaluate_policy()
+    build.post_commit_status()
+
+    assert build.result.exit_code == 1
+    build.git_client.post_status.assert_called_once_with(
+        "failure", "Pull Request introduced 2 linting violations: 1 W291 (budget 0)", sha="xyz123notarealsha")
+    assert baseline_path.exists()
+
+
+def test_review_and_check_run_follow_the_policy(GitHubBackend):
+    config = Config({
+        "api_key": "api_key",
+        "repo": "owner/repo",
+        "pr": 1,
+        "format": "flake8",
+        "commit_sha": "xyz123notarealsha",
+        "context": None,
+        "fail_on": "any",
+        "request_changes": True,
+        "max_violations": 5,
+        "use_checks": False,
+    })
+    build = builds.LintlyBuild(config, "a.py:1:1: E501 line too long\n")
+    build._all_violations = build.parse_violations()
+    build.evaluate_policy()
+
+    assert build.has_violations
+    assert build._get_pr_review_action() == ACTION_REVIEW_APPROVE
+
+    with patch.object(builds.LintlyBuild, "_get_pr_review_action", return_value=ACTION_REVIEW_USE_CHECKS):
+        build.submit_to_pr(Patch(""))
+    assert build.git_client.create_check_run.call_args[1]["conclusion"] == "success"
+
+
+def make_fail_on_new_build(linter_output="dir1/dir2/britecore.py:270:1: E501 line too long\n"):
+    config = Config({
+        "api_key": "api_key",
+        "repo": "owner/repo",
+        "pr": 1,
+        "format": "flake8",
+        "commit_sha": "xyz123notarealsha",
+        "context": None,
+        "fail_on": "new",
+        "post_status": True,
+        "request_changes": True,
+        "use_checks": False,
+        "cleanup_mode": "delete",
+    })
+    return builds.LintlyBuild(config, linter_output)
+
+
+def test_rate_limited_review_falls_back_to_a_comment(GitHubBackend):
+    build = make_fail_on_new_build()
+    build.git_client.estimate_pr_review_calls.return_value = 1
+    build.git_client.create_pull_request_review.side_effect = RateLimitError("API rate limit exceeded")
+
+    build.submit_pr_review(Patch(""), ACTION_REVIEW_REQUEST_CHANGES)
+
+    assert build.git_client.create_pull_request_comment.call_count == 1
+
+
+def test_cleanup_is_skipped_when_the_budget_is_used_up(GitHubBackend):
+    build = make_fail_on_new_build()
+    build.git_client.cleanup_pull_request_comments.side_effect = BudgetExceededError("budget used up")
+
+    build.cleanup_previous_comments()
+
+    assert build.metrics.get_counter("cleanup.skipped") == 1
+
+
+def test_violations_count_as_new_when_the_diff_is_unavailable(GitHubBackend):
+    build = make_fail_on_new_build()
+    build.git_client.get_pr_diff.side_effect = BudgetExceededError("budget used up")
+    build.git_client.estimate_pr_review_calls.return_value = 1
+
+    build.execute()
+
+    assert build.new_issues_count == 1
+    assert build.result.state == "failure"
+    assert build.metrics.get_counter("diff.unavailable") == 1
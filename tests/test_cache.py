@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from lintly.cache import CacheError, ViolationCache, write_violations_cache
+from lintly.violations import Severity, Violation, ViolationStats
+
+
+class ViolationCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.temp_dir, 'violations.cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_round_trip(self):
+        violations = {
+            'lintly/parsers.py': [
+                Violation(line=80, column=5, code='E303', message='too many blank lines (3)', end_line=82),
+                Violation(line=216, column=1, code='W391', message='blank line at end of file',
+                          severity=Severity.ERROR),
+            ],
+            u'lintly/café.py': [
+                Violation(line=1, column=0, code='E303', message='too many blank lines (3)'),
+            ],
+            'empty.py': [],
+        }
+        write_violations_cache(violations, self.cache_path)
+
+        with ViolationCache(self.cache_path) as cache:
+            self.assertEqual(set(cache.keys()), set(violations.keys()))
+            self.assertEqual(len(cache), 3)
+            for file_path, expected in violations.items():
+                actual = cache[file_path]
+                self.assertEqual(
+                    [(v.line, v.column, v.code, v.message, v.severity, v.end_line) for v in actual],
+                    [(v.line, v.column, v.code, v.message, v.severity, v.end_line) for v in expected]
+                )
+            self.assertIsNone(cache.get('missing.py'))
+
+    def test_only_requested_files_are_loaded(self):
+        violations = {
+            'a.py': [Violation(line=1, column=1, code='E1', message='a')],
+            'b.py': [Violation(line=2, column=1, code='E2', message='b')],
+        }
+        write_violations_cache(violations, self.cache_path)
+
+        with ViolationCache(self.cache_path) as cache:
+            self.assertEqual(cache['b.py'][0].line, 2)
+            self.assertEqual(list(cache._loaded.keys()), ['b.py'])
+
+    def test_stats_are_read_without_loading_files(self):
+        violations = {
+            'a.py': [Violation(line=1, column=1, code='E1', message='a'),
+                     Violation(line=2, column=1, code='E1', message='b', severity=Severity.ERROR)],
+            'b.py': [Violation(line=2, column=1, code='W2', message='b')],
+            'empty.py': [],
+        }
+        write_violations_cache(violations, self.cache_path)
+        expected = ViolationStats(violations)
+
+        with ViolationCache(self.cache_path) as cache:
+            stats = cache.get_stats()
+            self.assertEqual(cache._loaded, {})
+
+        self.assertEqual((stats.total, stats.by_code, stats.by_file, stats.by_severity),
+                         (expected.total, expected.by_code, expected.by_file, expected.by_severity))
+
+    def test_invalid_file(self):
+        with open(self.cache_path, 'wb') as f:
+            f.write(b'not a cache file at all, just some bytes')
+
+        with self.assertRaises(CacheError):
+            ViolationCache(self.cache_path)
+
+    def test_empty_file(self):
+        open(self.cache_path, 'wb').close()
+
+        with self.assertRaises(CacheError):
+            ViolationCache(self.cache_path)
+
+    def test_truncated_file(self):
+        write_violations_cache({'a.py': [Violation(line=1, column=1, code='E1', message='a')]}, self.cache_path)
+        with open(self.cache_path, 'rb') as f:
+            data = f.read()
+        with open(self.cache_path, 'wb') as f:
+            f.write(data[:-1])
+
+        with self.assertRaises(CacheError) as context:
+            ViolationCache(self.cache_path)
+        self.assertIn('truncated', str(context.exception))
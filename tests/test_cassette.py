@@ -0,0 +1,98 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from lintly.backends.cassette import CassetteError, RecordingSession, ReplaySession
+from lintly.backends.github import GitHubAPIClient
+from lintly.builds import LintlyBuild
+from lintly.config import Config
+
+from .mock_github import MockGitHubServer, MockResponse
+from .test_github import graphql_comments_page, load_diff
+
+
+LINTER_OUTPUT = 'dir1/dir2/britecore.py:270:1: E501 line too long\n'
+
+
+def get_config(**options):
+    cli_config = {
+        'api_key': 'token',
+        'repo': 'owner/repo',
+        'pr': '1',
+        'commit_sha': 'abc123',
+        'format': 'flake8',
+        'context': None,
+        'fail_on': 'any',
+        'post_status': True,
+        'request_changes': True,
+        'use_checks': False,
+    }
+    cli_config.update(options)
+    return Config(cli_config)
+
+
+class CassetteTests(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'build.jsonl')
+        self.server = MockGitHubServer().start()
+        self.server.add('GET', '/repos/owner/repo/pulls/1', MockResponse(
+            load_diff('single_file.diff'), content_type='text/plain'))
+        self.server.add('POST', '/graphql', MockResponse(graphql_comments_page([], [])))
+        self.server.add('POST', '/repos/owner/repo/pulls/1/reviews', MockResponse({'id': 1}))
+        self.server.add('POST', '/repos/owner/repo/statuses/abc123', MockResponse({'id': 1}, status=201))
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def run_build(self, **options):
+        with mock.patch.object(GitHubAPIClient, 'base_url', self.server.base_url), \
+                mock.patch.dict(os.environ, {'GITHUB_RUN_ID': ''}):
+            build = LintlyBuild(get_config(**options), LINTER_OUTPUT)
+            build.execute()
+        return build
+
+    def test_replayed_build_makes_no_requests(self):
+        recorded = self.run_build(record=self.path)
+        requests_made = len(self.server.requests)
+        with open(self.path) as f:
+            interactions = [json.loads(line) for line in f]
+
+        replayed = self.run_build(replay=self.path)
+
+        self.assertEqual(len(self.server.requests), requests_made)
+        self.assertEqual([i['method'] for i in interactions], ['GET', 'POST', 'POST', 'POST'])
+        self.assertNotIn('token', open(self.path).read())
+        self.assertEqual(replayed.result.state, recorded.result.state)
+        self.assertEqual(replayed.git_client.client.session.remaining, 0)
+        self.assertIsNone(replayed.config.api_rate)
+
+    def test_unrecorded_request(self):
+        self.run_build(record=self.path)
+        session = ReplaySession(self.path)
+
+        with self.assertRaises(CassetteError):
+            session.request('GET', self.server.base_url + '/repos/owner/repo/pulls/2')
+
+    def test_dummy_backend_posts_nothing(self):
+        build = self.run_build(backend='dummy')
+
+        self.assertEqual(self.server.requests, [])
+        self.assertEqual(build.result.state, 'failure')
+
+    def test_binary_bodies_round_trip(self):
+        self.server.add('GET', '/binary', MockResponse(b'\xff\xfe\x00lintly', content_type='application/octet-stream'))
+        RecordingSession(self.path).request('GET', self.server.base_url + '/binary')
+
+        response = ReplaySession(self.path).request('GET', self.server.base_url + '/binary')
+
+        self.assertEqual(response.content, b'\xff\xfe\x00lintly')
@@ -27,3 +27,21 @@ def test_cli(runner):
 #     assert result.exit_code == 0
 #     assert not result.exception
 #     assert result.output.strip() == 'It works!'
+
+
+def test_cli_rejects_invalid_budgets(runner):
+    result = runner.invoke(cli.main, ['--budget', 'E501'], input='')
+    assert result.exit_code == 2
+    assert 'Expected CODE=COUNT' in result.output
+
+
+def test_cli_rejects_negative_lock_timeout(runner):
+    result = runner.invoke(cli.main, ['--lock-timeout', '-1'], input='')
+    assert result.exit_code == 2
+    assert 'must not be negative' in result.output
+
+
+def test_cli_rejects_zero_api_rate(runner):
+    result = runner.invoke(cli.main, ['--api-rate', '0'], input='')
+    assert result.exit_code == 2
+    assert 'must be greater than 0' in result.output
@@ -0,0 +1,40 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from lintly.compat import replace_file
+
+
+class ReplaceFileTests(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.temp_dir, 'source')
+        self.destination = os.path.join(self.temp_dir, 'destination')
+        for path, data in ((self.source, 'new'), (self.destination, 'old')):
+            with open(path, 'w') as f:
+                f.write(data)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def assert_replaced(self):
+        self.assertFalse(os.path.exists(self.source))
+        with open(self.destination) as f:
+            self.assertEqual(f.read(), 'new')
+
+    def test_replace_file(self):
+        replace_file(self.source, self.destination)
+        self.assert_replaced()
+
+    def test_replace_file_without_os_replace(self):
+        with mock.patch('lintly.compat.os', mock.Mock(wraps=os, spec=['rename', 'remove', 'path'])), \
+                mock.patch('lintly.compat.sys.platform', 'win32'):
+            replace_file(self.source, self.destination)
+        self.assert_replaced()
@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import click
+
+from lintly.config import Config, read_config_file
+from lintly.filters import PathMatcher, ViolationFilter
+from lintly.violations import Severity, Violation
+
+
+class ViolationFilterTests(unittest.TestCase):
+
+    def test_code_patterns(self):
+        violation_filter = ViolationFilter(include_codes=['E*', 'W6*'], exclude_codes=['E501'])
+
+        self.assertTrue(violation_filter.matches_code('E303'))
+        self.assertTrue(violation_filter.matches_code('W605'))
+        self.assertFalse(violation_filter.matches_code('E501'))
+        self.assertFalse(violation_filter.matches_code('W291'))
+
+    def test_path_globs(self):
+        violation_filter = ViolationFilter(exclude_paths=['vendor/*', '*_pb2.py'])
+
+        self.assertTrue(violation_filter.matches_path('lintly/cli.py'))
+        self.assertFalse(violation_filter.matches_path('vendor/six.py'))
+        self.assertFalse(violation_filter.matches_path('protos/service_pb2.py'))
+        # Results are remembered for each path
+        self.assertEqual(violation_filter.path_matcher._results, {
+            'lintly/cli.py': True, 'vendor/six.py': False, 'protos/service_pb2.py': False})
+
+    def test_min_severity(self):
+        violation_filter = ViolationFilter(min_severity=Severity.WARNING)
+
+        self.assertTrue(violation_filter.matches('a.py', 'E1', Severity.ERROR))
+        self.assertTrue(violation_filter.matches('a.py', 'W1', Severity.WARNING))
+        self.assertFalse(violation_filter.matches('a.py', 'C1', Severity.INFO))
+
+    def test_filter_violations(self):
+        violation_filter = ViolationFilter(exclude_codes=['W*'], exclude_paths=['b.py'])
+        violations = {
+            'a.py': [Violation(line=1, column=1, code='E1', message='a'),
+                     Violation(line=2, column=1, code='W1', message='a')],
+            'b.py': [Violation(line=1, column=1, code='E1', message='b')],
+            'c.py': [Violation(line=1, column=1, code='W1', message='c')],
+        }
+
+        filtered = violation_filter.filter_violations(violations)
+
+        self.assertEqual(list(filtered.keys()), ['a.py'])
+        self.assertEqual([v.code for v in filtered['a.py']], ['E1'])
+
+    def test_from_config(self):
+        self.assertIsNone(ViolationFilter.from_config(Config({})))
+
+        violation_filter = ViolationFilter.from_config(Config({'min_severity': 'error', 'exclude_codes': ('E501',)}))
+
+        self.assertEqual(violation_filter.min_severity, Severity.ERROR)
+        self.assertFalse(violation_filter.matches_code('E501'))
+
+
+class PathMatcherTests(unittest.TestCase):
+
+    def assertMatches(self, globs, matching, not_matching):
+        matcher = PathMatcher(include=globs)
+        for path in matching:
+            self.assertTrue(matcher.matches(path), '{} should match {}'.format(globs, path))
+        for path in not_matching:
+            self.assertFalse(matcher.matches(path), '{} should not match {}'.format(globs, path))
+
+    def test_glob_without_slash_matches_at_any_depth(self):
+        self.assertMatches(['*.min.js'], ['app.min.js', 'static/js/app.min.js'], ['app.js', 'app.min.jsx'])
+
+    def test_directory_matches_its_contents(self):
+        self.assertMatches(['vendor'], ['vendor/six.py', 'lib/vendor/six.py'], ['vendored/six.py'])
+        self.assertMatches(['build/'], ['build/lib/a.py'], ['builder.py'])
+
+    def test_glob_with_slash_is_anchored(self):
+        self.assertMatches(['src/*.py'], ['src/a.py'], ['lib/src/a.py', 'src/pkg/a.py'])
+        self.assertMatches(['./src/*.py'], ['src/a.py'], ['lib/src/a.py'])
+
+    def test_double_star(self):
+        self.assertMatches(['src/**/migrations/*.py'],
+                           ['src/migrations/0001.py', 'src/app/db/migrations/0001.py'],
+                           ['src/app/0001.py'])
+
+    def test_character_classes(self):
+        self.assertMatches(['file[0-9].py', 'x[!a].py'], ['file1.py', 'xb.py'], ['filea.py', 'xa.py'])
+
+    def test_exclude_wins_over_include(self):
+        matcher = PathMatcher(include=['src'], exclude=['*_pb2.py'])
+
+        self.assertTrue(matcher.matches('src/service.py'))
+        self.assertFalse(matcher.matches('src/service_pb2.py'))
+        self.assertFalse(matcher.matches('docs/conf.py'))
+
+
+class ConfigFileTests(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, name, content):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_reads_first_file_with_a_lintly_section(self):
+        setup_cfg = self.write('setup.cfg', '[wheel]\nuniversal = 1\n')
+        tox_ini = self.write('tox.ini', '[lintly]\nexclude =\n    vendor\n    *_pb2.py, docs\nmin-severity = error\n')
+
+        file_config = read_config_file([setup_cfg, tox_ini, os.path.join(self.temp_dir, 'missing.cfg')])
+        config = Config({'include_paths': ()}, file_config=file_config)
+
+        self.assertEqual(config.exclude_paths, ['vendor', '*_pb2.py', 'docs'])
+        self.assertEqual(config.include_paths, [])
+        self.assertEqual(config.min_severity, Severity.ERROR)
+
+    def test_invalid_min_severity_in_the_config_file(self):
+        config = Config({}, file_config={'min_severity': 'fatal'})
+
+        with self.assertRaises(click.BadParameter) as context:
+            config.min_severity
+        self.assertIn('Unknown severity "fatal"', str(context.exception))
+        self.assertIn('info, warning, error', str(context.exception))
+
+    def test_cli_options_override_the_config_file(self):
+        config = Config({'exclude_paths': ('build',)}, file_config={'exclude': 'vendor'})
+
+        self.assertEqual(config.exclude_paths, ['build'])
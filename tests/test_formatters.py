@@ -0,0 +1,52 @@
+import unittest
+
+from lintly.constants import LINTLY_IDENTIFIER
+from lintly.formatters import build_pr_comment
+from lintly.violations import Violation
+
+
+def make_violations(files, per_file, code='E501'):
+    return dict(('file{}.py'.format(i), [Violation(line=line, column=1, code=code, message='line too long')
+                                         for line in range(1, per_file + 1)])
+                for i in range(files))
+
+
+class BuildPRCommentTests(unittest.TestCase):
+
+    def test_lists_every_violation(self):
+        comment = build_pr_comment(None, make_violations(2, 3))
+
+        self.assertIn('#### file0.py', comment)
+        self.assertIn('* **E501**: line too long (line: 3, column: 1)', comment)
+        self.assertNotIn('not shown', comment)
+        self.assertTrue(comment.endswith(LINTLY_IDENTIFIER))
+
+    def test_no_violations(self):
+        comment = build_pr_comment(None, {})
+
+        self.assertIn('No linting violations have been found in this PR.', comment)
+
+    def test_truncates_to_max_length_and_summarizes_the_rest(self):
+        violations = make_violations(50, 200)
+        violations['big.py'] = [Violation(line=1, column=1, code='W291', message='trailing whitespace')] * 500
+
+        comment = build_pr_comment(None, violations, max_length=20000)
+
+        self.assertLessEqual(len(comment), 20000)
+        self.assertIn('more issues not shown', comment)
+        shown = comment.count('* **E501**: line too long (line:')
+        self.assertIn('#### {} more issues not shown'.format(50 * 200 + 500 - shown), comment)
+        # The file with the most hidden issues is listed first
+        self.assertIn('Files with the most issues not shown:\n\n* big.py: 500\n', comment)
+        self.assertIn('* **E501**: ', comment.split('Most common issues not shown:')[1])
+        self.assertTrue(comment.endswith(LINTLY_IDENTIFIER))
+
+    def test_lists_top_offenders(self):
+        violations = make_violations(1, 2)
+        violations['other.py'] = [Violation(line=1, column=1, code='W291', message='trailing whitespace')]
+
+        comment = build_pr_comment(None, violations)
+
+        self.assertIn('**3** issues in **2** files.', comment)
+        self.assertIn('Top rules: **E501** (2), **W291** (1)', comment)
+        self.assertIn('Top files: `file0.py` (2), `other.py` (1)', comment)
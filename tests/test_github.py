@@ -0,0 +1,296 @@
+import os
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from lintly.backends.errors import GitClientError
+from lintly.backends.github import GitHubAPIClient, GitHubBackend
+from lintly.backends.scheduler import RequestScheduler
+from lintly.builds import LintlyBuild
+from lintly.config import Config
+from lintly.constants import ACTION_REVIEW_COMMENT, CLEANUP_MINIMIZE, LINTLY_IDENTIFIER
+from lintly.patch import Patch
+from lintly.projects import Project
+from lintly.violations import Severity, Violation
+
+from .mock_github import MockGitHubServer, MockResponse
+
+
+def load_diff(file_name):
+    path = os.path.join(os.path.dirname(__file__), 'diffs', file_name)
+    with open(path) as f:
+        return f.read()
+
+
+def graphql_comments_page(comments, threads, comments_cursor=None, threads_cursor=None):
+    return {'data': {'repository': {'pullRequest': {
+        'comments': {
+            'pageInfo': {'hasNextPage': comments_cursor is not None, 'endCursor': comments_cursor},
+            'nodes': comments,
+        },
+        'reviewThreads': {
+            'pageInfo': {'hasNextPage': threads_cursor is not None, 'endCursor': threads_cursor},
+            'nodes': [{'id': 'RT_{}'.format(i),
+                       'comments': {'pageInfo': {'hasNextPage': False, 'endCursor': None}, 'nodes': thread}}
+                      for i, thread in enumerate(threads)],
+        },
+    }}}}
+
+
+def graphql_comment(comment_id, lintly=True, minimized=False):
+    body = 'E501 line too long ' + LINTLY_IDENTIFIER if lintly else 'Please fix this'
+    return {'id': comment_id, 'body': body, 'isMinimized': minimized}
+
+
+class GitHubBackendTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockGitHubServer().start()
+        self.backend = GitHubBackend(
+            token='token',
+            project=Project('owner/repo'),
+            context='Lintly/flake8',
+            scheduler=RequestScheduler(rate=None),
+            base_url=self.server.base_url
+        )
+
+    def tearDown(self):
+        self.server.stop()
+
+
+class GitHubBackendTests(GitHubBackendTestCase):
+
+    def test_get_pull_request(self):
+        self.server.add('GET', '/repos/owner/repo/pulls/1', MockResponse({
+            'number': 1,
+            'url': 'https://api.github.com/repos/owner/repo/pulls/1',
+            'head': {'ref': 'feature', 'sha': 'abc'},
+            'base': {'ref': 'master', 'sha': 'def'},
+        }))
+
+        pull_request = self.backend.get_pull_request(1)
+
+        self.assertEqual(pull_request.head_sha, 'abc')
+        self.assertEqual(pull_request.base_ref, 'master')
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_create_pull_request_comment(self):
+        self.server.add('POST', '/repos/owner/repo/issues/1/comments', MockResponse({'id': 1}, status=201))
+
+        self.backend.create_pull_request_comment(1, 'Hello')
+
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.server.requests[0].json, {'body': 'Hello'})
+
+    def test_delete_pull_request_comments_follows_pagination(self):
+        next_link = '<{base_url}/repos/owner/repo/issues/1/comments?per_page=100&page=2>; rel="next"'
+        self.server.add('GET', '/repos/owner/repo/issues/1/comments?per_page=100', MockResponse(
+            [{'id': 1, 'body': 'Looks good'}, {'id': 2, 'body': 'Issues ' + LINTLY_IDENTIFIER}],
+            headers={'Link': next_link}))
+        self.server.add('GET', '/repos/owner/repo/issues/1/comments?per_page=100&page=2', MockResponse(
+            [{'id': 3, 'body': 'More issues ' + LINTLY_IDENTIFIER}]))
+        self.server.add('DELETE', '/repos/owner/repo/issues/comments/2', MockResponse(status=204))
+        self.server.add('DELETE', '/repos/owner/repo/issues/comments/3', MockResponse(status=204))
+
+        self.backend.delete_pull_request_comments(1)
+
+        self.assertEqual(len(self.server.requests_for('GET')), 2)
+        self.assertEqual([r.path for r in self.server.requests_for('DELETE')],
+                         ['/repos/owner/repo/issues/comments/2', '/repos/owner/repo/issues/comments/3'])
+
+    def test_delete_pull_request_review_comments(self):
+        self.server.add('GET', '/repos/owner/repo/pulls/1/comments', MockResponse(
+            [{'id': 7, 'body': 'E501 ' + LINTLY_IDENTIFIER}, {'id': 8, 'body': 'Nice'}]))
+        self.server.add('DELETE', '/repos/owner/repo/pulls/comments/7', MockResponse(status=204))
+
+        self.backend.delete_pull_request_review_comments(1)
+
+        self.assertEqual([(r.method, r.path.split('?')[0]) for r in self.server.requests], [
+            ('GET', '/repos/owner/repo/pulls/1/comments'),
+            ('DELETE', '/repos/owner/repo/pulls/comments/7'),
+        ])
+
+    def test_get_pr_diff(self):
+        self.server.add('GET', '/repos/owner/repo/pulls/1', MockResponse(
+            load_diff('single_file.diff'), content_type='text/plain'))
+
+        diff = self.backend.get_pr_diff(1)
+
+        self.assertEqual(diff, load_diff('single_file.diff'))
+        self.assertEqual(self.server.requests[0].headers['Accept'], 'application/vnd.github.3.diff')
+
+    def test_create_pull_request_review_merges_violations_on_the_same_line(self):
+        self.server.add('POST', '/repos/owner/repo/pulls/1/reviews', MockResponse({'id': 1}))
+        patch = Patch(load_diff('single_file.diff'))
+        violations = {'dir1/dir2/britecore.py': [
+            Violation(line=270, column=1, code='E501', message='line too long'),
+            Violation(line=270, column=1, code='E501', message='line too long'),
+            Violation(line=270, column=5, code='W291', message='trailing whitespace'),
+        ]}
+
+        self.backend.create_pull_request_review(1, patch, violations, ACTION_REVIEW_COMMENT)
+
+        comments = self.server.requests[0].json['comments']
+        self.assertEqual(len(comments), 1)
+        self.assertIn('* E501: line too long\n* W291: trailing whitespace', comments[0]['body'])
+
+    def test_create_pull_request_review_posts_ranges_and_context_lines(self):
+        self.server.add('POST', '/repos/owner/repo/pulls/1/reviews', MockResponse({'id': 1}))
+        patch = Patch(load_diff('single_file.diff'))
+        violations = {'dir1/dir2/britecore.py': [
+            Violation(line=268, column=1, code='E127', message='over-indented', end_line=275),
+            Violation(line=776, column=1, code='W291', message='trailing whitespace'),
+        ]}
+
+        self.backend.create_pull_request_review(1, patch, violations, ACTION_REVIEW_COMMENT)
+
+        comments = sorted(self.server.requests[0].json['comments'], key=lambda comment: 'position' in comment)
+        self.assertEqual([dict((k, v) for k, v in c.items() if k != 'body') for c in comments], [
+            {'path': 'dir1/dir2/britecore.py', 'start_line': 268, 'start_side': 'RIGHT', 'line': 273, 'side': 'RIGHT'},
+            {'path': 'dir1/dir2/britecore.py', 'position': 12},
+        ])
+
+    def test_check_annotations_collapse_ranges(self):
+        violations = {'a.py': [Violation(line=line, column=1, code='E501', message='line too long')
+                               for line in (1, 2, 3, 7)]}
+
+        annotations = self.backend._get_check_annotations(violations)
+
+        self.assertEqual([(a['start_line'], a['end_line']) for a in annotations], [(1, 3), (7, 7)])
+
+    def test_check_annotation_levels_follow_severity(self):
+        violations = {'a.py': [
+            Violation(line=1, column=1, code='E1', message='error', severity=Severity.ERROR),
+            Violation(line=5, column=1, code='W1', message='warning', severity=Severity.WARNING),
+            Violation(line=9, column=1, code='C1', message='convention', severity=Severity.INFO),
+        ]}
+
+        annotations = self.backend._get_check_annotations(violations)
+
+        self.assertEqual([a['annotation_level'] for a in annotations], ['failure', 'warning', 'notice'])
+
+
+class GitHubGraphQLCleanupTests(GitHubBackendTestCase):
+
+    def setUp(self):
+        super(GitHubGraphQLCleanupTests, self).setUp()
+        pages = [
+            graphql_comments_page(
+                [graphql_comment('IC_1'), graphql_comment('IC_2', lintly=False)],
+                [[graphql_comment('RC_{}'.format(i))] for i in range(100)],
+                threads_cursor='cursor-1'),
+            graphql_comments_page(
+                [],
+                [[graphql_comment('RC_100', minimized=True), graphql_comment('RC_101', lintly=False)]]),
+        ]
+
+        def respond(request):
+            query = request.json['query']
+            if query.lstrip().startswith('query'):
+                return MockResponse(pages.pop(0))
+            return MockResponse({'data': {}})
+
+        self.server.add('POST', '/graphql', respond)
+
+    def get_mutations(self):
+        return [r.json for r in self.server.requests if r.json['query'].startswith('mutation')]
+
+    def test_cleanup_deletes_in_batches(self):
+        self.backend.cleanup_pull_request_comments(1)
+
+        queries = [r.json for r in self.server.requests if r.json['query'].lstrip().startswith('query')]
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(queries[1]['variables']['withComments'], False)
+        self.assertEqual(queries[1]['variables']['threadsCursor'], 'cursor-1')
+
+        # 1 issue comment and 101 review comments are deleted in 3 requests
+        mutations = self.get_mutations()
+        self.assertEqual([len(m['variables']) for m in mutations], [50, 50, 2])
+        self.assertIn('deleteIssueComment(input: $input0)', mutations[0]['query'])
+        self.assertEqual(mutations[0]['variables']['input0'], {'id': 'IC_1'})
+        self.assertIn('deletePullRequestReviewComment', mutations[2]['query'])
+        self.assertEqual(self.backend.metrics.get_total('comments.deleted'), 102)
+        self.assertEqual(len(self.server.requests), 5)
+
+    def test_long_threads_are_paginated(self):
+        page = graphql_comments_page([], [[graphql_comment('RC_1')]])
+        page['data']['repository']['pullRequest']['reviewThreads']['nodes'][0]['comments']['pageInfo'] = {
+            'hasNextPage': True, 'endCursor': 'thread-cursor'}
+        thread_page = {'data': {'node': {'comments': {
+            'pageInfo': {'hasNextPage': False, 'endCursor': None},
+            'nodes': [graphql_comment('RC_2'), graphql_comment('RC_3', lintly=False)],
+        }}}}
+        responses = [page, thread_page]
+        self.server.add('POST', '/graphql', lambda request: MockResponse(
+            responses.pop(0) if request.json['query'].lstrip().startswith('query') else {'data': {}}))
+
+        self.backend.cleanup_pull_request_comments(1)
+
+        self.assertEqual(self.server.requests[1].json['variables'], {'id': 'RT_0', 'cursor': 'thread-cursor'})
+        self.assertEqual(self.get_mutations()[0]['variables'], {'input0': {'id': 'RC_1'}, 'input1': {'id': 'RC_2'}})
+
+    def test_cleanup_minimizes_comments(self):
+        self.backend.cleanup_pull_request_comments(1, mode=CLEANUP_MINIMIZE)
+
+        mutations = self.get_mutations()
+        self.assertEqual([len(m['variables']) for m in mutations], [50, 50, 1])
+        self.assertIn('$input0: MinimizeCommentInput!', mutations[0]['query'])
+        self.assertEqual(mutations[0]['variables']['input0'], {'subjectId': 'IC_1', 'classifier': 'OUTDATED'})
+        self.assertEqual(self.backend.metrics.get_total('comments.minimized'), 101)
+
+    def test_graphql_errors_are_raised(self):
+        self.server.add('POST', '/graphql', MockResponse({'errors': [{'message': 'Bad credentials'}]}))
+
+        with self.assertRaises(GitClientError):
+            self.backend.cleanup_pull_request_comments(1)
+
+    def test_github_enterprise_graphql_url(self):
+        client = GitHubAPIClient(token='token', base_url=self.server.base_url + '/api/v3')
+        self.server.add('POST', '/api/graphql', MockResponse({'data': {'viewer': {'login': 'lintly'}}}))
+
+        self.assertEqual(GitHubAPIClient().graphql_url, 'https://api.github.com/graphql')
+        self.assertEqual(client.graphql('query { viewer { login } }'), {'viewer': {'login': 'lintly'}})
+        self.assertEqual(self.server.requests[-1].path, '/api/graphql')
+        self.assertEqual(client.metrics.get_counter('api.requests', method='POST', endpoint='/api/graphql'), 1)
+
+
+class GitHubBuildRequestCountTests(GitHubBackendTestCase):
+
+    def test_build_makes_minimum_number_of_requests(self):
+        self.server.add('GET', '/repos/owner/repo/pulls/1', MockResponse(
+            load_diff('single_file.diff'), content_type='text/plain'))
+        self.server.add('POST', '/graphql', MockResponse(graphql_comments_page([], [])))
+        self.server.add('POST', '/repos/owner/repo/pulls/1/reviews', MockResponse({'id': 1}))
+        self.server.add('POST', '/repos/owner/repo/statuses/abc123', MockResponse({'id': 1}, status=201))
+
+        config = Config({
+            'api_key': 'token',
+            'repo': 'owner/repo',
+            'pr': '1',
+            'commit_sha': 'abc123',
+            'format': 'flake8',
+            'context': None,
+            'fail_on': 'new',
+            'post_status': True,
+            'request_changes': True,
+            'use_checks': False,
+        })
+        linter_output = 'dir1/dir2/britecore.py:270:1: E501 line too long\n'
+
+        with mock.patch.object(GitHubAPIClient, 'base_url', self.server.base_url), \
+                mock.patch.dict(os.environ, {'GITHUB_RUN_ID': ''}):
+            build = LintlyBuild(config, linter_output)
+            build.execute()
+
+        self.assertEqual([(r.method, r.path.split('?')[0]) for r in self.server.requests], [
+            ('GET', '/repos/owner/repo/pulls/1'),
+            ('POST', '/graphql'),
+            ('POST', '/repos/owner/repo/pulls/1/reviews'),
+            ('POST', '/repos/owner/repo/statuses/abc123'),
+        ])
+        review = self.server.requests_for('POST', '/repos/owner/repo/pulls/1/reviews')[0].json
+        self.assertEqual(review['event'], 'REQUEST_CHANGES')
+        self.assertEqual(review['comments'][0]['position'], 7)
@@ -0,0 +1,240 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from lintly.backends.errors import NotSupportedError
+from lintly.backends.gitlab import GitLabBackend
+from lintly.backends.scheduler import RequestScheduler
+from lintly.builds import LintlyBuild
+from lintly.config import Config
+from lintly.constants import (
+    ACTION_REVIEW_APPROVE, ACTION_REVIEW_REQUEST_CHANGES, CLEANUP_MINIMIZE, LINTLY_IDENTIFIER
+)
+from lintly.journal import ReviewJournal
+from lintly.patch import Patch
+from lintly.projects import Project
+from lintly.violations import Violation
+
+from .mock_github import MockGitHubServer, MockResponse
+
+
+MR_URL = '/projects/group%2Fproject/merge_requests/1'
+
+BRITECORE_DIFF = """@@ -267,9 +267,7 @@ def validate_uinfo(self):
+                                                                 'more.ajax_suggest',
+                                                                 'payments.views')
+                     else:
+-                        self.is_auth = (web.ctx.path == '/' or
+-                                        'agent' in web.ctx.path or
+-                                        'global/components' in web.ctx.path)
++                        self.is_auth = True
+                 else:
+                     self.is_auth = True
+"""
+
+
+def merge_request_changes(changes):
+    return {
+        'iid': 1,
+        'web_url': 'https://gitlab.com/group/project/-/merge_requests/1',
+        'source_branch': 'feature',
+        'target_branch': 'master',
+        'sha': 'head123',
+        'diff_refs': {'base_sha': 'base123', 'start_sha': 'start123', 'head_sha': 'head123'},
+        'changes': changes,
+    }
+
+
+def change(new_path, diff, old_path=None, **flags):
+    data = {'old_path': old_path or new_path, 'new_path': new_path, 'diff': diff,
+            'new_file': False, 'deleted_file': False, 'renamed_file': old_path is not None}
+    data.update(flags)
+    return data
+
+
+class GitLabBackendTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockGitHubServer().start()
+        self.backend = GitLabBackend(
+            token='token',
+            project=Project('group/project'),
+            context='Lintly/flake8',
+            scheduler=RequestScheduler(rate=None),
+            base_url=self.server.base_url
+        )
+        self.server.add('GET', MR_URL + '/changes', MockResponse(merge_request_changes([
+            change('dir1/dir2/britecore.py', BRITECORE_DIFF, old_path='britecore.py'),
+        ])))
+
+    def tearDown(self):
+        self.server.stop()
+
+
+class GitLabBackendTests(GitLabBackendTestCase):
+
+    def test_get_pr_diff_adds_file_headers(self):
+        diff = self.backend.get_pr_diff(1)
+
+        self.assertTrue(diff.startswith('diff --git a/britecore.py b/dir1/dir2/britecore.py\n'
+                                        '--- a/britecore.py\n+++ b/dir1/dir2/britecore.py\n@@ -267,9'))
+        self.assertEqual(Patch(diff).changed_lines[0]['line_number'], 270)
+
+    def test_merge_request_is_fetched_once(self):
+        self.backend.get_pr_diff(1)
+        pull_request = self.backend.get_pull_request(1)
+
+        self.assertEqual(pull_request.head_sha, 'head123')
+        self.assertEqual(pull_request.base_sha, 'base123')
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_create_pull_request_review_posts_positioned_discussions(self):
+        self.server.add('POST', MR_URL + '/discussions', MockResponse({'id': 'abc'}, status=201))
+        self.server.add('POST', MR_URL + '/notes', MockResponse({'id': 1}, status=201))
+        patch = Patch(self.backend.get_pr_diff(1))
+        violations = {'dir1/dir2/britecore.py': [
+            Violation(line=270, column=1, code='E501', message='line too long'),
+            Violation(line=300, column=1, code='E501', message='not part of the diff'),
+        ]}
+
+        self.backend.create_pull_request_review(1, patch, violations, ACTION_REVIEW_REQUEST_CHANGES)
+
+        discussions = self.server.requests_for('POST', MR_URL + '/discussions')
+        self.assertEqual(len(discussions), 1)
+        position = discussions[0].json['position']
+        self.assertEqual(position['base_sha'], 'base123')
+        self.assertEqual(position['start_sha'], 'start123')
+        self.assertEqual(position['head_sha'], 'head123')
+        self.assertEqual(position['old_path'], 'britecore.py')
+        self.assertEqual(position['new_path'], 'dir1/dir2/britecore.py')
+        self.assertEqual(position['new_line'], 270)
+        self.assertEqual(position['line_range']['start']['line_code'],
+                         patch.get_line_code('dir1/dir2/britecore.py', 270))
+        self.assertIn(LINTLY_IDENTIFIER, self.server.requests_for('POST', MR_URL + '/notes')[0].json['body'])
+        self.assertEqual(self.backend.metrics.get_counter('comments.created', kind='review'), 1)
+
+    def test_discussions_on_context_lines_and_ranges(self):
+        self.server.add('POST', MR_URL + '/discussions', MockResponse({'id': 'abc'}, status=201))
+        self.server.add('POST', MR_URL + '/notes', MockResponse({'id': 1}, status=201))
+        patch = Patch(self.backend.get_pr_diff(1))
+        violations = {'dir1/dir2/britecore.py': [
+            Violation(line=270, column=1, code='E127', message='over-indented', end_line=271),
+        ]}
+
+        self.backend.create_pull_request_review(1, patch, violations, ACTION_REVIEW_REQUEST_CHANGES)
+
+        position = self.server.requests_for('POST', MR_URL + '/discussions')[0].json['position']
+        self.assertEqual((position['new_line'], position['old_line']), (271, 273))
+        self.assertEqual(position['line_range']['start']['type'], 'new')
+        self.assertEqual(position['line_range']['end'], {
+            'line_code': patch.get_line_code('dir1/dir2/britecore.py', 271),
+            'type': None,
+            'new_line': 271,
+            'old_line': 273,
+        })
+
+    def test_create_pull_request_review_approves(self):
+        self.server.add('POST', MR_URL + '/approve', MockResponse({'id': 1}, status=201))
+        patch = Patch(self.backend.get_pr_diff(1))
+
+        self.backend.create_pull_request_review(1, patch, {}, ACTION_REVIEW_APPROVE)
+
+        self.assertEqual(self.server.requests_for('POST', MR_URL + '/approve')[0].json, {'sha': 'head123'})
+        self.assertEqual(self.server.requests_for('POST', MR_URL + '/notes'), [])
+
+    def test_retried_review_skips_the_journaled_steps(self):
+        self.server.add('POST', MR_URL + '/discussions', MockResponse({'id': 'abc'}, status=201))
+        self.server.add('POST', MR_URL + '/notes', MockResponse({'id': 1}, status=201))
+        self.server.add('POST', MR_URL + '/approve', MockResponse({'id': 1}, status=201))
+        patch = Patch(self.backend.get_pr_diff(1))
+        violations = {'dir1/dir2/britecore.py': [Violation(line=270, column=1, code='E501', message='line too long')]}
+        journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, journal_dir)
+        key = ('gitlab', None, 'group/project', '1', 'head123', 'Lintly/flake8')
+
+        for _ in range(2):
+            journal = ReviewJournal(journal_dir, key)
+            self.backend.create_pull_request_review(1, patch, violations, ACTION_REVIEW_REQUEST_CHANGES,
+                                                    journal=journal)
+            self.backend.create_pull_request_review(1, patch, {}, ACTION_REVIEW_APPROVE, journal=journal)
+
+        self.assertEqual(len(self.server.requests_for('POST', MR_URL + '/discussions')), 1)
+        self.assertEqual(len(self.server.requests_for('POST', MR_URL + '/notes')), 1)
+        self.assertEqual(len(self.server.requests_for('POST', MR_URL + '/approve')), 1)
+
+    def test_cleanup_deletes_lintly_notes_from_every_page(self):
+        next_link = '<{base_url}' + MR_URL + '/notes?per_page=100&page=2>; rel="next"'
+        self.server.add('GET', MR_URL + '/notes?per_page=100', MockResponse([
+            {'id': 1, 'body': 'Looks good', 'type': None},
+            {'id': 2, 'body': 'Issues ' + LINTLY_IDENTIFIER, 'type': None},
+        ], headers={'Link': next_link}))
+        self.server.add('GET', MR_URL + '/notes?per_page=100&page=2', MockResponse([
+            {'id': 3, 'body': 'E501 ' + LINTLY_IDENTIFIER, 'type': 'DiffNote'},
+            {'id': 4, 'body': 'F401 ' + LINTLY_IDENTIFIER, 'type': 'DiffNote'},
+        ]))
+        for note_id in (2, 3, 4):
+            self.server.add('DELETE', MR_URL + '/notes/{}'.format(note_id), MockResponse(status=204))
+
+        self.backend.cleanup_pull_request_comments(1)
+
+        self.assertEqual(len(self.server.requests_for('GET')), 2)
+        self.assertEqual(sorted(r.path for r in self.server.requests_for('DELETE')),
+                         [MR_URL + '/notes/2', MR_URL + '/notes/3', MR_URL + '/notes/4'])
+        self.assertEqual(self.backend.metrics.get_counter('comments.deleted', kind='issue'), 1)
+        self.assertEqual(self.backend.metrics.get_counter('comments.deleted', kind='review'), 2)
+
+    def test_cleanup_minimize_is_not_supported(self):
+        with self.assertRaises(NotSupportedError):
+            self.backend.cleanup_pull_request_comments(1, mode=CLEANUP_MINIMIZE)
+
+    def test_post_status_maps_failure_state(self):
+        self.server.add('POST', '/projects/group%2Fproject/statuses/head123', MockResponse({'id': 1}, status=201))
+
+        self.backend.post_status('failure', 'Pull Request introduced 1 linting violation', 'head123')
+
+        self.assertEqual(self.server.requests[0].json['state'], 'failed')
+        self.assertEqual(self.server.requests[0].json['name'], 'Lintly/flake8')
+
+
+class GitLabBuildTests(GitLabBackendTestCase):
+
+    def test_build_uses_gitlab_backend(self):
+        self.server.add('GET', MR_URL + '/notes', MockResponse([]))
+        self.server.add('POST', MR_URL + '/discussions', MockResponse({'id': 'abc'}, status=201))
+        self.server.add('POST', MR_URL + '/notes', MockResponse({'id': 1}, status=201))
+        self.server.add('POST', '/projects/group%2Fproject/statuses/head123', MockResponse({'id': 1}, status=201))
+
+        config = Config({
+            'api_key': 'token',
+            'repo': 'group/project',
+            'pr': '1',
+            'commit_sha': 'head123',
+            'format': 'flake8',
+            'context': None,
+            'fail_on': 'new',
+            'post_status': True,
+            'request_changes': True,
+            'use_checks': False,
+            'backend': 'gitlab',
+            'api_url': self.server.base_url,
+        })
+        linter_output = 'dir1/dir2/britecore.py:270:1: E501 line too long\n'
+
+        with mock.patch.dict(os.environ, {'GITHUB_RUN_ID': ''}):
+            build = LintlyBuild(config, linter_output)
+            build.execute()
+
+        self.assertIsInstance(build.git_client, GitLabBackend)
+        self.assertEqual([(r.method, r.path.split('?')[0]) for r in self.server.requests], [
+            ('GET', MR_URL + '/changes'),
+            ('GET', MR_URL + '/notes'),
+            ('POST', MR_URL + '/discussions'),
+            ('POST', MR_URL + '/notes'),
+            ('POST', '/projects/group%2Fproject/statuses/head123'),
+        ])
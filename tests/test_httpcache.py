@@ -0,0 +1,51 @@
+import shutil
+import tempfile
+
+from lintly.backends.httpcache import ResponseCache
+
+from .mock_github import MockResponse
+from .test_github import GitHubBackendTestCase
+
+
+class ResponseCacheTests(GitHubBackendTestCase):
+
+    def setUp(self):
+        super(ResponseCacheTests, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.backend.client.http_cache = ResponseCache(self.cache_dir, metrics=self.backend.metrics)
+
+        def respond(request):
+            if request.headers.get('If-None-Match') == '"v1"':
+                return MockResponse(status=304, headers={'ETag': '"v1"'})
+            return MockResponse('diff --git a/x b/x\n', content_type='text/plain', headers={'ETag': '"v1"'})
+
+        self.server.add('GET', '/repos/owner/repo/pulls/1', respond)
+
+    def tearDown(self):
+        super(ResponseCacheTests, self).tearDown()
+        shutil.rmtree(self.cache_dir)
+
+    def test_conditional_requests_are_served_from_cache(self):
+        self.assertEqual(self.backend.get_pr_diff(1), 'diff --git a/x b/x\n')
+        self.assertEqual(self.backend.get_pr_diff(1), 'diff --git a/x b/x\n')
+
+        self.assertNotIn('If-None-Match', self.server.requests[0].headers)
+        self.assertEqual(self.server.requests[1].headers['If-None-Match'], '"v1"')
+        self.assertEqual(self.backend.metrics.get_counter('http_cache.hits'), 1)
+        self.assertEqual(self.backend.metrics.get_counter('http_cache.misses'), 1)
+        self.assertEqual(self.backend.metrics.gauges[('http_cache.hit_ratio', ())], 0.5)
+
+    def test_cache_is_shared_across_clients(self):
+        self.backend.get_pr_diff(1)
+
+        other_cache = ResponseCache(self.cache_dir)
+        self.backend.client.http_cache = other_cache
+        self.assertEqual(self.backend.get_pr_diff(1), 'diff --git a/x b/x\n')
+        self.assertEqual(other_cache.hits, 1)
+
+    def test_different_tokens_do_not_share_entries(self):
+        self.backend.get_pr_diff(1)
+        self.backend.client.token = 'other-token'
+        self.backend.get_pr_diff(1)
+
+        self.assertNotIn('If-None-Match', self.server.requests[1].headers)
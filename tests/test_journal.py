@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from lintly.backends.errors import GitClientError
+from lintly.backends.github import GitHubAPIClient
+from lintly.builds import LintlyBuild
+from lintly.config import Config
+from lintly.journal import ReviewJournal, get_step_name
+
+from .mock_github import MockGitHubServer, MockResponse
+from .test_github import graphql_comments_page, load_diff
+
+
+KEY = ('github', None, 'owner/repo', '1', 'abc123', 'Lintly/flake8')
+
+
+class ReviewJournalTests(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_steps_are_kept_until_the_run_completes(self):
+        step = get_step_name('review', [{'path': 'a.py', 'line': 1}])
+        ReviewJournal(self.temp_dir, KEY).mark_done(step)
+
+        journal = ReviewJournal(self.temp_dir, KEY)
+        self.assertTrue(journal.is_done(step))
+        self.assertFalse(journal.is_done(get_step_name('review', [{'path': 'a.py', 'line': 2}])))
+        self.assertEqual(journal.metrics.get_counter('journal.skipped', step='review'), 1)
+
+        journal.complete()
+        self.assertEqual(os.listdir(self.temp_dir), [])
+        self.assertFalse(ReviewJournal(self.temp_dir, KEY).is_done(step))
+
+    def test_journals_for_other_commits_are_separate(self):
+        ReviewJournal(self.temp_dir, KEY).mark_done('cleanup')
+
+        self.assertFalse(ReviewJournal(self.temp_dir, KEY[:4] + ('def456', 'Lintly/flake8')).is_done('cleanup'))
+
+    def test_unreadable_journal_is_ignored(self):
+        journal = ReviewJournal(self.temp_dir, KEY)
+        with open(journal.path, 'w') as f:
+            f.write('{"version": 1, "key": [')
+
+        self.assertFalse(ReviewJournal(self.temp_dir, KEY).is_done('cleanup'))
+
+
+class ResumedBuildTests(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.server = MockGitHubServer().start()
+        self.server.add('GET', '/repos/owner/repo/pulls/1', MockResponse(
+            load_diff('single_file.diff'), content_type='text/plain'))
+        self.server.add('POST', '/graphql', MockResponse(graphql_comments_page([], [])))
+        self.server.add('POST', '/repos/owner/repo/pulls/1/reviews', [
+            MockResponse({'id': 1}),
+            MockResponse({'message': 'Bad Gateway'}, status=502),
+            MockResponse({'id': 2}),
+        ])
+        self.server.add('POST', '/repos/owner/repo/statuses/abc123', MockResponse({'id': 1}, status=201))
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def execute_build(self):
+        config = Config({
+            'api_key': 'token',
+            'repo': 'owner/repo',
+            'pr': '1',
+            'commit_sha': 'abc123',
+            'format': 'flake8',
+            'context': 'Lintly/flake8',
+            'fail_on': 'any',
+            'post_status': True,
+            'request_changes': True,
+            'use_checks': False,
+            'journal_dir': self.temp_dir,
+        })
+        linter_output = ('dir1/dir2/britecore.py:270:1: E501 line too long\n'
+                         'dir1/dir2/britecore.py:779:1: E501 line too long\n')
+        with mock.patch.object(GitHubAPIClient, 'base_url', self.server.base_url), \
+                mock.patch('lintly.backends.github.GITHUB_PULL_REQUEST_COMMENT_LIMIT', 1), \
+                mock.patch.dict(os.environ, {'GITHUB_RUN_ID': ''}):
+            build = LintlyBuild(config, linter_output)
+            build.execute()
+        return build
+
+    def test_retry_resumes_after_the_last_posted_batch(self):
+        with self.assertRaises(GitClientError):
+            self.execute_build()
+        first_attempt = [(r.method, r.path.split('?')[0]) for r in self.server.requests]
+        failed_batch = self.server.requests[3].json['comments']
+        del self.server.requests[:]
+
+        build = self.execute_build()
+
+        self.assertEqual(first_attempt, [
+            ('GET', '/repos/owner/repo/pulls/1'),
+            ('POST', '/graphql'),
+            ('POST', '/repos/owner/repo/pulls/1/reviews'),
+            ('POST', '/repos/owner/repo/pulls/1/reviews'),
+        ])
+        self.assertEqual([(r.method, r.path.split('?')[0]) for r in self.server.requests], [
+            ('GET', '/repos/owner/repo/pulls/1'),
+            ('POST', '/repos/owner/repo/pulls/1/reviews'),
+            ('POST', '/repos/owner/repo/statuses/abc123'),
+        ])
+        self.assertEqual(self.server.requests[1].json['comments'], failed_batch)
+        self.assertEqual(build.metrics.get_counter('journal.skipped', step='cleanup'), 1)
+        self.assertEqual(build.metrics.get_counter('journal.skipped', step='review'), 1)
+        self.assertEqual(os.listdir(self.temp_dir), [])
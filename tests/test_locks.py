@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from lintly.backends.github import GitHubAPIClient
+from lintly.builds import LintlyBuild
+from lintly.config import Config
+from lintly.locks import DirectoryLock, FileLock, RunCoordinator, fcntl, prune_state
+
+from .mock_github import MockGitHubServer, MockResponse
+from .test_github import graphql_comments_page, load_diff
+
+
+class LockTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'commit')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+
+class LockTests(LockTestCase):
+
+    @unittest.skipIf(fcntl is None, 'flock is not available')
+    def test_file_lock_is_exclusive(self):
+        first, second = FileLock(self.path), FileLock(self.path)
+
+        self.assertTrue(first.acquire(timeout=0))
+        self.assertFalse(second.acquire(timeout=0))
+        first.release()
+        self.assertTrue(second.acquire(timeout=0))
+        second.release()
+
+    def test_directory_lock_is_exclusive(self):
+        first, second = DirectoryLock(self.path), DirectoryLock(self.path)
+
+        self.assertTrue(first.acquire(timeout=0))
+        self.assertFalse(second.acquire(timeout=0))
+        first.release()
+        self.assertTrue(second.acquire(timeout=0))
+        second.release()
+
+    def test_stale_directory_lock_is_broken(self):
+        DirectoryLock(self.path).acquire(timeout=0)
+        now = os.path.getmtime(self.path + '.lockdir')
+        lock = DirectoryLock(self.path, stale_after=60, clock=lambda: now + 61, sleep=lambda seconds: None)
+
+        self.assertTrue(lock.acquire(timeout=1))
+
+
+class RunCoordinatorTests(LockTestCase):
+
+    def get_coordinator(self):
+        return RunCoordinator(self.temp_dir, ('github', None, 'owner/repo', '1', 'abc123'), backend='directory')
+
+    def test_shared_values_are_produced_once(self):
+        produced = []
+
+        def produce():
+            produced.append(1)
+            return u'diff ✓'
+
+        values = [self.get_coordinator().get_shared('pr.diff', produce) for _ in range(2)]
+
+        self.assertEqual(values, [u'diff ✓', u'diff ✓'])
+        self.assertEqual(produced, [1])
+
+    def test_run_once(self):
+        calls = []
+
+        def fail():
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            self.get_coordinator().run_once('cleanup', fail)
+
+        self.assertTrue(self.get_coordinator().run_once('cleanup', lambda: calls.append(1)))
+        self.assertFalse(self.get_coordinator().run_once('cleanup', lambda: calls.append(2)))
+        self.assertEqual(calls, [1])
+
+    def test_state_is_cleared_when_the_last_run_of_a_wave_finishes(self):
+        calls = []
+        first, second = self.get_coordinator(), self.get_coordinator()
+
+        first.run_once('cleanup', lambda: calls.append(1))
+        first.finish()
+        self.assertFalse(second.run_once('cleanup', lambda: calls.append(2)))
+        second.finish()
+
+        # CI is run again for the same commit
+        self.assertTrue(self.get_coordinator().run_once('cleanup', lambda: calls.append(3)))
+        self.assertEqual(calls, [1, 3])
+
+    def test_runs_that_died_do_not_keep_the_wave_open(self):
+        dead, coordinator = self.get_coordinator(), self.get_coordinator()
+        coordinator.run_once('cleanup', lambda: None)
+
+        coordinator.finish(stale_after=60, clock=lambda: os.path.getmtime(dead._participant) + 61)
+
+        self.assertEqual(os.listdir(coordinator.state_dir), [])
+
+    def test_prune_state_only_removes_old_lintly_state(self):
+        coordinator = self.get_coordinator()
+        state_name = os.path.basename(coordinator.state_dir)
+        other_file = os.path.join(self.temp_dir, 'keep.txt')
+        open(other_file, 'w').close()
+
+        prune_state(self.temp_dir, max_age=60, clock=lambda: os.path.getmtime(coordinator.state_dir) + 30)
+        self.assertIn(state_name, os.listdir(self.temp_dir))
+
+        prune_state(self.temp_dir, max_age=60, clock=lambda: os.path.getmtime(other_file) + 61)
+        self.assertEqual(os.listdir(self.temp_dir), ['keep.txt'])
+
+
+class CoordinatedBuildTests(LockTestCase):
+
+    def setUp(self):
+        super(CoordinatedBuildTests, self).setUp()
+        self.server = MockGitHubServer().start()
+        self.server.add('GET', '/repos/owner/repo/pulls/1', MockResponse(
+            load_diff('single_file.diff'), content_type='text/plain'))
+        self.server.add('POST', '/graphql', MockResponse(graphql_comments_page([], [])))
+        self.server.add('POST', '/repos/owner/repo/pulls/1/reviews', MockResponse({'id': 1}))
+        self.server.add('POST', '/repos/owner/repo/statuses/abc123', MockResponse({'id': 1}, status=201))
+
+    def tearDown(self):
+        self.server.stop()
+        super(CoordinatedBuildTests, self).tearDown()
+
+    def test_runs_for_the_same_commit_fetch_the_diff_and_clean_up_once(self):
+        builds = []
+        linter_output = 'dir1/dir2/britecore.py:270:1: E501 line too long\n'
+        # Another job of the same wave is still running, so the state outlives the first build
+        other_job = RunCoordinator(self.temp_dir, ('github', None, 'owner/repo', '1', 'abc123'))
+        for context in ('Lintly/flake8', 'Lintly/pycodestyle'):
+            config = Config({
+                'api_key': 'token',
+                'repo': 'owner/repo',
+                'pr': '1',
+                'commit_sha': 'abc123',
+                'format': 'flake8',
+                'context': context,
+                'fail_on': 'any',
+                'post_status': True,
+                'request_changes': True,
+                'use_checks': False,
+                'lock_dir': self.temp_dir,
+            })
+            with mock.patch.object(GitHubAPIClient, 'base_url', self.server.base_url), \
+                    mock.patch.dict(os.environ, {'GITHUB_RUN_ID': ''}):
+                build = LintlyBuild(config, linter_output)
+                build.execute()
+            builds.append(build)
+
+        self.assertEqual([(r.method, r.path.split('?')[0]) for r in self.server.requests], [
+            ('GET', '/repos/owner/repo/pulls/1'),
+            ('POST', '/graphql'),
+            ('POST', '/repos/owner/repo/pulls/1/reviews'),
+            ('POST', '/repos/owner/repo/statuses/abc123'),
+            ('POST', '/repos/owner/repo/pulls/1/reviews'),
+            ('POST', '/repos/owner/repo/statuses/abc123'),
+        ])
+        self.assertEqual(builds[1].metrics.get_counter('coordination.shared', item='pr.diff'), 1)
+        self.assertEqual(builds[1].metrics.get_counter('coordination.cleanup_skipped'), 1)
+        other_job.finish()
+        self.assertEqual(os.listdir(other_job.state_dir), [])
+
+    def test_builds_join_the_wave_before_parsing(self):
+        config = Config({
+            'api_key': 'token',
+            'repo': 'owner/repo',
+            'pr': '1',
+            'commit_sha': 'abc123',
+            'format': 'flake8',
+            'context': None,
+            'fail_on': 'any',
+            'post_status': True,
+            'request_changes': True,
+            'use_checks': False,
+            'lock_dir': self.temp_dir,
+        })
+        build = LintlyBuild(config, '')
+        participants = []
+
+        def parse_violations():
+            state_dir = build.__dict__['coordinator'].state_dir
+            participants.extend(name for name in os.listdir(state_dir) if name.startswith('run-'))
+            raise ValueError('stop the build after parsing')
+
+        with mock.patch.object(build, 'parse_violations', parse_violations):
+            with self.assertRaises(ValueError):
+                build.execute()
+
+        self.assertEqual(len(participants), 1)
+        self.assertEqual(os.listdir(build.coordinator.state_dir), [])
@@ -0,0 +1,68 @@
+import random
+import unittest
+from array import array
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from lintly import matching
+from lintly.matching import get_line_arrays, match_intervals, match_violations
+from lintly.violations import Violation
+
+
+def match_brute_force(starts, ends, interval_starts, interval_ends):
+    return [i for i in range(len(starts))
+            if any(s <= ends[i] and starts[i] <= e for s, e in zip(interval_starts, interval_ends))]
+
+
+class MatchIntervalsTests(unittest.TestCase):
+
+    def test_added_lines(self):
+        added = array('I', [3, 4, 10])
+        starts = array('I', [1, 3, 5, 10, 11])
+        ends = array('I', [2, 3, 9, 10, 20])
+
+        self.assertEqual(match_intervals(starts, ends, added, added), [1, 3])
+
+    def test_ranges_in_any_order(self):
+        hunk_starts, hunk_ends = array('I', [5, 20]), array('I', [8, 25])
+        starts = array('I', [21, 1, 7, 30, 9, 4])
+        ends = array('I', [21, 4, 7, 30, 19, 5])
+
+        self.assertEqual(match_intervals(starts, ends, hunk_starts, hunk_ends), [0, 2, 5])
+
+    def test_no_intervals(self):
+        self.assertEqual(match_intervals(array('I', [1]), array('I', [1]), array('I'), array('I')), [])
+
+    def test_random_ranges_match_brute_force(self):
+        use_numpy = [False] if matching.numpy is None else [False, True]
+        for seed in range(50):
+            rng = random.Random(seed)
+            bounds = sorted(rng.sample(range(1, 500), rng.randint(0, 20) * 2))
+            interval_starts, interval_ends = array('I', bounds[::2]), array('I', bounds[1::2])
+            starts = array('I', [rng.randint(1, 520) for _ in range(rng.randint(0, 200))])
+            if rng.random() < 0.5:
+                starts = array('I', sorted(starts))
+            ends = array('I', [start + rng.choice([0, 0, rng.randint(0, 10)]) for start in starts])
+
+            expected = match_brute_force(starts, ends, interval_starts, interval_ends)
+            for numpy_enabled in use_numpy:
+                with mock.patch.object(matching, 'NUMPY_MIN_VIOLATIONS', 0 if numpy_enabled else float('inf')):
+                    self.assertEqual(match_intervals(starts, ends, interval_starts, interval_ends), expected,
+                                     'seed {}'.format(seed))
+
+
+class MatchViolationsTests(unittest.TestCase):
+
+    def test_matching_violations_keep_their_order(self):
+        violations = [
+            Violation(line=9, column=1, code='E501', message='line too long'),
+            Violation(line=2, column=1, code='E127', message='over-indented', end_line=4),
+            Violation(line=6, column=1, code='W291', message='trailing whitespace'),
+        ]
+        added = array('I', [4, 9])
+
+        self.assertEqual(get_line_arrays(violations), (array('I', [9, 2, 6]), array('I', [9, 4, 6])))
+        self.assertEqual(match_violations(violations, added, added), [violations[0], violations[1]])
@@ -0,0 +1,57 @@
+import json
+import unittest
+
+from lintly.metrics import Metrics, normalize_endpoint
+
+
+class NormalizeEndpointTests(unittest.TestCase):
+
+    def test_normalize_endpoint(self):
+        self.assertEqual(normalize_endpoint('/repos/owner/repo/pulls/12/reviews'),
+                         '/repos/{owner}/{repo}/pulls/{id}/reviews')
+        self.assertEqual(normalize_endpoint('/repos/owner/repo/statuses/' + 'a1' * 20),
+                         '/repos/{owner}/{repo}/statuses/{sha}')
+        self.assertEqual(normalize_endpoint('/repos/owner/repo/issues/3/comments?page=2'),
+                         '/repos/{owner}/{repo}/issues/{id}/comments')
+
+
+class MetricsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics()
+        self.metrics.incr('api.requests', method='GET', endpoint='/user')
+        self.metrics.incr('api.requests', method='GET', endpoint='/user')
+        self.metrics.incr('api.requests', method='POST', endpoint='/graphql')
+        self.metrics.gauge('diff.bytes', 1024)
+        self.metrics.observe('api.latency', 0.2, method='GET', endpoint='/user')
+        self.metrics.observe('api.latency', 3.0, method='GET', endpoint='/user')
+
+    def test_counters(self):
+        self.assertEqual(self.metrics.get_counter('api.requests', method='GET', endpoint='/user'), 2)
+        self.assertEqual(self.metrics.get_total('api.requests'), 3)
+
+    def test_json(self):
+        data = json.loads(self.metrics.to_json())
+        self.assertEqual(len(data['counters']), 2)
+        self.assertEqual(data['gauges'], [{'name': 'diff.bytes', 'tags': {}, 'value': 1024}])
+
+        timer = data['timers'][0]
+        self.assertEqual(timer['count'], 2)
+        self.assertEqual(timer['min'], 0.2)
+        self.assertEqual(timer['max'], 3.0)
+        self.assertEqual(timer['buckets']['0.25'], 1)
+        self.assertEqual(timer['buckets']['5.0'], 1)
+
+    def test_statsd(self):
+        lines = self.metrics.to_statsd().splitlines()
+        self.assertIn('lintly.api.requests:2|c|#endpoint:/user,method:GET', lines)
+        self.assertIn('lintly.diff.bytes:1024|g', lines)
+        self.assertIn('lintly.api.latency:3200|ms|#endpoint:/user,method:GET', lines)
+
+    def test_prometheus(self):
+        lines = self.metrics.to_prometheus().splitlines()
+        self.assertIn('# TYPE lintly_api_requests counter', lines)
+        self.assertIn('lintly_api_requests{endpoint="/user",method="GET"} 2', lines)
+        self.assertIn('lintly_api_latency_seconds_bucket{endpoint="/user",method="GET",le="0.25"} 1', lines)
+        self.assertIn('lintly_api_latency_seconds_bucket{endpoint="/user",method="GET",le="+Inf"} 2', lines)
+        self.assertIn('lintly_api_latency_seconds_count{endpoint="/user",method="GET"} 2', lines)
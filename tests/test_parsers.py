@@ -1,4 +1,5 @@
 import abc
+import collections
 import os
 import unittest
 
@@ -7,7 +8,12 @@ try:
 except ImportError:
     from mock import patch
 
-from lintly.parsers import PARSERS
+from lintly.filters import ViolationFilter
+from lintly.inputs import map_input
+from lintly.parsers import (
+    FLAKE8_REGEX, PARSERS, BaseLintParser, Flake8Parser, LineRegexParser, ParserRegistry, _iter_buffer_chunks
+)
+from lintly.violations import Severity, Violation
 
 
 class ParserTestCaseMixin(object):
@@ -60,7 +66,14 @@ class ParserTestCaseMixin(object):
         self.linter_output = self.load_linter_output(self.linter_output_file_name)
 
     def test_parse_violations(self):
-        violations = self.parser.parse_violations(self.linter_output)
+        self.check_violations(self.parser.parse_violations(self.linter_output))
+
+    def test_parse_buffer(self):
+        path = os.path.join(os.path.dirname(__file__), 'linters_output', self.linter_output_file_name)
+        with map_input(path) as buffer:
+            self.check_violations(self.parser.parse_buffer(buffer))
+
+    def check_violations(self, violations):
         # Checking files.
         self.assertEqual(set(violations.keys()), set(self.expected_violations.keys()))
         # Checking violations.
@@ -98,15 +111,20 @@ class PylintJSONParserTestCase(ParserTestCaseMixin, unittest.TestCase):
     linter_output_file_name = 'pylint-json.txt'
     expected_violations = {
         'lintly/patch.py': [
-            {'line': 22, 'column': 0, 'code': 'W0511 (fixme)', 'message': 'TODO: Cache this'},
-            {'line': 1, 'column': 0, 'code': 'C0111 (missing-docstring)', 'message': 'Missing module docstring'}
+            {'line': 22, 'column': 0, 'code': 'W0511 (fixme)', 'message': 'TODO: Cache this',
+             'severity': Severity.WARNING},
+            {'line': 1, 'column': 0, 'code': 'C0111 (missing-docstring)', 'message': 'Missing module docstring',
+             'severity': Severity.INFO}
         ],
         'lintly/config.py': [
-            {'line': 6, 'column': 0, 'code': 'C0301 (line-too-long)', 'message': 'Line too long (112/100)'},
-            {'line': 1, 'column': 0, 'code': 'C0111 (missing-docstring)', 'message': 'Missing module docstring'},
+            {'line': 6, 'column': 0, 'code': 'C0301 (line-too-long)', 'message': 'Line too long (112/100)',
+             'severity': Severity.INFO},
+            {'line': 1, 'column': 0, 'code': 'C0111 (missing-docstring)', 'message': 'Missing module docstring',
+             'severity': Severity.INFO},
             {
                 'line': 10, 'column': 8, 'code': 'C0103 (invalid-name)',
-                'message': 'Attribute name "ci" doesn\'t conform to snake_case naming style'
+                'message': 'Attribute name "ci" doesn\'t conform to snake_case naming style',
+                'severity': Severity.INFO
             }
         ]
     }
@@ -141,6 +159,10 @@ class ESLintParserTestCase(ParserTestCaseMixin, unittest.TestCase):
     def test_parse_violations(self, _get_working_dir_mock):
         super(ESLintParserTestCase, self).test_parse_violations()
 
+    @patch('lintly.parsers.ESLintParser._get_working_dir', return_value='/Users/grant/project')
+    def test_parse_buffer(self, _get_working_dir_mock):
+        super(ESLintParserTestCase, self).test_parse_buffer()
+
 
 class StylelintParserTestCase(ParserTestCaseMixin, unittest.TestCase):
     parser = PARSERS['stylelint']
@@ -172,6 +194,10 @@ class BlackParserTestCase(ParserTestCaseMixin, unittest.TestCase):
     def test_parse_violations(self, _get_working_dir_mock):
         super(BlackParserTestCase, self).test_parse_violations()
 
+    @patch('lintly.parsers.BlackParser._get_working_dir', return_value='/Users/jouyuy/Dev/workspace/Lintly')
+    def test_parse_buffer(self, _get_working_dir_mock):
+        super(BlackParserTestCase, self).test_parse_buffer()
+
 
 class CfnLintParserTestCase(ParserTestCaseMixin, unittest.TestCase):
     parser = PARSERS['cfn-lint']
@@ -179,12 +205,14 @@ class CfnLintParserTestCase(ParserTestCaseMixin, unittest.TestCase):
 
     expected_violations = {
         "templates/template.yaml": [
-            {'line': 2, 'column': 9, 'code': 'W2001', 'message': 'Parameter UnusedParameter not used.'},
-            {'line': 5, 'column': 9, 'code': 'W2001', 'message': 'Parameter AnotherOne not used.'}
+            {'line': 2, 'column': 9, 'code': 'W2001', 'message': 'Parameter UnusedParameter not used.',
+             'severity': Severity.WARNING},
+            {'line': 5, 'column': 9, 'code': 'W2001', 'message': 'Parameter AnotherOne not used.',
+             'severity': Severity.WARNING}
         ],
         "templates/template2.yaml": [
             {'line': 7, 'column': 9, 'code': 'E1012',
-             'message': 'Ref PrincipalOrgID not found as a resource or parameter'},
+             'message': 'Ref PrincipalOrgID not found as a resource or parameter', 'severity': Severity.ERROR},
         ]
     }
 
@@ -197,14 +225,254 @@ class CfnNagParserTestCase(ParserTestCaseMixin, unittest.TestCase):
         "cloudformation/perfect-stack.yaml": [],
         "cloudformation/problem-stack.yaml": [
             {'line': 24, 'column': 0, 'code': 'F3',
-             'message': 'IAM role should not allow * action on its permissions policy'},
+             'message': 'IAM role should not allow * action on its permissions policy', 'severity': Severity.ERROR},
             {'line': 150, 'column': 0, 'code': 'F3', 'message':
-             'IAM role should not allow * action on its permissions policy'},
+             'IAM role should not allow * action on its permissions policy', 'severity': Severity.ERROR},
             {'line': 50, 'column': 0, 'code': 'W35',
-             'message': 'S3 Bucket should have access logging configured'}
+             'message': 'S3 Bucket should have access logging configured', 'severity': Severity.WARNING}
         ],
         "cloudformation/warning-stack.yaml": [
             {'line': 320, 'column': 0, 'code': 'W42',
              'message': 'Security Groups ingress with an ipProtocol of -1 found '},
         ]
     }
+
+
+class SarifParserTestCase(ParserTestCaseMixin, unittest.TestCase):
+    parser = PARSERS['sarif']
+    linter_output_file_name = 'sarif.json'
+
+    expected_violations = {
+        'lintly/parsers.py': [
+            {'line': 7, 'column': 1, 'code': 'py/unused-import', 'message': "Import of 'os' is not used.",
+             'severity': Severity.INFO, 'end_line': None},
+            {'line': 12, 'column': 5, 'code': 'python.lang.security.audit.eval-detected',
+             'message': 'Detected the use of eval().', 'severity': Severity.WARNING},
+        ],
+        'app/views old.py': [
+            {'line': 40, 'column': 9, 'code': 'py/sql-injection',
+             'message': 'This SQL query depends on a user-provided value.', 'severity': Severity.ERROR,
+             'end_line': 43},
+        ]
+    }
+
+    def test_parse_violations_without_ijson(self):
+        with patch('lintly.parsers._import_ijson', return_value=None):
+            self.test_parse_violations()
+
+    def test_parse_lines(self):
+        violations = self.parser.parse_lines(iter(self.linter_output.splitlines()))
+        self.assertEqual(sorted(violations.keys()), sorted(self.expected_violations.keys()))
+
+
+class CheckstyleParserTestCase(ParserTestCaseMixin, unittest.TestCase):
+    parser = PARSERS['checkstyle']
+    linter_output_file_name = 'checkstyle.xml'
+
+    expected_violations = {
+        'src/main/java/App.java': [
+            {'line': 12, 'column': 5,
+             'code': 'com.puppycrawl.tools.checkstyle.checks.javadoc.MissingJavadocMethodCheck',
+             'message': 'Missing a Javadoc comment.', 'severity': Severity.WARNING},
+            {'line': 30, 'column': 0,
+             'code': 'com.puppycrawl.tools.checkstyle.checks.whitespace.WhitespaceAroundCheck',
+             'message': "'if' is not followed by whitespace.", 'severity': Severity.ERROR},
+        ],
+        'src/main/kotlin/Main.kt': [
+            {'line': 3, 'column': 1, 'code': 'no-wildcard-imports', 'message': 'Wildcard import',
+             'severity': Severity.INFO},
+        ]
+    }
+
+    def test_parse_lines(self):
+        violations = self.parser.parse_lines(iter(self.linter_output.splitlines()))
+        self.assertEqual(sorted(violations.keys()), sorted(self.expected_violations.keys()))
+
+
+class ViolationFilterParserTests(unittest.TestCase):
+
+    def test_filtered_violations_are_skipped(self):
+        output = ParserTestCaseMixin.load_linter_output('pylint-json.txt')
+        violation_filter = ViolationFilter(exclude_codes=['C0111*'], exclude_paths=['lintly/config.py'])
+
+        violations = PARSERS['pylint-json'].parse_violations(output, violation_filter=violation_filter)
+
+        self.assertEqual(list(violations.keys()), ['lintly/patch.py'])
+        self.assertEqual([v.code for v in violations['lintly/patch.py']], ['W0511 (fixme)'])
+
+    def test_min_severity(self):
+        output = ParserTestCaseMixin.load_linter_output('cfn-lint.txt')
+        violation_filter = ViolationFilter(min_severity=Severity.ERROR)
+
+        violations = PARSERS['cfn-lint'].parse_violations(output, violation_filter=violation_filter)
+
+        self.assertEqual(list(violations.keys()), ['templates/template2.yaml'])
+
+
+class CustomParser(BaseLintParser):
+
+    def parse_violations(self, output, violation_filter=None):
+        return {}
+
+
+class ChunkedParser(BaseLintParser):
+    """Parses "path:line" lines, and records the output it was given each time."""
+
+    supports_parallel = True
+
+    def __init__(self):
+        self.outputs = []
+
+    def parse_violations(self, output, violation_filter=None):
+        self.outputs.append(output)
+        violations = collections.defaultdict(list)
+        for line in output.splitlines():
+            path, line_number = line.split(':')
+            violations[path].append(Violation(line=int(line_number), column=1, code='C1', message='chunked'))
+        return violations
+
+
+class FakeEntryPoint(object):
+
+    def __init__(self, name, obj):
+        self.name = name
+        self.obj = obj
+        self.loaded = False
+
+    def load(self):
+        self.loaded = True
+        return self.obj
+
+
+class ParserRegistryTests(unittest.TestCase):
+
+    def test_parsers_are_created_on_first_lookup(self):
+        registry = ParserRegistry()
+        created = []
+        registry.register('custom', lambda: created.append(1) or CustomParser())
+
+        self.assertEqual(list(registry), ['custom'])
+        self.assertEqual(created, [])
+        self.assertIs(registry['custom'], registry['custom'])
+        self.assertEqual(created, [1])
+
+    def test_register_by_reference(self):
+        registry = ParserRegistry()
+        registry.register('custom', 'tests.test_parsers:CustomParser')
+
+        self.assertIsInstance(registry['custom'], CustomParser)
+        self.assertIsNone(registry.get('missing'))
+
+    def test_entry_points_are_loaded_by_name(self):
+        entry_points = [('custom', FakeEntryPoint('custom', CustomParser)),
+                        ('flake8', FakeEntryPoint('flake8', CustomParser))]
+        registry = ParserRegistry(entry_point_group='lintly.parsers')
+        registry.register('flake8', LineRegexParser)
+
+        with patch('lintly.parsers._iter_entry_points', return_value=entry_points) as iter_entry_points:
+            self.assertEqual(list(registry), ['flake8', 'custom'])
+            self.assertFalse(entry_points[0][1].loaded)
+            self.assertIsInstance(registry['custom'], CustomParser)
+            self.assertIn('custom', registry)
+
+        iter_entry_points.assert_called_once_with('lintly.parsers')
+        self.assertFalse(entry_points[1][1].loaded)
+
+    def test_capabilities(self):
+        self.assertTrue(PARSERS['flake8'].supports_streaming)
+        self.assertTrue(PARSERS['flake8'].supports_parallel)
+        self.assertFalse(PARSERS['pylint-json'].supports_parallel)
+
+    def test_parse_lines_matches_parse_violations(self):
+        output = ParserTestCaseMixin.load_linter_output('flake8.txt')
+        parser = PARSERS['flake8']
+
+        streamed = parser.parse_lines(iter(output.splitlines(True)))
+
+        self.assertEqual({path: [v.code for v in vs] for path, vs in streamed.items()},
+                         {path: [v.code for v in vs] for path, vs in parser.parse_violations(output).items()})
+
+
+class ParseBufferTests(unittest.TestCase):
+
+    def test_line_endings_and_whitespace(self):
+        output = (b'  a.py:1:1: E501 line too long  \r\n'
+                  b'\r\n'
+                  b'not a violation\n'
+                  b'b.py:2:3: W291 trailing whitespace \xe2\x9c\x93\r\n'
+                  b'a.py:3:1: F401 unused')
+
+        violations = PARSERS['flake8'].parse_buffer(output)
+
+        self.assertEqual({path: [(v.line, v.column, v.code, v.message) for v in vs]
+                          for path, vs in violations.items()}, {
+            'a.py': [(1, 1, 'E501', 'line too long'), (3, 1, 'F401', 'unused')],
+            'b.py': [(2, 3, 'W291', u'trailing whitespace \u2713')],
+        })
+
+    def test_severities(self):
+        output = b'a.js:1:2: Unexpected var. [Error/no-var]\na.js:3:4: Missing semicolon. [Warning/semi]\n'
+
+        violations = PARSERS['eslint-unix'].parse_buffer(output)
+
+        self.assertEqual([v.severity for v in violations['a.js']], [Severity.ERROR, Severity.WARNING])
+
+    def test_parallel_parsers_parse_the_buffer_a_chunk_at_a_time(self):
+        parser = ChunkedParser()
+
+        with patch('lintly.parsers.BUFFER_CHUNK_SIZE', 10):
+            violations = parser.parse_buffer(b'a.py:1\nb.py:2\na.py:3\n')
+
+        self.assertEqual(parser.outputs, ['a.py:1\n', 'b.py:2\n', 'a.py:3\n'])
+        self.assertEqual({path: [v.line for v in vs] for path, vs in violations.items()},
+                         {'a.py': [1, 3], 'b.py': [2]})
+
+    def test_empty_buffers(self):
+        for name in ('flake8', 'sarif', 'checkstyle'):
+            self.assertEqual(dict(PARSERS[name].parse_buffer(b'')), {})
+            self.assertEqual(dict(PARSERS[name].parse_buffer(b' \n')), {})
+
+    def test_empty_streams(self):
+        for name in ('flake8', 'sarif', 'checkstyle'):
+            self.assertEqual(dict(PARSERS[name].parse_lines(iter([]))), {})
+            self.assertEqual(dict(PARSERS[name].parse_lines(iter(['\n', ' \n']))), {})
+
+
+class Flake8FastPathTests(unittest.TestCase):
+
+    def get_results(self, violations):
+        return {path: [(v.line, v.column, v.code, v.message, v.severity) for v in vs]
+                for path, vs in violations.items()}
+
+    def assert_same_as_regex(self, output):
+        expected = self.get_results(LineRegexParser(FLAKE8_REGEX).parse_violations(output))
+        parser = Flake8Parser()
+        self.assertEqual(self.get_results(parser.parse_violations(output)), expected)
+        self.assertEqual(self.get_results(parser.parse_buffer(output.encode('utf-8'))), expected)
+        return expected
+
+    def test_fixture_matches_regex(self):
+        with open(os.path.join(os.path.dirname(__file__), 'linters_output', 'flake8.txt')) as f:
+            self.assertTrue(self.assert_same_as_regex(f.read()))
+
+    def test_unusual_lines_match_regex(self):
+        results = self.assert_same_as_regex(
+            u'C:\\project\\a.py:1:2: E501 line too long\r\n'
+            u'b.py:3:4: E999 SyntaxError: invalid syntax\n'
+            u'c.py:5:6: E501 see d.py:7:8: W291 trailing whitespace\n'
+            u'\u00fc.py:9:10: W605 invalid escape sequence \'\\d\' \u2713\u00a0\n'
+            u'  e.py:11:12: _123 leading whitespace\n'
+            u'f.py:13:14: E5 \n'
+            u'f.py:x:14: E501 not a line number\n'
+        )
+
+        self.assertIn(u'\u00fc.py', results)
+        self.assertEqual(results['b.py'][0][3], 'SyntaxError: invalid syntax')
+        self.assertNotIn('f.py', results)
+
+    def test_buffer_chunks_end_on_line_breaks(self):
+        buffer = b'a.py:1:1: E1 one\nb.py:2:2: E2 two\nc.py:3:3: E3 three'
+
+        chunks = list(_iter_buffer_chunks(buffer, chunk_size=20))
+
+        self.assertEqual(chunks, [b'a.py:1:1: E1 one\n', b'b.py:2:2: E2 two\n', b'c.py:3:3: E3 three'])
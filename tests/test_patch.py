@@ -1,7 +1,9 @@
+import difflib
 import os
+import random
 import unittest
 
-from lintly.patch import Patch
+from lintly.patch import Patch, parse_git_diff_paths, unquote_path
 
 
 def load_diff(file_name):
@@ -87,3 +89,259 @@ class PatchTests(unittest.TestCase):
         expected_positions = [1, 2, 3, 6, 7, 8, 4, 5, 6]
         actual_positions = [x['position'] for x in changed_lines]
         self.assertEqual(expected_positions, actual_positions)
+
+    def test_old_line_numbers_skip_removed_lines(self):
+        diff = load_diff('single_file.diff')
+        patch = Patch(diff)
+
+        self.assertEqual(patch.old_line_numbers, {
+            ('dir1/dir2/britecore.py', 270): 273,
+            ('dir1/dir2/britecore.py', 779): 777,
+        })
+
+    def test_get_line_code(self):
+        diff = load_diff('single_file.diff')
+        patch = Patch(diff)
+
+        self.assertEqual(patch.get_line_code('dir1/dir2/britecore.py', 270),
+                         '4c11a152cda6b9fe234e6e05a648682dd2847e17_273_270')
+        self.assertEqual(patch.get_line_code('dir1/dir2/britecore.py', 271),
+                         '4c11a152cda6b9fe234e6e05a648682dd2847e17_273_271')
+        self.assertIsNone(patch.get_line_code('dir1/dir2/britecore.py', 300))
+
+    def test_context_lines_can_be_commented_on(self):
+        patch = Patch(load_diff('single_file.diff'))
+
+        context_line = patch.get_line('dir1/dir2/britecore.py', 271)
+        self.assertEqual((context_line.position, context_line.old_line_number, context_line.added), (8, 273, False))
+        self.assertEqual(context_line.side, 'RIGHT')
+        self.assertTrue(patch.get_line('dir1/dir2/britecore.py', 270).added)
+        self.assertEqual(patch.get_patch_position('dir1/dir2/britecore.py', 776), 12)
+        self.assertIsNone(patch.get_line('dir1/dir2/britecore.py', 274))
+        self.assertIsNone(patch.get_line('other.py', 270))
+
+    def test_changed_and_touched_ranges(self):
+        patch = Patch(load_diff('single_file.diff'))
+
+        self.assertTrue(patch.is_changed('dir1/dir2/britecore.py', 270))
+        self.assertTrue(patch.is_changed('dir1/dir2/britecore.py', 260, 270))
+        self.assertFalse(patch.is_changed('dir1/dir2/britecore.py', 271, 778))
+        self.assertTrue(patch.is_touched('dir1/dir2/britecore.py', 271))
+        self.assertTrue(patch.is_touched('dir1/dir2/britecore.py', 700, 776))
+        self.assertFalse(patch.is_touched('dir1/dir2/britecore.py', 274, 775))
+
+    def test_comment_ranges_are_clipped_to_one_hunk(self):
+        patch = Patch(load_diff('single_file.diff'))
+
+        start, end = patch.get_comment_range('dir1/dir2/britecore.py', 260, 800)
+        self.assertEqual((start.line_number, end.line_number), (267, 273))
+        start, end = patch.get_comment_range('dir1/dir2/britecore.py', 780, 790)
+        self.assertEqual((start.line_number, end.line_number), (780, 781))
+        self.assertIsNone(patch.get_comment_range('dir1/dir2/britecore.py', 274, 775))
+
+    def test_hunk_headers_without_line_counts(self):
+        diff = ('diff --git a/a.py b/a.py\n'
+                '--- a/a.py\n'
+                '+++ b/a.py\n'
+                '@@ -3 +3 @@\n'
+                '-x = 1\n'
+                '+x = 2\n'
+                '--- a/b.py\n'
+                '+++ b/b.py\n'
+                '@@ -1,0 +1,2 @@\n'
+                '+y = 1\n'
+                '+z = 2\n')
+        patch = Patch(diff)
+
+        self.assertEqual([(x['file_name'], x['line_number']) for x in patch.changed_lines],
+                         [('a.py', 3), ('b.py', 1), ('b.py', 2)])
+        self.assertEqual(patch.get_line('b.py', 2).position, 2)
+
+
+def git_quote(path):
+    """Quotes a path the way git does in diff headers."""
+    if not any(char in path for char in '"\\\t\n') and all(32 <= ord(char) < 127 for char in path):
+        return path
+    escaped = []
+    for byte in bytearray(path.encode('utf-8')):
+        char = chr(byte)
+        if char in '"\\':
+            escaped.append('\\' + char)
+        elif char == '\t':
+            escaped.append('\\t')
+        elif 32 <= byte < 127:
+            escaped.append(char)
+        else:
+            escaped.append('\\{:03o}'.format(byte))
+    return '"{}"'.format(''.join(escaped))
+
+
+def git_header_path(prefix, path):
+    if path is None:
+        return '/dev/null'
+    quoted = git_quote(prefix + path)
+    # git adds a tab after paths that contain spaces
+    return quoted + '\t' if ' ' in path and not quoted.startswith('"') else quoted
+
+
+class DiffHeaderTests(unittest.TestCase):
+
+    def test_unquote_path(self):
+        self.assertEqual(unquote_path('"b/caf\\303\\251 \\"1\\".py"'), u'b/caf\xe9 "1".py')
+        self.assertEqual(unquote_path('b/plain.py'), 'b/plain.py')
+        self.assertEqual(unquote_path('"b/unterminated'), '"b/unterminated')
+
+    def test_parse_git_diff_paths(self):
+        self.assertEqual(parse_git_diff_paths('a/my file.py b/my file.py'), ('my file.py', 'my file.py'))
+        self.assertEqual(parse_git_diff_paths('a/old.py b/new.py'), ('old.py', 'new.py'))
+        self.assertEqual(parse_git_diff_paths('"a/\\303\\244.py" "b/\\303\\244 2.py"'), (u'\xe4.py', u'\xe4 2.py'))
+        self.assertEqual(parse_git_diff_paths('a/x.py "b/\\303\\244.py"'), ('x.py', u'\xe4.py'))
+
+    def test_renames_binary_and_deleted_files(self):
+        diff = '\n'.join([
+            'diff --git a/old.py b/new.py',
+            'similarity index 90%',
+            'rename from old.py',
+            'rename to new.py',
+            'index 1111111..2222222 100644',
+            '--- a/old.py',
+            '+++ b/new.py',
+            '@@ -1,2 +1,2 @@',
+            ' x = 1',
+            '-y = 2',
+            '+y = 3',
+            'diff --git a/image.png b/image.png',
+            'index 3333333..4444444 100644',
+            'GIT binary patch',
+            'literal 10',
+            '+++ b/not-a-file.py',
+            '@@ -1 +1 @@',
+            'diff --git a/gone.py b/gone.py',
+            'deleted file mode 100644',
+            'index 5555555..0000000',
+            '--- a/gone.py',
+            '+++ /dev/null',
+            '@@ -1,2 +0,0 @@',
+            '-a = 1',
+            '-+b = 2',
+            'diff --git a/copy.py b/"copy \\342\\234\\223.py"',
+            'similarity index 100%',
+            'copy from copy.py',
+            'copy to "copy \\342\\234\\223.py"',
+            'diff --git a/docs.bin b/docs.bin',
+            'Binary files a/docs.bin and b/docs.bin differ',
+            'diff --git a/with space.py b/with space.py',
+            'new file mode 100644',
+            '--- /dev/null',
+            '+++ b/with space.py\t',
+            '@@ -0,0 +1 @@',
+            '+z = 1',
+        ])
+        patch = Patch(diff)
+
+        self.assertEqual([(x['file_name'], x['line_number']) for x in patch.changed_lines],
+                         [('new.py', 2), ('with space.py', 1)])
+        self.assertEqual([(f.old_path, f.new_path) for f in patch.files], [
+            ('old.py', 'new.py'),
+            ('image.png', 'image.png'),
+            ('gone.py', None),
+            ('copy.py', u'copy \u2713.py'),
+            ('docs.bin', 'docs.bin'),
+            (None, 'with space.py'),
+        ])
+        self.assertEqual([f.binary for f in patch.files], [False, True, False, False, True, False])
+        self.assertTrue(patch.files[0].renamed)
+        self.assertTrue(patch.files[3].copied)
+        self.assertEqual(sorted(patch.hunks), ['new.py', 'with space.py'])
+
+    def test_plain_unified_diffs(self):
+        diff = '\n'.join([
+            '--- a.py\t2020-01-01 00:00:00',
+            '+++ a.py\t2020-01-02 00:00:00',
+            '@@ -1 +1,2 @@',
+            ' x = 1',
+            '+y = 2',
+            'Binary files b.bin and b.bin differ',
+            '--- c.py',
+            '+++ c.py',
+            '@@ -1 +1 @@',
+            '-z = 1',
+            '+z = 2',
+        ])
+        patch = Patch(diff)
+
+        self.assertEqual([(x['file_name'], x['line_number']) for x in patch.changed_lines], [('a.py', 2), ('c.py', 1)])
+        self.assertEqual(patch.get_patch_position('c.py', 1), 2)
+
+
+class DiffFuzzTests(unittest.TestCase):
+    """Parses random diffs written the way git writes them and checks every line is attributed correctly."""
+
+    NAMES = ['a.py', 'dir/b.py', 'with space.py', u'caf\xe9.py', 'quote".py', u'\u2713/check.py', 'tab\tname.py']
+    LINES = ['x = 1', 'y = 2', '', ' ', '--- a/evil.py', '+++ b/evil.py', '@@ -1 +1 @@', 'diff --git a/x b/x', '\\']
+
+    def random_lines(self, rng, count):
+        return [rng.choice(self.LINES) + str(rng.randint(0, 3)) * rng.randint(0, 1) for _ in range(count)]
+
+    def random_file(self, rng, name):
+        old_lines = self.random_lines(rng, rng.randint(0, 30))
+        new_lines = list(old_lines)
+        for _ in range(rng.randint(1, 6)):
+            i = rng.randint(0, len(new_lines))
+            new_lines[i:i + rng.randint(0, 3)] = self.random_lines(rng, rng.randint(0, 3))
+
+        kind = rng.choice(['modified', 'modified', 'renamed', 'new', 'deleted', 'binary'])
+        old_path = None if kind == 'new' else name
+        new_path = None if kind == 'deleted' else name
+        if kind == 'renamed':
+            old_path = 'old/' + name
+        if kind == 'new':
+            old_lines = []
+        if kind == 'deleted':
+            new_lines = []
+
+        header = ['diff --git {} {}'.format(git_quote('a/' + (old_path or name)), git_quote('b/' + (new_path or name)))]
+        if kind == 'renamed':
+            header += ['similarity index 50%', 'rename from ' + git_quote(old_path), 'rename to ' + git_quote(new_path)]
+        elif kind == 'new':
+            header.append('new file mode 100644')
+        elif kind == 'deleted':
+            header.append('deleted file mode 100644')
+        header.append('index 1111111..2222222')
+        if kind == 'binary':
+            return header + ['Binary files a/x and b/x differ'], kind, old_path, new_path, old_lines, new_lines
+
+        body = list(difflib.unified_diff(old_lines, new_lines, lineterm='', n=rng.randint(0, 3)))
+        if not body:
+            return header, kind, old_path, new_path, old_lines, new_lines
+        body = [git_header_path('a/', old_path), git_header_path('b/', new_path)] + body[2:]
+        # Some tools strip the trailing space of empty context lines
+        body = [line.rstrip(' ') if line == ' ' and rng.random() < 0.5 else line for line in body]
+        return header + body, kind, old_path, new_path, old_lines, new_lines
+
+    def test_random_diffs(self):
+        for seed in range(200):
+            rng = random.Random(seed)
+            names = rng.sample(self.NAMES, rng.randint(1, len(self.NAMES)))
+            lines, expected_files, expected_added, expected_context = [], [], set(), set()
+            for name in names:
+                file_lines, kind, old_path, new_path, old_lines, new_lines = self.random_file(rng, name)
+                lines += file_lines
+                expected_files.append((old_path, new_path, kind == 'binary'))
+                if kind in ('binary', 'deleted'):
+                    continue
+                matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+                for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                    target = expected_context if tag == 'equal' else expected_added
+                    target.update((new_path, j + 1, new_lines[j]) for j in range(j1, j2))
+
+            patch = Patch('\n'.join(lines) + '\n')
+
+            added = set((x['file_name'], x['line_number'], x['content'][1:]) for x in patch.changed_lines)
+            self.assertEqual(added, expected_added, 'seed {}'.format(seed))
+            for file_name, line_number, content in expected_context:
+                line = patch.get_line(file_name, line_number)
+                if line is not None:
+                    self.assertFalse(line.added, 'seed {}'.format(seed))
+            self.assertEqual([(f.old_path, f.new_path, f.binary) for f in patch.files], expected_files,
+                             'seed {}'.format(seed))
@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import click
+
+from lintly.config import Config
+from lintly.policy import (
+    BaselineRule, CodeBudgetRule, MaxViolationsRule, Policy, parse_budget, read_baseline, write_baseline
+)
+from lintly.violations import Severity, Violation, ViolationStats
+
+
+def get_stats(*codes):
+    """Returns the stats of one violation per code, errors for codes starting with "E"."""
+    violations = [Violation(line=i + 1, column=1, code=code, message='message',
+                            severity=Severity.ERROR if code.startswith('E') else Severity.WARNING)
+                  for i, code in enumerate(codes)]
+    return ViolationStats({'a.py': violations[:1], 'b.py': violations[1:]})
+
+
+class PolicyTests(unittest.TestCase):
+
+    def test_default_policy_fails_on_any_violation(self):
+        result = Policy().evaluate(get_stats('E501', 'W291'))
+
+        self.assertEqual((result.state, result.exit_code), ('failure', 2))
+        self.assertEqual(result.description, 'Pull Request introduced 2 linting violations')
+        self.assertTrue(Policy().evaluate(ViolationStats()).passed)
+
+    def test_thresholds(self):
+        stats = get_stats('E501', 'E501', 'W291')
+
+        result = Policy([MaxViolationsRule(3), MaxViolationsRule(2, severity=Severity.ERROR)]).evaluate(stats)
+        self.assertEqual((result.state, result.exit_code), ('success', 0))
+        self.assertEqual(result.description, 'Pull Request introduced 3 linting violations, within the allowed limits')
+
+        result = Policy([MaxViolationsRule(1, severity=Severity.ERROR)]).evaluate(stats)
+        self.assertEqual((result.state, result.exit_code), ('failure', 1))
+        self.assertEqual(result.description, 'Pull Request introduced 3 linting violations: 2 errors (limit 1)')
+
+    def test_code_budgets(self):
+        stats = get_stats('E501', 'E502', 'W291')
+
+        self.assertTrue(Policy([CodeBudgetRule('E5*', 2)]).evaluate(stats).passed)
+        self.assertEqual(Policy([CodeBudgetRule('E5*', 1)]).evaluate(stats).failures, ['2 E5* (budget 1)'])
+
+    def test_baseline_ratchet(self):
+        rule = BaselineRule({'total': 3, 'by_code': {'E501': 2, 'W291': 1}})
+
+        self.assertIsNone(rule.check(get_stats('E501', 'W291')))
+        self.assertEqual(rule.check(get_stats('E501', 'F401')), 'above baseline: F401 1 > 0')
+
+    def test_long_descriptions_are_truncated(self):
+        stats = get_stats(*['E{}'.format(i) for i in range(100)])
+
+        result = Policy([CodeBudgetRule('E{}'.format(i), 0) for i in range(100)]).evaluate(stats)
+
+        self.assertEqual(len(result.description), 140)
+        self.assertTrue(result.description.endswith('...'))
+
+    def test_parse_budget(self):
+        self.assertEqual(parse_budget('E5*=10'), ('E5*', 10))
+        for value in ('E501', '=1', 'E501=-1', 'E501=x'):
+            with self.assertRaises(ValueError):
+                parse_budget(value)
+
+
+class PolicyConfigTests(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'baseline.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_baseline_round_trip(self):
+        self.assertIsNone(read_baseline(self.path))
+
+        write_baseline(get_stats('E501', 'E501'), self.path)
+
+        self.assertEqual(read_baseline(self.path), {'version': 1, 'total': 2, 'by_code': {'E501': 2}})
+
+    def test_from_config(self):
+        write_baseline(get_stats('E501'), self.path)
+        config = Config({'max_violations': 5, 'max_errors': None, 'budgets': ('E5*=1',), 'baseline': self.path},
+                        file_config={})
+
+        policy = Policy.from_config(config)
+
+        self.assertEqual([type(rule) for rule in policy.rules], [MaxViolationsRule, CodeBudgetRule, BaselineRule])
+
+    def test_invalid_budget_in_the_config_file(self):
+        config = Config({'max_violations': None, 'max_errors': None, 'baseline': None},
+                        file_config={'budget': 'E501'})
+
+        with self.assertRaises(click.BadParameter) as context:
+            Policy.from_config(config)
+        self.assertIn('Invalid budget "E501"', str(context.exception))
+
+    def test_invalid_baseline(self):
+        config = Config({'max_violations': None, 'max_errors': None, 'budgets': (), 'baseline': self.path},
+                        file_config={})
+        for content in ('not json', '[1, 2]', '{"version": 99}'):
+            with open(self.path, 'w') as f:
+                f.write(content)
+
+            with self.assertRaises(click.BadParameter) as context:
+                Policy.from_config(config)
+            self.assertIn('Could not read the baseline', str(context.exception))
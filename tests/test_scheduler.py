@@ -0,0 +1,145 @@
+import unittest
+
+import requests
+
+from lintly.backends.errors import BudgetExceededError
+from lintly.backends.scheduler import RequestScheduler, is_rate_limited
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code=200, headers=None, text=''):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = text
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class IsRateLimitedTests(unittest.TestCase):
+
+    def test_is_rate_limited(self):
+        self.assertTrue(is_rate_limited(FakeResponse(429)))
+        self.assertTrue(is_rate_limited(FakeResponse(403, {'X-RateLimit-Remaining': '0'})))
+        self.assertTrue(is_rate_limited(FakeResponse(403, {'Retry-After': '30'})))
+        self.assertTrue(is_rate_limited(FakeResponse(403, text='You have exceeded a secondary rate limit.')))
+        self.assertFalse(is_rate_limited(FakeResponse(403, text='Resource not accessible by integration')))
+        self.assertFalse(is_rate_limited(FakeResponse(500)))
+
+
+class RequestSchedulerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def make_scheduler(self, **kwargs):
+        kwargs.setdefault('rate', None)
+        return RequestScheduler(clock=self.clock.time, sleep=self.clock.sleep, **kwargs)
+
+    def send_responses(self, *responses):
+        responses = list(responses)
+        calls = []
+
+        def send():
+            calls.append(1)
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        return send, calls
+
+    def test_retries_after_retry_after_header(self):
+        scheduler = self.make_scheduler()
+        send, calls = self.send_responses(FakeResponse(403, {'Retry-After': '7'}), FakeResponse(201))
+
+        response = scheduler.request('post', send)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.clock.sleeps, [7.0])
+        self.assertEqual(scheduler.metrics.get_counter('api.retries', reason='rate_limit'), 1)
+
+    def test_waits_for_rate_limit_reset(self):
+        scheduler = self.make_scheduler()
+        send, calls = self.send_responses(
+            FakeResponse(200, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '1030'}),
+            FakeResponse(200))
+
+        scheduler.request('get', send)
+        scheduler.request('get', send)
+
+        self.assertEqual(self.clock.sleeps, [30.0])
+
+    def test_does_not_wait_for_distant_reset(self):
+        scheduler = self.make_scheduler()
+        send, calls = self.send_responses(
+            FakeResponse(403, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '4600'}))
+
+        response = scheduler.request('get', send)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_retries_server_errors_for_idempotent_requests_only(self):
+        scheduler = self.make_scheduler()
+        send, calls = self.send_responses(FakeResponse(502), FakeResponse(200))
+        self.assertEqual(scheduler.request('get', send).status_code, 200)
+        self.assertEqual(len(calls), 2)
+
+        send, calls = self.send_responses(FakeResponse(502), FakeResponse(200))
+        self.assertEqual(scheduler.request('post', send).status_code, 502)
+        self.assertEqual(len(calls), 1)
+
+    def test_retries_connection_errors(self):
+        scheduler = self.make_scheduler(max_retries=1)
+        send, calls = self.send_responses(requests.ConnectionError('reset'), FakeResponse(200))
+        self.assertEqual(scheduler.request('get', send).status_code, 200)
+
+        send, calls = self.send_responses(requests.ConnectionError('reset'), requests.ConnectionError('reset'))
+        with self.assertRaises(requests.ConnectionError):
+            scheduler.request('get', send)
+
+    def test_gives_up_after_max_retries(self):
+        scheduler = self.make_scheduler(max_retries=2)
+        send, calls = self.send_responses(FakeResponse(503), FakeResponse(503), FakeResponse(503))
+        self.assertEqual(scheduler.request('get', send).status_code, 503)
+        self.assertEqual(len(calls), 3)
+
+    def test_token_bucket_paces_requests(self):
+        scheduler = self.make_scheduler(rate=2)
+        send, calls = self.send_responses(*[FakeResponse(200) for _ in range(4)])
+
+        for _ in range(4):
+            scheduler.request('get', send)
+
+        # The first two requests use the initial burst, the rest are spaced half a second apart
+        self.assertEqual(self.clock.sleeps, [0.5, 0.5])
+
+    def test_budget(self):
+        scheduler = self.make_scheduler(max_calls=3)
+        send, calls = self.send_responses(*[FakeResponse(200) for _ in range(3)])
+
+        with scheduler.reserve(1):
+            self.assertTrue(scheduler.can_afford(2))
+            self.assertFalse(scheduler.can_afford(3))
+            scheduler.request('get', send)
+            scheduler.request('get', send)
+            with self.assertRaises(BudgetExceededError):
+                scheduler.request('get', send)
+
+        self.assertEqual(scheduler.remaining_calls, 1)
+        scheduler.request('get', send)
+        self.assertEqual(scheduler.remaining_calls, 0)
@@ -0,0 +1,217 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import requests
+from click.testing import CliRunner
+
+from lintly import cli
+from lintly.server import BuildQueue, LintlyService, SubmissionError, get_server_url, make_server, submit_build
+
+from .mock_github import MockGitHubServer, MockResponse
+from .test_github import graphql_comments_page, load_diff
+
+
+LINTER_OUTPUT = 'dir1/dir2/britecore.py:270:1: E501 line too long\n'
+
+BUILD_OPTIONS = {
+    'repo': 'owner/repo',
+    'pr': '1',
+    'commit_sha': 'abc123',
+    'format': 'flake8',
+    'fail_on': 'new',
+}
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.001)
+
+
+def get_default_options(**overrides):
+    defaults = dict((param.name, param.default) for param in cli.main.params)
+    defaults.update(overrides)
+    return defaults
+
+
+class BuildQueueTests(unittest.TestCase):
+
+    def test_submissions_for_a_running_key_are_coalesced(self):
+        started = threading.Event()
+        release = threading.Event()
+        runs = []
+
+        def run(submission):
+            runs.append(submission)
+            if submission == 'first':
+                started.set()
+                release.wait(5)
+            return submission.upper()
+
+        queue = BuildQueue(run)
+        batches = {}
+
+        def submit(submission):
+            batches[submission] = queue.submit('owner/repo#1', submission)
+
+        first = threading.Thread(target=submit, args=('first',))
+        first.start()
+        started.wait(5)
+        others = [threading.Thread(target=submit, args=(name,)) for name in ('second', 'third')]
+        for i, thread in enumerate(others):
+            thread.start()
+            # Wait for the submission to be queued before the next one replaces it
+            wait_for(lambda: 'owner/repo#1' in queue._pending and queue._pending['owner/repo#1'].size == i + 1)
+        release.set()
+        for thread in [first] + others:
+            thread.join(5)
+
+        self.assertEqual(runs, ['first', 'third'])
+        self.assertEqual(batches['first'].result, 'FIRST')
+        self.assertIs(batches['second'], batches['third'])
+        self.assertEqual(batches['third'].result, 'THIRD')
+        self.assertEqual(batches['third'].size, 2)
+        self.assertTrue(batches['second'].is_superseded('second'))
+        self.assertFalse(batches['third'].is_superseded(batches['third'].submission))
+
+    def test_errors_are_returned_to_every_submission(self):
+        def run(submission):
+            raise ValueError(submission)
+
+        batch = BuildQueue(run).submit('owner/repo#1', 'broken')
+
+        self.assertIsInstance(batch.error, ValueError)
+
+
+class LintlyServerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.github = MockGitHubServer().start()
+        self.github.add('GET', '/repos/owner/repo/pulls/1', self.get_diff)
+        self.github.add('POST', '/graphql', MockResponse(graphql_comments_page([], [])))
+        self.github.add('POST', '/repos/owner/repo/pulls/1/reviews', MockResponse({'id': 1}))
+        self.github.add('POST', '/repos/owner/repo/statuses/abc123', MockResponse({'id': 1}, status=201))
+
+        self.service = LintlyService(get_default_options(api_key='token', api_url=self.github.base_url))
+        self.temp_dir = tempfile.mkdtemp()
+        self.servers = []
+
+        env = mock.patch.dict(os.environ, {'GITHUB_RUN_ID': ''})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.github.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def get_diff(self, request):
+        if request.headers.get('If-None-Match') == '"diff-v1"':
+            return MockResponse(status=304)
+        return MockResponse(load_diff('single_file.diff'), content_type='text/plain', headers={'ETag': '"diff-v1"'})
+
+    def start_server(self, **kwargs):
+        server = make_server(self.service, port=0, **kwargs)
+        thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.01})
+        thread.daemon = True
+        thread.start()
+        self.servers.append(server)
+        return server
+
+    def test_builds_share_connections_and_cached_responses(self):
+        server = self.start_server()
+        url = get_server_url('127.0.0.1', server.server_address[1])
+
+        first = submit_build(url, BUILD_OPTIONS, LINTER_OUTPUT)
+        second = submit_build(url, BUILD_OPTIONS, LINTER_OUTPUT)
+
+        self.assertEqual(first, {'exit_code': 1, 'violations': 1, 'files': 1, 'commit_sha': 'abc123', 'coalesced': 0})
+        self.assertEqual(second['exit_code'], 1)
+        diff_requests = self.github.requests_for('GET', '/repos/owner/repo/pulls/1')
+        self.assertEqual(len(diff_requests), 2)
+        self.assertEqual(diff_requests[1].headers.get('If-None-Match'), '"diff-v1"')
+        self.assertEqual(len(self.service._sessions), 1)
+        self.assertEqual(self.service.metrics.get_counter('server.builds', backend='github'), 2)
+        self.assertEqual(self.service.metrics.get_counter('http_cache.hits'), 1)
+
+    def test_unix_socket(self):
+        socket_path = os.path.join(self.temp_dir, 'lintly.sock')
+        self.start_server(socket_path=socket_path)
+
+        result = submit_build(get_server_url(socket_path=socket_path), BUILD_OPTIONS, LINTER_OUTPUT)
+
+        self.assertEqual(result['violations'], 1)
+        self.assertEqual(len(self.github.requests_for('POST', '/repos/owner/repo/pulls/1/reviews')), 1)
+
+    def test_unset_options_use_the_defaults(self):
+        options = self.service.get_options(dict(BUILD_OPTIONS, api_key=None, include_codes=()))
+
+        self.assertEqual(options['api_key'], 'token')
+        self.assertEqual(options['pr'], '1')
+
+    def test_submissions_cannot_set_credentials_or_paths(self):
+        for name, value in (('api_url', 'https://attacker.example'), ('api_key', 'other'),
+                            ('metrics_out', '/etc/passwd'), ('from_cache', '/etc/shadow'), ('record', '/tmp/x')):
+            with self.assertRaises(SubmissionError):
+                self.service.get_options(dict(BUILD_OPTIONS, **{name: value}))
+
+    def test_rejected_submission(self):
+        server = self.start_server()
+        url = get_server_url('127.0.0.1', server.server_address[1])
+
+        options = dict(BUILD_OPTIONS, api_url='https://attacker.example')
+
+        response = requests.post(url + '/builds', json={'options': options, 'linter_output': LINTER_OUTPUT})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('api_url', response.json()['error'])
+        self.assertEqual(self.github.requests, [])
+
+    def test_superseded_submission(self):
+        config = mock.Mock(backend='github', api_url=None, repo='owner/repo', pr='1', context=None, format='flake8')
+        newer = mock.Mock(commit_sha='def456')
+        batch = mock.Mock(submission=(newer, LINTER_OUTPUT), error=None)
+        batch.is_superseded.return_value = True
+
+        with mock.patch('lintly.server.Config', return_value=config), \
+                mock.patch.object(self.service.queue, 'submit', return_value=batch):
+            result = self.service.submit(BUILD_OPTIONS, LINTER_OUTPUT)
+
+        self.assertEqual(result['superseded_by'], 'def456')
+        self.assertEqual(result['exit_code'], 0)
+
+    def test_cli_submits_to_server(self):
+        server = self.start_server()
+        args = ['--server', get_server_url('127.0.0.1', server.server_address[1]), '--repo', 'owner/repo',
+                '--pr', '1', '--commit-sha', 'abc123', '--fail-on', 'new']
+
+        result = CliRunner().invoke(cli.main, args, input=LINTER_OUTPUT)
+        exit_zero_result = CliRunner().invoke(cli.main, args + ['--exit-zero'], input=LINTER_OUTPUT)
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertEqual(exit_zero_result.exit_code, 0)
+        self.assertEqual(len(self.github.requests_for('POST', '/repos/owner/repo/pulls/1/reviews')), 2)
+
+    def test_cli_submissions_keep_the_service_defaults(self):
+        self.service.defaults.update(fail_on='new', post_status=False)
+        server = self.start_server()
+        args = ['--server', get_server_url('127.0.0.1', server.server_address[1]), '--repo', 'owner/repo',
+                '--pr', '1', '--commit-sha', 'abc123']
+
+        with mock.patch('lintly.cli.submit_build', wraps=submit_build) as submit:
+            result = CliRunner().invoke(cli.main, args, input=LINTER_OUTPUT)
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertEqual(sorted(submit.call_args[0][1]), ['commit_sha', 'pr', 'repo', 'server'])
+        self.assertEqual(self.github.requests_for('POST', '/repos/owner/repo/statuses/abc123'), [])
@@ -0,0 +1,96 @@
+import unittest
+
+from lintly.formatters import build_check_line_comment, build_pr_review_line_comment
+from lintly.violations import (
+    Violation, ViolationStats, collapse_violation_ranges, count_violation_lines, group_violations_by_line
+)
+
+
+def violation(line, code='E501', message='line too long', column=1, end_line=None):
+    return Violation(line=line, column=column, code=code, message=message, end_line=end_line)
+
+
+class GroupViolationsByLineTests(unittest.TestCase):
+
+    def test_groups_and_removes_duplicates(self):
+        violations = [violation(3), violation(1), violation(3, column=10), violation(3, code='W291')]
+
+        lines = group_violations_by_line(violations)
+
+        self.assertEqual(list(lines.keys()), [1, 3])
+        self.assertEqual([v.code for v in lines[3]], ['E501', 'W291'])
+
+    def test_count_violation_lines(self):
+        violations = {
+            'a.py': [violation(1), violation(1, code='W291'), violation(2)],
+            'b.py': [violation(1)],
+        }
+
+        self.assertEqual(count_violation_lines(violations), 3)
+
+
+class CollapseViolationRangesTests(unittest.TestCase):
+
+    def test_collapses_consecutive_lines_with_the_same_code(self):
+        violations = [violation(1), violation(2), violation(3), violation(2, code='W291'), violation(5)]
+
+        ranges = collapse_violation_ranges(violations)
+
+        self.assertEqual([(r.start_line, r.end_line, r.code, r.count) for r in ranges], [
+            (1, 3, 'E501', 3),
+            (2, 2, 'W291', 1),
+            (5, 5, 'E501', 1),
+        ])
+
+    def test_ranges_include_end_lines(self):
+        violations = [violation(1, end_line=4), violation(5), violation(8, end_line=7)]
+
+        ranges = collapse_violation_ranges(violations)
+
+        self.assertEqual([(r.start_line, r.end_line, r.count) for r in ranges], [(1, 5, 2), (8, 8, 1)])
+
+    def test_duplicates_are_counted_once(self):
+        ranges = collapse_violation_ranges([violation(1), violation(1), violation(2)])
+
+        self.assertEqual(len(ranges), 1)
+        self.assertEqual(ranges[0].count, 2)
+
+
+class LineCommentTests(unittest.TestCase):
+
+    def test_single_violation(self):
+        comment = build_pr_review_line_comment([violation(1)])
+
+        self.assertTrue(comment.startswith('E501: line too long  <!--'))
+
+    def test_multiple_violations_are_listed(self):
+        comment = build_pr_review_line_comment([violation(1), violation(1, code='W291', message='whitespace')])
+
+        self.assertIn('* E501: line too long\n* W291: whitespace', comment)
+
+    def test_check_comment_for_range(self):
+        ranges = collapse_violation_ranges([violation(1), violation(2)])
+
+        self.assertEqual(build_check_line_comment(ranges[0]),
+                         'E501: line too long (2 occurrences on lines 1-2)')
+
+
+class ViolationStatsTests(unittest.TestCase):
+
+    def test_counts_per_code_and_file(self):
+        stats = ViolationStats({
+            'a.py': [violation(1), violation(2), violation(2, code='W291')],
+            'b.py': [violation(1, code='W291')],
+            'c.py': [],
+        })
+
+        self.assertEqual(stats.total, 4)
+        self.assertEqual(stats.files_count, 2)
+        self.assertEqual(stats.by_code, {'E501': 2, 'W291': 2})
+        self.assertEqual(stats.top_files(1), [('a.py', 3)])
+
+    def test_empty(self):
+        stats = ViolationStats()
+
+        self.assertEqual(stats.total, 0)
+        self.assertEqual(stats.top_codes(5), [])